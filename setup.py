@@ -239,6 +239,7 @@ setup_args = {
                             'bin/radical-pilot-stats.plot',
                             'bin/radical-pilot-version',
                             'bin/radical-pilot-agent',
+                            'bin/radical-pilot-agent-bench',
                             'bin/radical-pilot-agent-funcs',
                             'bin/radical-pilot-agent-statepush',
                             'bin/radical-pilot-worker',
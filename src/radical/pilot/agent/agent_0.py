@@ -536,15 +536,27 @@ class Agent_0(rpu.Worker):
         #        find -- so we do it right here.
         #        This also blocks us from using multiple ingest threads, or from
         #        doing late binding by unit pull :/
+        #
+        # If the staging input queue is flow controlled, we only pull as many
+        # units as it can take: this callback must not block the timer thread,
+        # and the remaining units are pulled on the next invocation.
+        credit = self._output_credit(rps.AGENT_STAGING_INPUT_PENDING)
+        if credit == 0:
+            self._log.debug('units pulled:    0 (throttled)')
+            return True
+
         unit_cursor = self._dbs._c.find({'type'    : 'unit',
                                          'pilot'   : self._pid,
                                          'control' : 'agent_pending'})
-        if not unit_cursor.count():
+        if credit:
+            unit_cursor = unit_cursor.limit(credit)
+
+        unit_list = list(unit_cursor)
+        if not unit_list:
             self._log.info('units pulled:    0')
             return True
 
         # update the units to avoid pulling them again next time.
-        unit_list = list(unit_cursor)
         unit_uids = [unit['uid'] for unit in unit_list]
 
         self._dbs._c.update({'type'  : 'unit',
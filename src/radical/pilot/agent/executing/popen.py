@@ -75,6 +75,11 @@ class Popen(AgentExecutingComponent) :
         self._cus_to_watch   = list()
         self._watch_queue    = queue.Queue ()
 
+        # slots of all units which hold resources, by uid - this is what
+        # a restarted scheduler needs to recover (see `command_cb()`)
+        self._live_lock      = ru.Lock()
+        self._live           = dict()
+
         self._pid = self._cfg['pid']
 
         # run watcher thread
@@ -113,6 +118,16 @@ class Popen(AgentExecutingComponent) :
             with self._cancel_lock:
                 self._cus_to_cancel.extend(arg['uids'])
 
+        elif cmd == 'sched_recover':
+
+            # a restarted scheduler needs to know which units are alive
+            with self._live_lock:
+                units = [{'uid': uid, 'slots': slots}
+                         for uid, slots in self._live.items()]
+
+            self.publish(rpc.CONTROL_PUBSUB, {'cmd': 'sched_live',
+                                              'arg': {'units': units}})
+
         return True
 
 
@@ -133,6 +148,9 @@ class Popen(AgentExecutingComponent) :
     #
     def _handle_unit(self, cu):
 
+        with self._live_lock:
+            self._live[cu['uid']] = cu['slots']
+
         try:
             # prep stdout/err so that we can append w/o checking for None
             cu['stdout'] = ''
@@ -166,12 +184,22 @@ class Popen(AgentExecutingComponent) :
                             % (str(e), traceback.format_exc())
 
             # Free the Slots, Flee the Flots, Ree the Frots!
-            self._prof.prof('unschedule_start', uid=cu['uid'])
-            self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+            self._unschedule(cu)
 
             self.advance(cu, rps.FAILED, publish=True, push=False)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _unschedule(self, cu):
+
+        with self._live_lock:
+            del self._live[cu['uid']]
+
+        self._prof.prof('unschedule_start', uid=cu['uid'])
+        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+
+
     # --------------------------------------------------------------------------
     #
     def spawn(self, launcher, cu):
@@ -411,8 +439,7 @@ prof(){
                     self._prof.prof('exec_cancel_stop', uid=uid)
 
                     del(cu['proc'])  # proc is not json serializable
-                    self._prof.prof('unschedule_start', uid=cu['uid'])
-                    self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                    self._unschedule(cu)
                     self.advance(cu, rps.CANCELED, publish=True, push=False)
 
                     # we don't need to watch canceled CUs
@@ -434,8 +461,7 @@ prof(){
                 # Free the Slots, Flee the Flots, Ree the Frots!
                 self._cus_to_watch.remove(cu)
                 del(cu['proc'])  # proc is not json serializable
-                self._prof.prof('unschedule_start', uid=cu['uid'])
-                self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+                self._unschedule(cu)
 
                 if exit_code != 0:
                     # The unit failed - fail after staging output
@@ -579,9 +579,6 @@ prof(){
 
         self._prof.prof('exec_stop', uid=cu['uid'])
 
-        # for final states, we can free the slots.
-        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
-
         if data : cu['exit_code'] = int(data)
         else    : cu['exit_code'] = None
 
@@ -595,6 +592,10 @@ prof(){
             # directives -- at the very least, we'll upload stdout/stderr
             cu['target_state'] = rps.DONE
 
+        # for final states, we can free the slots.  The scheduler may inspect
+        # the unit's exit code and target state, so those are set by now.
+        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+
         self.advance(cu, rps.AGENT_STAGING_OUTPUT_PENDING,
                          publish=True, push=True)
 
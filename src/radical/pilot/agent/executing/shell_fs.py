@@ -467,9 +467,6 @@ prof(){
             cu = self._registry[uid]
             del(self._registry[uid])
 
-        # free unit slots.
-        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
-
         if ret is None:
             cu['exit_code'] = None
         else:
@@ -489,6 +486,10 @@ prof(){
             # directives -- at the very least, we'll upload stdout/stderr
             cu['target_state'] = rps.DONE
 
+        # free unit slots.  The scheduler may inspect the unit's exit code and
+        # target state, so those are set by now.
+        self.publish(rpc.AGENT_UNSCHEDULE_PUBSUB, cu)
+
         self.advance(cu, rps.AGENT_STAGING_OUTPUT_PENDING, publish=True, push=True)
 
 
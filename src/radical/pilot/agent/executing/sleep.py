@@ -40,6 +40,7 @@ class Sleep(AgentExecutingComponent) :
                              rpc.AGENT_STAGING_OUTPUT_QUEUE)
 
         self.register_publisher (rpc.AGENT_UNSCHEDULE_PUBSUB)
+        self.register_subscriber(rpc.CONTROL_PUBSUB, self.command_cb)
 
         self._terminate  = mt.Event()
         self._tasks_lock = ru.RLock()
@@ -59,6 +60,25 @@ class Sleep(AgentExecutingComponent) :
         self._timed.join()
 
 
+    # --------------------------------------------------------------------------
+    #
+    def command_cb(self, topic, msg):
+
+        cmd = msg['cmd']
+
+        if cmd == 'sched_recover':
+
+            # a restarted scheduler needs to know which units are alive
+            with self._tasks_lock:
+                units = [{'uid': t['uid'], 'slots': t['slots']}
+                         for t in self._tasks]
+
+            self.publish(rpc.CONTROL_PUBSUB, {'cmd': 'sched_live',
+                                              'arg': {'units': units}})
+
+        return True
+
+
     # --------------------------------------------------------------------------
     #
     def work(self, units):
@@ -286,6 +286,19 @@ class LoadLeveler(ResourceManager):
             # BGQ Specific Torus labels
             self.torus_dimension_labels = self.BGQ_DIMENSION_LABELS
 
+            # FIXME GPU
+            loadl_gpus_per_node = self.BGQ_GPUS_PER_NODE
+
+            # The Torus scheduler runs in its own component, and gets the block
+            # layout via the rm_info (see scheduler/torus.py)
+            self.rm_info['torus'] = {
+                    'dims'    : self.torus_dimension_labels,
+                    'block'   : self.torus_block,
+                    'shapes'  : [[size, self.shape_table[size],
+                                  self.shape2str(self.shape_table[size])]
+                                 for size in sorted(self.shape_table)],
+                    'bg_block': self.loadl_bg_block}
+
         # node names are unique, so can serve as node uids
         self.node_list      = [[node, node] for node in loadl_node_list]
         self.cores_per_node = loadl_cpus_per_node
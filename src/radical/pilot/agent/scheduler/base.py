@@ -4,17 +4,27 @@ __license__   = "MIT"
 
 
 import time
+import zlib
 import queue
 import logging
+import collections
 
+import threading          as mt
 import multiprocessing    as mp
 
 import radical.utils      as ru
 
+try:
+    import numpy          as np
+except ImportError:
+    np = None
+
 from ... import utils     as rpu
 from ... import states    as rps
 from ... import constants as rpc
 
+from .checkpoint import Checkpoint
+
 
 # ------------------------------------------------------------------------------
 #
@@ -22,8 +32,11 @@ from ... import constants as rpc
 #
 SCHEDULER_NAME_CONTINUOUS_ORDERED = "CONTINUOUS_ORDERED"
 SCHEDULER_NAME_CONTINUOUS_COLO    = "CONTINUOUS_COLO"
+SCHEDULER_NAME_CONTINUOUS_BACKFILL = "CONTINUOUS_BACKFILL"
+SCHEDULER_NAME_CONTINUOUS_DAG     = "CONTINUOUS_DAG"
 SCHEDULER_NAME_CONTINUOUS         = "CONTINUOUS"
 SCHEDULER_NAME_HOMBRE             = "HOMBRE"
+SCHEDULER_NAME_HOMBRE_MULTI       = "HOMBRE_MULTI"
 SCHEDULER_NAME_FLUX               = "FLUX"
 SCHEDULER_NAME_TORUS              = "TORUS"
 SCHEDULER_NAME_NOOP               = "NOOP"
@@ -156,7 +169,8 @@ SCHEDULER_NAME_TORUS              = "TORUS"
 # the scheduler.  In fact, a scheduler may use a completely different slot
 # structure than above - but then is likely bound to a specific launch method
 # which can interpret that structure.  A notable example is the BG/Q torus
-# scheduler which will only work in combination with the dplace launch methods.
+# scheduler, which adds the sub-block shape and corner node to the slots, and
+# will only work in combination with the runjob launch method.
 # `lm_info` is an opaque field which allows to communicate specific settings
 # from the rm to the launch method.
 #
@@ -169,6 +183,57 @@ SCHEDULER_NAME_TORUS              = "TORUS"
 #        specifically avoid string copies on manipulations.  We only convert
 #        to a stringlist for visual representation (`self.slot_status()`).
 #
+# NOTE:  Each node entry also has an `idx` entry (its position in
+#        `self.nodes`), and the number of free cores and GPUs per node is
+#        cached in `self._free_cores[idx]` and `self._free_gpus[idx]`.  Based
+#        on those counters, nodes are binned into capacity buckets
+#        (`self._cap_cores[n]` holds the indexes of all nodes with exactly `n`
+#        free cores, `self._cap_gpus` accordingly).  The buckets allow to
+#        iterate only over nodes which can host a given slot, and to decide
+#        quickly that no node can host it (see `_has_capacity()` and
+#        `_iterate_capacity()`).  The counters and buckets are maintained by
+#        `_change_slot_states()`.
+#
+# NOTE:  If the agent config sets `node_store` to `numpy`, the core and GPU
+#        states of all nodes are instead kept in two 2-D NumPy arrays (`nodes
+#        x cores` and `nodes x gpus`), and the `cores` and `gpus` entries of
+#        each node are row views into those arrays (with `idx` being the row).
+#        The free counters are then NumPy arrays, too.  Slot state changes and
+#        searches are vectorized.  This requires NumPy to be installed.
+#
+# NOTE:  If the agent config starts more than one scheduler component (`count`
+#        in the `agent_scheduling` component config), each instance owns
+#        a disjoint, contiguous partition of the node list.  Units pulled from
+#        the scheduling queue can be routed to their home partition by a hash of
+#        their uid or of their `tuple_size`, and units which cannot be placed
+#        on arrival are spilled over to a sibling partition which advertised
+#        enough free capacity.  Units are routed and spilled at most once,
+#        over the `agent_schedule_pubsub` (see `_route_units()` and
+#        `_spill_units()`).  That pubsub can drop messages, so the receiving
+#        partition acknowledges forwarded units, and the sending partition
+#        forwards them again until it gets that acknowledgement (see
+#        `_check_forwarded()`).  Units can not span partitions: units which are
+#        too large for any partition fail (see `_check_partition()`).
+#
+# NOTE:  Waiting units with a higher `priority` are placed first.  If the first
+#        unit of the highest priority cannot be placed, its free share of the
+#        nodes with the most free resources is reserved for it (marked busy),
+#        so that units of lower priority cannot delay it by using resources
+#        which get freed (see `_reserve()`).  This only applies once units of
+#        different priorities have been seen, and only to schedulers which
+#        place units on the node list (via `schedule_unit()`).
+#
+# NOTE:  With `sched_checkpoint` set, the scheduler periodically writes the
+#        slots of all placed units and the waitpool into a memory mapped file in
+#        the pilot sandbox (see `checkpoint.py`).  A restarted scheduler marks
+#        the checkpointed slots as busy, refills the waitpool, and asks the
+#        executors for their live units (`sched_recover` command on the control
+#        pubsub).  Units which are not reported by any executor have completed
+#        while the scheduler was down, and their slots are freed.  Units which
+#        were in transit to the scheduler or to the executors are not covered.
+#        Schedulers which overload the scheduling loop don't support
+#        checkpoints.
+#
 # NOTE:  The scheduler will allocate one core per node and GPU, as some startup
 #        methods only allow process placements to *cores*, even if GPUs are
 #        present and requested (hi aprun).  We should make this decision
@@ -185,6 +250,16 @@ SCHEDULER_NAME_TORUS              = "TORUS"
 #        schedule_ok     : search for unit resources succeeded (uid: uid)
 #        unschedule_start: unit resource freeing starts        (uid: uid)
 #        unschedule_stop : unit resource freeing stops         (uid: uid)
+#        schedule_fast   : unit got the slots of a completed unit (uid: uid)
+#        schedule_util   : used fraction of cores, GPUs, mem, LFS (msg: util)
+#        schedule_route  : unit forwarded to its home partition   (uid: uid)
+#        schedule_spill  : unit forwarded to a sibling partition  (uid: uid)
+#        schedule_resend : unit forwarded again, as it was not acknowledged
+#        schedule_hold   : unit waits for its dependencies        (uid: uid)
+#        schedule_release: unit dependencies are resolved         (uid: uid)
+#        schedule_checkpoint: scheduler state got checkpointed    (msg: counts)
+#        schedule_restore: scheduler state restored from checkpoint (msg: counts)
+#        schedule_recover: executor reports got reconciled       (msg: counts)
 #
 #        See also:
 #        https://github.com/radical-cybertools/radical.pilot/blob/feature/ \
@@ -216,9 +291,22 @@ class AgentSchedulingComponent(rpu.Component):
 
     def __init__(self, cfg, session):
 
-        self.nodes = None
-        self._uid  = ru.generate_id(cfg['owner'] + '.scheduling.%(counter)s',
-                                    ru.ID_CUSTOM)
+        self.nodes       = None
+        self._node_index = dict()   # map node uid: node entry in self.nodes
+        self._node_store = 'list'   # see `_vectorize_nodes()`
+        self._cap_cores  = None     # capacity index, see `_index_nodes()`
+        self._recycle    = False    # see `_unschedule_completed()`
+        self._policy     = 'size'   # see `_waitpool_key()`
+        self._util       = None     # last reported utilization
+        self._util_ts    = 0.0
+        self._partitions = 1        # see `_initialize_scheduler()`
+        self._partition  = 0
+        self._ckpt       = None     # see `_checkpoint()`
+        self._ckpt_units = dict()   # map uid: slots of placed units
+        self._recovering = False    # see `_recover()`
+        self._uid        = ru.generate_id(cfg['owner'] +
+                                          '.scheduling.%(counter)s',
+                                          ru.ID_CUSTOM)
         rpu.Component.__init__(self, cfg, session)
 
 
@@ -229,10 +317,49 @@ class AgentSchedulingComponent(rpu.Component):
     #
     def initialize(self):
 
+        self._initialize_scheduler()
+
+        # register unit input channels
+        self.register_input(rps.AGENT_SCHEDULING_PENDING,
+                            rpc.AGENT_SCHEDULING_QUEUE, self.work)
+
+        # we need unschedule updates to learn about units for which to free the
+        # allocated cores.  Those updates MUST be issued after execution, ie.
+        # by the AgentExecutionComponent.
+        self.register_subscriber(rpc.AGENT_UNSCHEDULE_PUBSUB, self.unschedule_cb)
+
+        # partitions exchange units and capacity information
+        if self._partitions > 1:
+            self.register_subscriber(rpc.AGENT_SCHEDULE_PUBSUB,
+                                     self.partition_cb)
+
+        # a scheduler restarted from a checkpoint needs to learn which of the
+        # checkpointed units are still alive
+        if self._recovering:
+            self.register_subscriber(rpc.CONTROL_PUBSUB, self.recover_cb)
+            self.publish(rpc.CONTROL_PUBSUB, {'cmd': 'sched_recover',
+                                              'arg': {'uid': self._uid}})
+
+        # start a process (or thread) to host the actual scheduling algorithm
+        if self._sched_mode == 'process':
+            self._p = mp.Process(target=self._schedule_units)
+        else:
+            self._p = mt.Thread(target=self._schedule_units)
+
+        self._p.daemon = True
+        self._p.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    # Set up the resource representation, the waitpool and the input queues of
+    # the scheduling algorithm.  This does not touch any communication channels
+    # and is also used to run schedulers standalone (see `benchmark.py`).
+    #
+    def _initialize_scheduler(self):
+
         # The scheduler needs the ResourceManager information which have been collected
         # during agent startup.  We dig them out of the config at this point.
-        #
-        # NOTE: this information is insufficient for the torus scheduler!
         self._pid                 = self._cfg['pid']
         self._rm_info           = self._cfg['rm_info']
         self._rm_lm_info        = self._cfg['rm_info']['lm_info']
@@ -254,19 +381,116 @@ class AgentSchedulingComponent(rpu.Component):
             raise RuntimeError("ResourceManager %s didn't _configure gpus_per_node."
                               % self._rm_info['name'])
 
-        # create and initialize the wait pool.  Also maintain a mapping of that
-        # waitlist to a binned list where tasks are binned by size for faster
-        # lookups of replacement units.  And outdated binlist is mostly
-        # sufficient, only rebuild when we run dry
+        # * partitions:
+        #   if more than one scheduler component is started, the component
+        #   index and count determine the partition of the node list which
+        #   this instance owns.
+        #
+        self._partitions = self._cfg.get('count', 1)
+        self._partition  = self._cfg.get('index', 0)
+
+        if self._partitions > 1:
+
+            n_nodes = len(self._rm_node_list)
+            start   = n_nodes *  self._partition      // self._partitions
+            stop    = n_nodes * (self._partition + 1) // self._partitions
+
+            self._rm_node_list = self._rm_node_list[start:stop]
+            self._partition_sizes = [n_nodes * (idx + 1) // self._partitions -
+                                     n_nodes *  idx      // self._partitions
+                                     for idx in range(self._partitions)]
+
+            if not self._rm_node_list:
+                raise RuntimeError('no nodes for partition %d/%d'
+                                  % (self._partition, self._partitions))
+
+        self._partition_nodes = set([uid for _, uid in self._rm_node_list])
+
+        # * sched_forward_timeout:
+        #   time (in seconds) after which units forwarded to another partition
+        #   are forwarded again if the partition did not acknowledge them.
+        #   The default is '5'.
+        #
+        self._forward_timeout = float(self._cfg.get('sched_forward_timeout', 5))
+        self._forward_ts      = 0.0
+        self._forwarded       = dict()  # map uid: [ts, unit] of unacked units
+        self._received        = set()   # uids of units forwarded to us
+
+        # * sched_routing:
+        #   `queue` keeps units with the partition which pulled them from the
+        #   scheduling queue (which balances load between partitions),
+        #   `hash` forwards units to a partition determined by their uid, and
+        #   `size` to a partition determined by their `tuple_size` (which keeps
+        #   units of the same shape together).  The default is 'queue'.
+        #
+        self._routing = self._cfg.get('sched_routing', 'queue')
+        if self._routing not in ['queue', 'hash', 'size']:
+            raise ValueError('invalid scheduler routing %s' % self._routing)
+
+        # create and initialize the wait pool.  Waiting tasks are also binned
+        # by `tuple_size`, so that tasks of the same shape can be handled (or
+        # skipped) together.  Bins are kept per level of `priority` and
+        # fair-share `group` (see `_waitpool_levels()`), where `_waitbins`
+        # holds the default level.  All are maintained incrementally by
+        # `_waitpool_add()` and `_waitpool_remove()`.
         self._waitpool = dict()  # map uid:task
-        self._ts_map   = dict()
-        self._ts_valid = False  # set to False to trigger re-binning
+        self._waitbins = dict()  # map tuple_size:{uid:task}
+        self._waitprio = dict()  # map (priority, group):{tuple_size:{uid:task}}
+        self._shares   = dict()  # map group:cores used by placed tasks
+
+        # resources reserved for the first waiting task of the highest priority
+        # (see `_reserve()`), and the lowest priority seen so far
+        self._reserved = None    # [task, slots]
+        self._prio_min = None
 
         # the scheduler algorithms have two inputs: tasks to be scheduled, and
         # slots becoming available (after tasks complete).
-        self._queue_sched   = mp.Queue()
-        self._queue_unsched = mp.Queue()
-        self._proc_term     = mp.Event()  # signal termination ot scheduler proc
+        #
+        # * sched_mode:
+        #   the algorithm runs in a separate `process` by default, which avoids
+        #   competing with the component's own threads for the GIL, but needs
+        #   to pickle all units and slots passing through the queues.  In
+        #   `thread` mode, the algorithm runs in a thread and the queues pass
+        #   references.  The default is 'process', and 'thread' for in-process
+        #   components: their in-process bridges only exist in this process.
+        #
+        inproc           = self._cfg.get('inproc')
+        self._sched_mode = self._cfg.get('sched_mode')
+
+        if not self._sched_mode:
+            if inproc: self._sched_mode = 'thread'
+            else     : self._sched_mode = 'process'
+
+        if self._sched_mode == 'process' and inproc:
+            raise ValueError('in-process schedulers need sched_mode "thread"')
+
+        if self._sched_mode == 'process':
+            self._queue_sched   = mp.Queue()
+            self._queue_unsched = mp.Queue()
+            self._queue_recover = mp.Queue()
+            self._queue_acks    = mp.Queue()
+            self._proc_term     = mp.Event()  # signal termination to sched proc
+
+        elif self._sched_mode == 'thread':
+            self._queue_sched   = queue.Queue()
+            self._queue_unsched = queue.Queue()
+            self._queue_recover = queue.Queue()
+            self._queue_acks    = queue.Queue()
+            self._proc_term     = mt.Event()
+
+        else:
+            raise ValueError('invalid scheduler mode %s' % self._sched_mode)
+
+        # free capacity advertised by the sibling partitions, as 4 entries per
+        # partition (see `_get_capacity()`).  This is written by the component
+        # (`partition_cb()`) and read by the scheduling algorithm.
+        n_cap = 4 * self._partitions
+        if self._sched_mode == 'process':
+            self._siblings = mp.Array('l', n_cap, lock=False)
+        else:
+            self._siblings = [0] * n_cap
+        self._capacity    = None  # last advertised own capacity
+        self._capacity_ts = 0.0
 
         # initialize the node list to be used by the scheduler.  A scheduler
         # instance may decide to overwrite or extend this structure.
@@ -276,33 +500,84 @@ class AgentSchedulingComponent(rpu.Component):
                                'name' : node,
                                'cores': [rpc.FREE] * self._rm_cores_per_node,
                                'gpus' : [rpc.FREE] * self._rm_gpus_per_node,
-                               'lfs'  :              self._rm_lfs_per_node,
+                               'lfs'  :         dict(self._rm_lfs_per_node),
                                'mem'  :              self._rm_mem_per_node})
 
         # configure the scheduler instance
         self._configure()
-        self.slot_status("slot status after  init")
+        self._index_nodes()
+
+        # optionally switch to an array based node store (see top of file)
+        self._node_store = self._cfg.get('node_store', 'list')
+        if self._node_store == 'numpy':
+            self._vectorize_nodes()
+        elif self._node_store != 'list':
+            raise ValueError('invalid node store %s' % self._node_store)
+
+        # * slot_recycling:
+        #   pass the slots of completed units directly on to waiting units of
+        #   the same `tuple_size`, instead of freeing and searching them again
+        #   (see `_unschedule_completed()`).  The default is 'False'.
+        #
+        self._recycle = self._cfg.get('slot_recycling', False)
+
+        # * sched_policy:
+        #   `size` orders waiting units by their number of cores, `dominant` by
+        #   their dominant share of cores, GPUs, memory and LFS, and also packs
+        #   units which don't need GPUs onto nodes with the least free GPUs
+        #   (see `_waitpool_key()` and `_iterate_capacity()`).  The default is
+        #   'size'.
+        #
+        self._policy = self._cfg.get('sched_policy', 'size')
+        if self._policy not in ['size', 'dominant']:
+            raise ValueError('invalid scheduling policy %s' % self._policy)
+
+        # * sched_checkpoint:
+        #   interval (in seconds) at which the slots of placed units and the
+        #   waitpool are written to a checkpoint file in the pilot sandbox, if
+        #   anything changed.  A scheduler which finds a checkpoint on startup
+        #   recovers from it (see top of file).  The default is '0' (no
+        #   checkpoints).
+        #
+        # * sched_recover_timeout:
+        #   time (in seconds) a recovering scheduler waits for the executors to
+        #   report their live units before it continues to schedule.  The
+        #   default is '10'.
+        #
+        self._ckpt_interval   = float(self._cfg.get('sched_checkpoint', 0))
+        self._recover_timeout = float(self._cfg.get('sched_recover_timeout',
+                                                    10))
 
-        # register unit input channels
-        self.register_input(rps.AGENT_SCHEDULING_PENDING,
-                            rpc.AGENT_SCHEDULING_QUEUE, self.work)
+        if self._ckpt_interval < 0:
+            raise ValueError('invalid checkpoint interval %s'
+                            % self._ckpt_interval)
 
-        # we need unschedule updates to learn about units for which to free the
-        # allocated cores.  Those updates MUST be issued after execution, ie.
-        # by the AgentExecutionComponent.
-        self.register_subscriber(rpc.AGENT_UNSCHEDULE_PUBSUB, self.unschedule_cb)
+        if self._ckpt_interval:
 
-        # start a process to host the actual scheduling algorithm
-        self._p = mp.Process(target=self._schedule_units)
-        self._p.daemon = True
-        self._p.start()
+            if type(self)._schedule_units != \
+                    AgentSchedulingComponent._schedule_units:
+                raise ValueError('scheduler %s does not support checkpoints'
+                                % self._cfg['scheduler'])
+
+            self._ckpt_ts    = 0.0
+            self._ckpt_dirty = False
+            self._ckpt       = Checkpoint('%s/agent_scheduling.%04d.ckpt'
+                                         % (self._cfg.path, self._partition))
+            self._restore_checkpoint()
+
+        self.slot_status("slot status after  init")
 
 
     # --------------------------------------------------------------------------
     #
     def finalize(self):
 
-        self._p.terminate()
+        if self._sched_mode == 'process':
+            self._p.terminate()
+
+        else:
+            self._proc_term.set()
+            self._p.join()
 
 
     # --------------------------------------------------------------------------
@@ -327,8 +602,11 @@ class AgentSchedulingComponent(rpu.Component):
 
         from .continuous_ordered import ContinuousOrdered
         from .continuous_colo    import ContinuousColo
+        from .continuous_backfill import ContinuousBackfill
+        from .continuous_dag     import ContinuousDag
         from .continuous         import Continuous
         from .hombre             import Hombre
+        from .hombre_multi       import HombreMulti
         from .flux               import Flux
         from .torus              import Torus
         from .noop               import Noop
@@ -344,8 +622,11 @@ class AgentSchedulingComponent(rpu.Component):
 
                 SCHEDULER_NAME_CONTINUOUS_ORDERED : ContinuousOrdered,
                 SCHEDULER_NAME_CONTINUOUS_COLO    : ContinuousColo,
+                SCHEDULER_NAME_CONTINUOUS_BACKFILL: ContinuousBackfill,
+                SCHEDULER_NAME_CONTINUOUS_DAG     : ContinuousDag,
                 SCHEDULER_NAME_CONTINUOUS         : Continuous,
                 SCHEDULER_NAME_HOMBRE             : Hombre,
+                SCHEDULER_NAME_HOMBRE_MULTI       : HombreMulti,
                 SCHEDULER_NAME_FLUX               : Flux,
                 SCHEDULER_NAME_TORUS              : Torus,
                 SCHEDULER_NAME_NOOP               : Noop,
@@ -365,6 +646,175 @@ class AgentSchedulingComponent(rpu.Component):
             raise ValueError("Scheduler '%s' unknown or defunct" % name)
 
 
+    # --------------------------------------------------------------------------
+    #
+    # (Re)build the node uid index and the capacity index over `self.nodes`.
+    # This is called after `_configure()` - any scheduler implementation which
+    # replaces the node list at a later point MUST call this method again.
+    #
+    def _index_nodes(self):
+
+        self._node_index = dict()
+        self._free_cores = list()
+        self._free_gpus  = list()
+        self._cap_cores  = None
+        self._cap_gpus   = None
+        self._cap_keys   = list()
+
+        self._total_free_cores = 0
+        self._total_free_gpus  = 0
+
+        if not isinstance(self.nodes, list):
+            # some schedulers use a different (or no) nodelist structure
+            return
+
+        n_cores = max([len(node['cores']) for node in self.nodes] or [0])
+        n_gpus  = max([len(node['gpus'])  for node in self.nodes] or [0])
+
+        self._cap_cores = [set() for _ in range(n_cores + 1)]
+        self._cap_gpus  = [set() for _ in range(n_gpus  + 1)]
+
+        for idx, node in enumerate(self.nodes):
+
+            node['idx'] = idx
+            self._node_index[node['uid']] = node
+
+            self._free_cores.append(list(node['cores']).count(rpc.FREE))
+            self._free_gpus.append (list(node['gpus' ]).count(rpc.FREE))
+            self._cap_keys.append(None)
+            self._index_capacity(idx)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _index_capacity(self, idx):
+        '''
+        (Re)file node `idx` into the capacity buckets, according to its current
+        free core and gpu counters.
+        '''
+
+        old = self._cap_keys[idx]
+        new = (int(self._free_cores[idx]), int(self._free_gpus[idx]))
+
+        if old == new:
+            return
+
+        if old:
+            self._cap_cores[old[0]].discard(idx)
+            self._cap_gpus [old[1]].discard(idx)
+            self._total_free_cores -= old[0]
+            self._total_free_gpus  -= old[1]
+
+        self._cap_cores[new[0]].add(idx)
+        self._cap_gpus [new[1]].add(idx)
+        self._total_free_cores += new[0]
+        self._total_free_gpus  += new[1]
+
+        self._cap_keys[idx] = new
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _has_capacity(self, cores, gpus, total_cores=0, total_gpus=0):
+        '''
+        Check if any node has at least `cores` free cores and (possibly another
+        node) at least `gpus` free GPUs, and if at least `total_cores` and
+        `total_gpus` are free overall.  A `False` return value is definite (no
+        node can host such a slot), `True` means that a search may succeed.
+        The cost of this check only depends on the node size, not on the
+        number of nodes.
+        '''
+
+        if self._cap_cores is None:
+            # no capacity index - we can't tell
+            return True
+
+        if total_cores > self._total_free_cores or \
+           total_gpus  > self._total_free_gpus:
+            return False
+
+        return self._max_capacity(self._cap_cores) >= cores and \
+               self._max_capacity(self._cap_gpus)  >= gpus
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _max_capacity(self, buckets):
+
+        for n in range(len(buckets) - 1, -1, -1):
+            if buckets[n]:
+                return n
+
+        return 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _iterate_capacity(self, cores, gpus):
+        '''
+        Iterate over all nodes which have at least `cores` free cores and
+        `gpus` free GPUs, best fit first (nodes with the least sufficient
+        number of free resources come first).  We iterate over the buckets of
+        the scarcer resource, and filter for the other one.  With the
+        `dominant` policy, slots without GPUs are placed on nodes with the
+        least free GPUs first, to keep GPU nodes available for GPU tasks.
+
+        The node states MUST NOT be changed while iterating.
+        '''
+
+        n_cores = sum([len(b) for b in self._cap_cores[cores:]])
+        n_gpus  = sum([len(b) for b in self._cap_gpus [gpus:]])
+
+        if not gpus and self._policy == 'dominant':
+            buckets = self._cap_gpus
+
+        elif gpus and n_gpus < n_cores:
+            buckets = self._cap_gpus[gpus:]
+        else:
+            buckets = self._cap_cores[cores:]
+
+        for bucket in buckets:
+            for idx in bucket:
+                if self._free_cores[idx] >= cores and \
+                   self._free_gpus [idx] >= gpus:
+                    yield self.nodes[idx]
+
+
+    # --------------------------------------------------------------------------
+    #
+    # Move the core and gpu states of all nodes into 2-D arrays, and replace
+    # the node entries' `cores` and `gpus` lists with row views into those
+    # arrays (see top of file).
+    #
+    def _vectorize_nodes(self):
+
+        if np is None:
+            raise RuntimeError('node store `numpy` requires numpy')
+
+        if not isinstance(self.nodes, list):
+            raise RuntimeError('scheduler does not support node store `numpy`')
+
+        n_nodes = len(self.nodes)
+        n_cores = max([len(node['cores']) for node in self.nodes] or [0])
+        n_gpus  = max([len(node['gpus'])  for node in self.nodes] or [0])
+
+        # pad nodes with less resources with `DOWN` entries
+        self._cores = np.full((n_nodes, n_cores), rpc.DOWN, dtype=np.int8)
+        self._gpus  = np.full((n_nodes, n_gpus),  rpc.DOWN, dtype=np.int8)
+
+        for idx, node in enumerate(self.nodes):
+
+            self._cores[idx, :len(node['cores'])] = node['cores']
+            self._gpus [idx, :len(node['gpus'])]  = node['gpus']
+
+            node['cores'] = self._cores[idx]
+            node['gpus']  = self._gpus[idx]
+
+        # the capacity buckets remain valid, only the counters change type
+        self._free_cores = np.array(self._free_cores, dtype=np.int64)
+        self._free_gpus  = np.array(self._free_gpus,  dtype=np.int64)
+
+
     # --------------------------------------------------------------------------
     #
     # Change the reserved state of slots (rpc.FREE or rpc.BUSY)
@@ -380,36 +830,86 @@ class AgentSchedulingComponent(rpu.Component):
         '''
         # This method needs to change if the DS changes.
 
+        if self._node_store == 'numpy':
+            return self._change_slot_states_vectorized(slots, new_state)
+
         # for node_name, node_uid, cores, gpus in slots['nodes']:
         for slot_node in slots['nodes']:
 
             # Find the entry in the the slots list
-
-            # TODO: [Optimization] Assuming 'uid' is the ID of the node, it
-            #       seems a bit wasteful to have to look at all of the nodes
-            #       available for use if at most one node can have that uid.
-            #       Maybe it would be worthwhile to simply keep a list of nodes
-            #       that we would read, and keep a dictionary that maps the uid
-            #       of the node to the location on the list?
-
-            node = None
-            for node in self.nodes:
-                if node['uid'] == slot_node['uid']:
-                    break
+            node = self._node_index.get(slot_node['uid'])
 
             if not node:
                 raise RuntimeError('inconsistent node information')
 
             # iterate over cores/gpus in the slot, and update state
-            cores = slot_node['core_map']
+            n_cores = 0
+            cores   = slot_node['core_map']
             for cslot in cores:
                 for core in cslot:
                     node['cores'][core] = new_state
+                n_cores += len(cslot)
 
-            gpus = slot_node['gpu_map']
+            n_gpus = 0
+            gpus   = slot_node['gpu_map']
             for gslot in gpus:
                 for gpu in gslot:
                     node['gpus'][gpu] = new_state
+                n_gpus += len(gslot)
+
+            # update free counters and capacity index
+            idx = node['idx']
+            if new_state == rpc.FREE:
+                self._free_cores[idx] += n_cores
+                self._free_gpus [idx] += n_gpus
+            else:
+                self._free_cores[idx] -= n_cores
+                self._free_gpus [idx] -= n_gpus
+            self._index_capacity(idx)
+
+            if slot_node['lfs']['path']:
+                if new_state == rpc.BUSY:
+                    node['lfs']['size'] -= slot_node['lfs']['size']
+                else:
+                    node['lfs']['size'] += slot_node['lfs']['size']
+
+            if slot_node['mem']:
+                if new_state == rpc.BUSY:
+                    node['mem'] -= slot_node['mem']
+                else:
+                    node['mem'] += slot_node['mem']
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _change_slot_states_vectorized(self, slots, new_state):
+        '''
+        Same as `_change_slot_states`, but for the `numpy` node store: all core
+        and gpu states of all slot nodes are changed in one operation each, and
+        the cached per-node free counters are updated accordingly.
+        '''
+
+        core_nodes = list()
+        core_idxs  = list()
+        gpu_nodes  = list()
+        gpu_idxs   = list()
+
+        for slot_node in slots['nodes']:
+
+            node = self._node_index.get(slot_node['uid'])
+
+            if not node:
+                raise RuntimeError('inconsistent node information')
+
+            idx = node['idx']
+
+            for cslot in slot_node['core_map']:
+                core_nodes.extend([idx] * len(cslot))
+                core_idxs.extend(cslot)
+
+            for gslot in slot_node['gpu_map']:
+                gpu_nodes.extend([idx] * len(gslot))
+                gpu_idxs.extend(gslot)
 
             if slot_node['lfs']['path']:
                 if new_state == rpc.BUSY:
@@ -423,6 +923,19 @@ class AgentSchedulingComponent(rpu.Component):
                 else:
                     node['mem'] += slot_node['mem']
 
+        if new_state == rpc.FREE: delta = +1
+        else                    : delta = -1
+
+        if core_idxs:
+            self._cores[core_nodes, core_idxs] = new_state
+            np.add.at(self._free_cores, core_nodes, delta)
+
+        if gpu_idxs:
+            self._gpus[gpu_nodes, gpu_idxs] = new_state
+            np.add.at(self._free_gpus, gpu_nodes, delta)
+
+        for idx in set(core_nodes) | set(gpu_nodes):
+            self._index_capacity(idx)
 
 
     # --------------------------------------------------------------------------
@@ -442,6 +955,20 @@ class AgentSchedulingComponent(rpu.Component):
         glyphs = {rpc.FREE : '-',
                   rpc.BUSY : '#',
                   rpc.DOWN : '!'}
+
+        if self._node_store == 'numpy':
+
+            lut   = np.array([glyphs[rpc.FREE], glyphs[rpc.BUSY],
+                              glyphs[rpc.DOWN]])
+            cores = lut[self._cores]
+            gpus  = lut[self._gpus]
+            ret   = '|' + ''.join(['%s:%s|' % (''.join(cores[idx]),
+                                               ''.join(gpus[idx]))
+                                   for idx in range(len(self.nodes))])
+            self._log.debug("status: %-30s: %s", msg, ret)
+
+            return ret
+
         ret = "|"
         for node in self.nodes:
             for core in node['cores']:
@@ -458,29 +985,193 @@ class AgentSchedulingComponent(rpu.Component):
 
     # --------------------------------------------------------------------------
     #
-    def _refresh_ts_map(self):
+    def _waitpool_add(self, tasks):
+        '''
+        Add tasks to the waitpool and to the bin of their `tuple_size` in their
+        waitpool level.  Bins keep their tasks in arrival order.
+        '''
 
-        # The ts map only gets invalidated when new units get added to the
-        # waitpool.  Removing tasks does *not* invalidate it.
-        #
-        # This method should only be called opportunistically, i.e., when a task
-        # lookup failed and it is worthwhile checking the waitlist tasks.
+        for task in tasks:
 
-        if self._ts_valid:
-            # nothing to do, the map is valid
-            return
+            level = self._get_level(task)
+            if self._prio_min is None or level[0] < self._prio_min:
+                self._prio_min = level[0]
 
-        # we can only rebuild if we have waiting tasks
-        if not self._waitpool:
-            return
+            if level == (0, None):
+                bins = self._waitbins
+            else:
+                if level not in self._waitprio:
+                    self._waitprio[level] = dict()
+                bins = self._waitprio[level]
 
-        for uid,task in self._waitpool.items():
             ts = task['tuple_size']
-            if ts not in self._ts_map:
-                self._ts_map[ts] = set()
-            self._ts_map[ts].add(uid)
+            if ts not in bins:
+                bins[ts] = collections.OrderedDict()
+
+            bins[ts][task['uid']]       = task
+            self._waitpool[task['uid']] = task
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _waitpool_remove(self, task):
+        '''
+        Remove a task from the waitpool and from its bin.  Empty bins and levels
+        are dropped.
+        '''
+
+        ts    = task['tuple_size']
+        uid   = task['uid']
+        level = self._get_level(task)
+
+        if level == (0, None): bins = self._waitbins
+        else                 : bins = self._waitprio[level]
+
+        del self._waitpool[uid]
+        del bins[ts][uid]
+
+        if not bins[ts]:
+            del bins[ts]
+
+            if not bins and level != (0, None):
+                del self._waitprio[level]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_level(self, task):
+        '''
+        Return the waitpool level of a task, as `(priority, group)`.
+        '''
 
-        self._ts_valid = True
+        descr = task['description']
+        tags  = descr.get('tags') or dict()
+
+        return (descr.get('priority') or 0, tags.get('group'))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _waitpool_levels(self):
+        '''
+        Return the bins of all waitpool levels in the order in which they should
+        be served, as `[level, bins]` pairs: higher priorities first, and for
+        the same priority, groups which use less cores first (tasks without
+        group come last).  The cost only depends on the number of levels, not
+        on the number of waiting tasks.
+        '''
+
+        levels = list(self._waitprio.keys())
+        if self._waitbins:
+            levels.append((0, None))
+
+        if len(levels) > 1:
+
+            def key(level):
+                prio, group = level
+                if group is None: return (-prio, 1, 0)
+                else            : return (-prio, 0, self._shares.get(group, 0))
+
+            levels.sort(key=key)
+
+        return [[level, self._waitbins if level == (0, None)
+                                       else self._waitprio[level]]
+                for level in levels]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _account_share(self, unit, sign):
+        '''
+        Add (`sign=1`) or remove (`sign=-1`) the cores of a placed unit to the
+        usage of its fair-share group.
+        '''
+
+        tags = unit['description'].get('tags')
+        if not tags or tags.get('group') is None:
+            return
+
+        group = tags['group']
+        cores = self._get_needs(unit['tuple_size'])[2]
+        self._shares[group] = max(0, self._shares.get(group, 0) + sign * cores)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _waitpool_key(self, ts):
+        '''
+        Sort key for waitpool bins: larger tasks are placed first, and smaller
+        tasks are used to backfill.  For the `size` policy, we define the size
+        as
+            `(cpu_processes + gpu_processes) * cpu_threads`
+
+        which only looks at cores and thus starves GPU dominated loads.  For the
+        `dominant` policy, the size is the largest share of the pilot's cores,
+        GPUs, memory and LFS which the task requests (its dominant share).
+        '''
+
+        procs, threads, gpus, _, lfs, mem = ts
+
+        if self._policy == 'size':
+            return (procs + gpus) * threads
+
+        n_nodes = len(self._rm_node_list)
+        n_lfs   = self._rm_lfs_per_node['size']
+        shares  = [procs * (threads or 1) / (self._rm_cores_per_node * n_nodes)]
+
+        if self._rm_gpus_per_node:
+            shares.append(procs * gpus / (self._rm_gpus_per_node * n_nodes))
+
+        if self._rm_mem_per_node:
+            shares.append(procs * mem  / (self._rm_mem_per_node  * n_nodes))
+
+        if n_lfs:
+            shares.append(procs * lfs  / (n_lfs                  * n_nodes))
+
+        return max(shares)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _waitpool_fits(self, ts):
+        '''
+        Check the capacity index to see if a task of the given `tuple_size`
+        could possibly be placed right now (see `_has_capacity()`).  Non-MPI
+        tasks need all their cores and GPUs on one node, MPI tasks need at least
+        one process on a node.
+        '''
+
+        return self._has_capacity(*self._get_needs(ts))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _waitpool_blocks(self, task):
+        '''
+        Check if a waiting task which could not be placed blocks the remaining
+        tasks of the same `tuple_size` in this scheduling pass: those won't fit
+        either.  Tagged tasks are constrained to specific nodes though.
+        '''
+
+        return not task['description'].get('tag')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_needs(self, ts):
+        '''
+        Return the number of cores and GPUs a task of the given `tuple_size`
+        needs on a single node, and in total, as `[cores, gpus, total_cores,
+        total_gpus]`.
+        '''
+
+        procs, threads, gpus, ptype = ts[:4]
+        threads = threads or 1
+
+        if 'mpi' in str(ptype).lower():
+            return [threads, gpus, threads * procs, gpus * procs]
+        else:
+            return [threads * procs, gpus * procs, threads * procs, gpus * procs]
 
 
     # --------------------------------------------------------------------------
@@ -528,6 +1219,12 @@ class AgentSchedulingComponent(rpu.Component):
         release (for whatever reason) all slots allocated to this unit
         '''
 
+        # with several partitions, we only release units placed on our nodes
+        if self._partitions > 1:
+            nodes = (msg.get('slots') or dict()).get('nodes')
+            if nodes and nodes[0]['uid'] not in self._partition_nodes:
+                return True
+
         self._queue_unsched.put(msg)
 
         # return True to keep the cb registered
@@ -536,15 +1233,58 @@ class AgentSchedulingComponent(rpu.Component):
 
     # --------------------------------------------------------------------------
     #
-    def _schedule_units(self):
+    def partition_cb(self, topic, msg):
         '''
-        This method runs in a separate process and hosts the actual scheduling
-        algorithm invocation.  The process is fed by two queues: a queue of
-        incoming tasks to schedule, and a queue of slots freed by finishing
-        tasks.
+        Receive units forwarded by sibling partitions, the acknowledgements for
+        units we forwarded, and capacity advertisements.
         '''
 
-        # The loop alternates between
+        cmd = msg['cmd']
+        arg = msg['arg']
+        idx = arg['partition']
+
+        if cmd == 'schedule':
+            if idx == self._partition:
+                self._queue_sched.put(arg['units'])
+
+        elif cmd == 'ack':
+            if idx == self._partition:
+                self._queue_acks.put(arg['uids'])
+
+        elif cmd == 'capacity':
+            if idx != self._partition:
+                self._siblings[4 * idx:4 * idx + 4] = arg['capacity']
+
+        # return True to keep the cb registered
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def recover_cb(self, topic, msg):
+        '''
+        Receive the live units reported by the executors after a restart (see
+        `_recover()`).
+        '''
+
+        if msg['cmd'] == 'sched_live':
+            self._queue_recover.put(msg['arg']['units'])
+
+        # return True to keep the cb registered
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule_units(self):
+        '''
+        This method runs in a separate process and hosts the actual scheduling
+        algorithm invocation.  The process is fed by two queues: a queue of
+        incoming tasks to schedule, and a queue of slots freed by finishing
+        tasks.
+        '''
+
+        # The loop alternates between
         #
         #   - scheduling tasks from a waitpool;
         #   - pulling new tasks to schedule; and
@@ -587,9 +1327,20 @@ class AgentSchedulingComponent(rpu.Component):
         self.register_output(rps.AGENT_EXECUTING_PENDING,
                              rpc.AGENT_EXECUTING_QUEUE)
 
+        # forward units to and advertise capacity to sibling partitions
+        if self._partitions > 1:
+            self.register_publisher(rpc.AGENT_SCHEDULE_PUBSUB)
+            self._publish_capacity()
+
         resources = True  # fresh start, all is free
         while not self._proc_term.is_set():
 
+            # a recovering scheduler does not place units before it knows
+            # which resources are in use
+            if self._recovering:
+                self._recover()
+                continue
+
           # self._log.debug('=== schedule units 0: %s, w: %d', resources,
           #         len(self._waitpool))
 
@@ -624,18 +1375,84 @@ class AgentSchedulingComponent(rpu.Component):
             active += int(a)
           # self._log.debug('=== schedule units c: %s %s', r, a)
 
-            if not active:
+            if active:
+                self._prof_utilization()
+                self._publish_capacity()
+                self._ckpt_dirty = True
+            else:
                 time.sleep(0.1)  # FIXME: configurable
 
+            self._checkpoint()
+            self._check_forwarded()
+
           # self._log.debug('=== schedule units x: %s %s', resources, active)
 
 
     # --------------------------------------------------------------------------
     #
-    def _prof_sched_skip(self, task):
+    def _drain(self, q):
+        '''
+        Fetch everything currently available on the given queue.  We only wait
+        (briefly) for the first item - the remaining ones are pulled without
+        blocking.
+        '''
 
-        pass
-      # self._prof.prof('schedule_skip', uid=task['uid'])
+        items = list()
+        try:
+            items.append(q.get(timeout=0.001))
+
+            while not self._proc_term.is_set():
+                items.append(q.get_nowait())
+
+        except queue.Empty:
+            pass
+
+        return items
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _prof_utilization(self):
+        '''
+        Record the fraction of used cores, GPUs, memory and LFS as profile event
+        (`schedule_util`), at most once per second and only on change.  Cores
+        and GPUs reserved for a waiting task (see `_reserve()`) are not used.
+        '''
+
+        if self._cap_cores is None:
+            # no capacity index - no cheap way to tell
+            return
+
+        now = time.time()
+        if now - self._util_ts < 1.0:
+            return
+
+        free_cores = self._total_free_cores
+        free_gpus  = self._total_free_gpus
+        if self._reserved:
+            for entry in self._reserved[1]['nodes']:
+                free_cores += sum([len(cmap) for cmap in entry['core_map']])
+                free_gpus  += len(entry['gpu_map'])
+
+        n_nodes = len(self.nodes)
+        util    = list()
+        for name, total, free in [
+                ['cores', self._rm_cores_per_node, free_cores],
+                ['gpus',  self._rm_gpus_per_node,  free_gpus],
+                ['mem',   self._rm_mem_per_node,
+                          sum([node['mem'] for node in self.nodes])],
+                ['lfs',   self._rm_lfs_per_node['size'],
+                          sum([node['lfs']['size'] for node in self.nodes])]]:
+
+            total *= n_nodes
+            if total:
+                util.append('%s:%.2f' % (name, 1.0 - float(free) / total))
+
+        util = ' '.join(util)
+        if util != self._util:
+            self._util    = util
+            self._util_ts = now
+            self._prof.prof('schedule_util', msg=util, ts=now)
 
 
     # --------------------------------------------------------------------------
@@ -644,31 +1461,65 @@ class AgentSchedulingComponent(rpu.Component):
 
       # self.slot_status("before schedule waitpool")
 
-        # sort by inverse tuple size to place larger tasks first and backfill
-        # with smaller tasks.  We only look at cores right now - this needs
-        # fixing for GPU dominated loads.
-        # We define `tuple_size` as
-        #     `(cpu_processes + gpu_processes) * cpu_threads`
-        #
-        tasks = list(self._waitpool.values())
-        tasks.sort(key=lambda x:
-                (x['tuple_size'][0] + x['tuple_size'][2]) * x['tuple_size'][1],
-                 reverse=True)
-
-        # cycle through waitpool, and see if we get anything placed now.
-        scheduled, unscheduled = ru.lazy_bisect(tasks,
-                                                check=self._try_allocation,
-                                                on_skip=self._prof_sched_skip,
-                                                log=self._log)
-
-        self._waitpool = {task['uid']:task for task in unscheduled}
+        # the reservation is renewed in each pass
+        self._unreserve()
+
+        # if not a single core is free, no waiting task can be placed
+        if not self._has_capacity(1, 0):
+            return False, False
+
+        # cycle through the waitpool levels (see `_waitpool_levels()`), and
+        # through the bins of waiting tasks per level, larger tasks first (see
+        # `_waitpool_key()`).  Only the levels and bins are sorted, not the
+        # tasks.  The first untagged task of the highest priority which cannot
+        # be placed gets a reservation before lower priorities are served.
+        scheduled = list()
+        top       = None  # highest waiting priority
+        head      = None  # task to reserve resources for
+        for level, bins in self._waitpool_levels():
+
+            if top is None:
+                top = level[0]
+
+            elif head and level[0] < top:
+                self._reserve(head)
+                head = None
+
+            for ts in sorted(bins, key=self._waitpool_key, reverse=True):
+
+                # skip the whole bin if no node can host a task of that shape
+                if not self._waitpool_fits(ts):
+                    if level[0] == top and not head:
+                        head = self._get_head(next(iter(bins[ts].values())))
+                    continue
+
+                for task in bins[ts].values():
+
+                    if self._try_allocation(task):
+                        scheduled.append(task)
+                        continue
+
+                    if level[0] == top and not head:
+                        head = self._get_head(task)
+
+                    if self._waitpool_blocks(task):
+                        break
+
+        # incoming tasks of lower priority must not use the reserved resources
+        # either
+        if head:
+            self._reserve(head)
+
+        for task in scheduled:
+            self._waitpool_remove(task)
+
         self.advance(scheduled, rps.AGENT_EXECUTING_PENDING, publish=True,
                                                              push=True)
         # method counts as `active` if anything was scheduled
         active = bool(scheduled)
 
-        # if we sccheduled some tasks but not all, we ran out of resources
-        resources = not (bool(unscheduled) and bool(unscheduled))
+        # if tasks remain waiting, we ran out of resources
+        resources = not self._waitpool
 
       # self.slot_status("after  schedule waitpool")
         return resources, active
@@ -678,36 +1529,64 @@ class AgentSchedulingComponent(rpu.Component):
     #
     def _schedule_incoming(self):
 
-        # fetch all units from the queue
+        # fetch all units from the queue.  Units forwarded by other partitions
+        # are acknowledged, and are only handled once.
         units = list()
-        try:
+        acks  = collections.defaultdict(list)
+        for data in self._drain(self._queue_sched):
 
-            while not self._proc_term.is_set():
-                data = self._queue_sched.get(timeout=0.001)
+            if not isinstance(data, list):
+                data = [data]
 
-                if not isinstance(data, list):
-                    data = [data]
+            for unit in data:
 
-                for unit in data:
-                    self._set_tuple_size(unit)
-                    units.append(unit)
+                origin = unit.pop('origin', None)
+                if origin is not None:
+                    acks[origin].append(unit['uid'])
+                    if unit['uid'] in self._received:
+                        continue
+                    self._received.add(unit['uid'])
 
-        except queue.Empty:
-            # no more unschedule requests
-            pass
+                self._set_tuple_size(unit)
+                units.append(unit)
+
+        for idx, uids in acks.items():
+            self.publish(rpc.AGENT_SCHEDULE_PUBSUB,
+                         {'cmd': 'ack',
+                          'arg': {'partition': idx,
+                                  'uids'     : uids}})
 
         if not units:
-            # no resource change, no activity
-            return None, False
+            # no resource change, but acknowledged units count as activity
+            return None, bool(acks)
+
+        units = self._check_partition(self._route_units(units))
+
+        if not units:
+            # all units were forwarded to other partitions
+            return None, True
 
       # self.slot_status("before schedule incoming [%d]" % len(units))
 
-        # handle largest units first
+        # handle units with higher priority first, and then the largest units.
+        # Units of at least the priority of a reserved task can use its
+        # reserved resources, so the reservation is renewed once the first
+        # unit of lower priority comes up.
         # FIXME: this needs lazy-bisect
         to_wait = list()
-        for unit in sorted(units, key=lambda x: x['tuple_size'][0],
+        head    = self._unreserve()
+        for unit in sorted(units, key=lambda x: (self._get_level(x)[0],
+                                                 x['tuple_size'][0]),
                            reverse=True):
 
+            prio = self._get_level(unit)[0]
+            if self._prio_min is None or prio < self._prio_min:
+                self._prio_min = prio
+
+            if head and prio < self._get_level(head)[0]:
+                self._reserve(head)
+                head = None
+
             # either we can place the unit straight away, or we have to
             # put it in the wait pool.
             if self._try_allocation(unit):
@@ -720,8 +1599,12 @@ class AgentSchedulingComponent(rpu.Component):
             else:
                 to_wait.append(unit)
 
-        # all units which could not be scheduled are added to the waitpool
-        self._waitpool.update({task['uid']:task for task in to_wait})
+        if head:
+            self._reserve(head)
+
+        # units which could not be scheduled are passed on to a sibling
+        # partition, or are added to the waitpool
+        self._waitpool_add(self._spill_units(to_wait))
 
         # we performed some activity (worked on units)
         active = True
@@ -729,10 +1612,6 @@ class AgentSchedulingComponent(rpu.Component):
         # if units remain waiting, we are out of usable resources
         resources = not bool(to_wait)
 
-        # incoming units which have to wait are the only reason to rebuild the
-        # tuple_size map
-        self._ts_valid = False
-
       # self.slot_status("after  schedule incoming")
         return resources, active
 
@@ -741,55 +1620,59 @@ class AgentSchedulingComponent(rpu.Component):
     #
     def _unschedule_completed(self):
 
-        to_unschedule = list()
-        try:
-            while not self._proc_term.is_set():
-                unit = self._queue_unsched.get(timeout=0.001)
-                to_unschedule.append(unit)
+        to_unschedule = self._drain(self._queue_unsched)
 
-        except queue.Empty:
-            # no more unschedule requests
-            pass
+        if self._ckpt:
+            to_unschedule = self._ckpt_release(to_unschedule)
+
+        # let the scheduler implementation act on completed units before their
+        # resources are released or reused
+        if to_unschedule:
+            self._handle_completed(to_unschedule)
 
         to_release = list()  # slots of unscheduling tasks
-        placed     = list()  # uids of waiting tasks replacing unscheduled ones
+        placed     = list()  # waiting tasks replacing unscheduled ones
 
-        if to_unschedule:
+        if not self._recycle or not self._waitpool:
+            to_release = to_unschedule
 
-            # rebuild the tuple_size binning, maybe
-            self._refresh_ts_map()
-
-
-        for unit in to_unschedule:
-            # if we find a waiting unit with the same tuple size, we don't free
-            # the slots, but just pass them on unchanged to the waiting unit.
-            # Thus we replace the unscheduled unit on the same cores / GPUs
-            # immediately. This assumes that the `tuple_size` is good enough to
-            # judge the legality of the resources for the new target unit.
-
-          # ts = tuple(unit['tuple_size'])
-          # if self._ts_map.get(ts):
-          #
-          #     replace = self._waitpool[self._ts_map[ts].pop()]
-          #     replace['slots'] = unit['slots']
-          #     placed.append(placed)
-          #
-          #     # unschedule unit A and schedule unit B have the same
-          #     # timestamp
-          #     ts = time.time()
-          #     self._prof.prof('unschedule_stop', uid=unit['uid'],
-          #                     timestamp=ts)
-          #     self._prof.prof('schedule_fast', uid=replace['uid'],
-          #                     timestamp=ts)
-          #     self.advance(replace, rps.AGENT_EXECUTING_PENDING,
-          #                  publish=True, push=True)
-          # else:
-          #
-          #     # no replacement unit found: free the slots, and try to
-          #     # schedule other units of other sizes.
-          #     to_release.append(unit)
-
-            to_release.append(unit)
+        else:
+            for unit in to_unschedule:
+
+                # if we find a waiting unit with the same tuple size, we don't
+                # free the slots, but just pass them on unchanged to the waiting
+                # unit.  Thus we replace the unscheduled unit on the same cores
+                # / GPUs immediately. This assumes that the `tuple_size` is good
+                # enough to judge the legality of the resources for the new
+                # target unit.
+                replace = self._pop_replacement(unit)
+
+                if not replace:
+                    # no replacement unit found: free the slots, and try to
+                    # schedule other units of other sizes.
+                    to_release.append(unit)
+                    continue
+
+                self._waitpool_remove(replace)
+                replace['slots'] = unit['slots']
+
+                self._account_share(unit,    -1)
+                self._account_share(replace, +1)
+
+                if self._ckpt:
+                    self._ckpt_units[replace['uid']] = replace['slots']
+                self._handle_cuda(replace)
+                placed.append(replace)
+
+                # unschedule unit A and schedule unit B have the same
+                # timestamp
+                now = time.time()
+                self._prof.prof('unschedule_stop', uid=unit['uid'],    ts=now)
+                self._prof.prof('schedule_fast',   uid=replace['uid'], ts=now)
+
+        if placed:
+            self.advance(placed, rps.AGENT_EXECUTING_PENDING, publish=True,
+                                                              push=True)
 
         if not to_release:
             if not to_unschedule:
@@ -804,17 +1687,559 @@ class AgentSchedulingComponent(rpu.Component):
         # about resource availability.
         for unit in to_release:
             self.unschedule_unit(unit)
+            self._account_share(unit, -1)
             self._prof.prof('unschedule_stop', uid=unit['uid'])
 
-        # we placed some previously waiting units, and need to remove those from
-        # the waitpool
-        self._waitpool = {task['uid']:task for task in self._waitpool.values()
-                                           if  task['uid'] not in placed}
-
         # we have new resources, and were active
         return True, True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _handle_completed(self, units):
+        '''
+        This is called for units which completed execution (successfully or
+        not) before their resources get released.  Scheduler implementations
+        can overload this method.
+        '''
+
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _ckpt_release(self, units):
+        '''
+        Forget the slots of completed units.  After a recovery, we can receive
+        unschedule requests for units whose slots were never restored (or got
+        freed already) - those are dropped.
+        '''
+
+        known = list()
+        for unit in units:
+
+            if self._ckpt_units.pop(unit['uid'], None) is None:
+                self._log.debug('ignore unschedule for %s', unit['uid'])
+                continue
+
+            known.append(unit)
+
+        return known
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _checkpoint(self):
+        '''
+        Write the slots of all placed units and the waitpool to the checkpoint
+        file, if anything changed and the last checkpoint is older than the
+        configured interval.
+        '''
+
+        if not self._ckpt or not self._ckpt_dirty:
+            return
+
+        now = time.time()
+        if now - self._ckpt_ts < self._ckpt_interval:
+            return
+
+        # the launch method info is the same for all units
+        running = dict()
+        for uid, slots in self._ckpt_units.items():
+            running[uid] = {k: v for k, v in slots.items() if k != 'lm_info'}
+
+        waiting = list(self._waitpool.values())
+
+        self._ckpt.write({'ts'     : now,
+                          'running': running,
+                          'waiting': waiting})
+
+        self._ckpt_ts    = now
+        self._ckpt_dirty = False
+        self._prof.prof('schedule_checkpoint',
+                        msg='running:%d waiting:%d' % (len(running),
+                                                       len(waiting)))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _restore_checkpoint(self):
+        '''
+        Mark the slots of all checkpointed units as busy, and refill the
+        waitpool.  The scheduler then needs to recover before placing units.
+        '''
+
+        data = self._ckpt.read()
+        if not data:
+            return
+
+        for uid, slots in data['running'].items():
+
+            slots['lm_info'] = self._rm_lm_info
+            self._restore_unit({'uid': uid, 'slots': slots})
+            self._ckpt_units[uid] = slots
+
+        waiting = data['waiting']
+        for unit in waiting:
+            # serialization turns the tuple into a list
+            self._set_tuple_size(unit)
+
+        self._waitpool_add(waiting)
+
+        self._recovering   = True
+        self._recover_live = None
+        self._recover_stop = time.time() + self._recover_timeout
+
+        self._log.info('restored %d running and %d waiting units from %s',
+                       len(data['running']), len(waiting), self._ckpt.path)
+        self._prof.prof('schedule_restore',
+                        msg='running:%d waiting:%d' % (len(data['running']),
+                                                       len(waiting)))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _restore_unit(self, unit):
+        '''
+        Mark the slots of a unit which is still running as busy.  Schedulers
+        which keep additional state for placed units should overload this.
+        '''
+
+        self._change_slot_states(unit['slots'], rpc.BUSY)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _recover(self):
+        '''
+        Collect the live units reported by the executors.  Live units which got
+        placed after the last checkpoint are marked busy.  Once the recovery
+        timeout passed, checkpointed units which are not alive anymore are
+        freed.  If no executor reported at all, the checkpointed state is kept.
+        '''
+
+        reports = self._drain(self._queue_recover)
+
+        for units in reports:
+
+            if self._recover_live is None:
+                self._recover_live = set()
+
+            for unit in units:
+
+                uid = unit['uid']
+
+                # only consider units in our own partition
+                if unit['slots']['nodes'][0]['uid'] not in \
+                        self._partition_nodes:
+                    continue
+
+                self._recover_live.add(uid)
+
+                if uid not in self._ckpt_units:
+                    self._restore_unit(unit)
+                    self._ckpt_units[uid] = unit['slots']
+
+        if time.time() < self._recover_stop:
+            if not reports:
+                time.sleep(0.1)
+            return
+
+        gone = list()
+        if self._recover_live is None:
+            self._log.warn('no executor reported live units')
+
+        else:
+            for uid in list(self._ckpt_units):
+                if uid not in self._recover_live:
+                    gone.append({'uid'  : uid,
+                                 'slots': self._ckpt_units.pop(uid)})
+
+        for unit in gone:
+            self.unschedule_unit(unit)
+
+        self._recovering = False
+        self._ckpt_dirty = True
+        self._prof.prof('schedule_recover',
+                        msg='running:%d gone:%d' % (len(self._ckpt_units),
+                                                    len(gone)))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _pop_replacement(self, unit):
+        '''
+        Find a waiting unit which can reuse the slots of the given completed
+        unit.  Returns `None` if no such unit is waiting.
+        '''
+
+        # `tuple_size` may have been turned into a list in transit
+        ts = tuple(unit['tuple_size'])
+
+        # the slots would otherwise be freed and could become part of the
+        # reservation, so they are not passed to units of lower priority
+        if self._reserved: prio = self._get_level(self._reserved[0])[0]
+        else             : prio = None
+
+        for level, bins in self._waitpool_levels():
+
+            if prio is not None and level[0] < prio:
+                break
+
+            for task in bins.get(ts, {}).values():
+
+                # tagged units need to land on specific nodes, which a recycled
+                # slot does not guarantee
+                if not task['description'].get('tag'):
+                    return task
+
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_head(self, task):
+        '''
+        Return the given task if it can hold a reservation (see `_reserve()`),
+        ie. if it is not tagged.  Tagged tasks are constrained to specific
+        nodes, which a reservation does not consider.
+        '''
+
+        if task['description'].get('tag'):
+            return None
+
+        return task
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reserve(self, task):
+        '''
+        Reserve resources for a waiting task of the highest priority which
+        could not be placed: the free cores and GPUs it needs are marked busy on
+        the nodes with the most free resources (on a single node for non-MPI
+        tasks), so that tasks of lower priority cannot use them.  As running
+        tasks complete, the reservation grows until the task fits.  Only cores
+        and GPUs are reserved.
+
+        A reservation is only made if tasks of a lower priority have been seen,
+        and if the scheduler places tasks on the node list (via
+        `schedule_unit()`).  Scheduler implementations which reserve resources
+        in other ways can overload this method.
+        '''
+
+        if self._cap_cores is None or \
+           type(self).schedule_unit == AgentSchedulingComponent.schedule_unit:
+            return
+
+        if self._get_level(task)[0] <= self._prio_min:
+            return
+
+        cores, gpus, n_cores, n_gpus = self._get_needs(task['tuple_size'])
+
+        # non-MPI tasks need all resources on one node
+        single = (cores == n_cores and gpus == n_gpus)
+
+        if gpus: buckets = self._cap_gpus
+        else   : buckets = self._cap_cores
+
+        # nodes with the most free resources first
+        order = (idx for n in range(len(buckets) - 1, -1, -1)
+                     for idx in buckets[n])
+
+        slots = {'nodes': list()}
+        for idx in order:
+
+            node  = self.nodes[idx]
+            c_ids = [i for i, state in enumerate(node['cores'])
+                                    if state == rpc.FREE][:max(0, n_cores)]
+            g_ids = [i for i, state in enumerate(node['gpus'])
+                                    if state == rpc.FREE][:max(0, n_gpus)]
+
+            if c_ids or g_ids:
+                slots['nodes'].append({'uid'     : node['uid'],
+                                       'name'    : node['name'],
+                                       'core_map': [c_ids] if c_ids else [],
+                                       'gpu_map' : [[g] for g in g_ids],
+                                       'lfs'     : {'path': None, 'size': 0},
+                                       'mem'     : 0})
+            n_cores -= len(c_ids)
+            n_gpus  -= len(g_ids)
+
+            if single or (n_cores <= 0 and n_gpus <= 0):
+                break
+
+        if not slots['nodes']:
+            return
+
+        self._change_slot_states(slots, rpc.BUSY)
+        self._reserved = [task, slots]
+
+        self._log.debug('reserve for %s: %s', task['uid'],
+                        [[n['uid'], n['core_map'], n['gpu_map']]
+                         for n in slots['nodes']])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _unreserve(self):
+        '''
+        Release the reserved resources (see `_reserve()`), and return the task
+        they were reserved for (or `None`).
+        '''
+
+        if not self._reserved:
+            return None
+
+        task, slots    = self._reserved
+        self._reserved = None
+        self._change_slot_states(slots, rpc.FREE)
+
+        return task
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_capacity(self):
+        '''
+        Return the free capacity of this partition as `[cores, gpus,
+        total_cores, total_gpus]`: the largest number of free cores and GPUs
+        on any node, and the number of free cores and GPUs overall.
+        '''
+
+        return [self._max_capacity(self._cap_cores),
+                self._max_capacity(self._cap_gpus),
+                int(self._total_free_cores),
+                int(self._total_free_gpus)]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _publish_capacity(self):
+        '''
+        Advertise the free capacity of this partition to the sibling partitions,
+        at most ten times per second and only on change.
+        '''
+
+        if self._partitions == 1 or self._cap_cores is None:
+            return
+
+        now = time.time()
+        if now - self._capacity_ts < 0.1:
+            return
+
+        capacity = self._get_capacity()
+        if capacity != self._capacity:
+            self._capacity    = capacity
+            self._capacity_ts = now
+            self.publish(rpc.AGENT_SCHEDULE_PUBSUB,
+                         {'cmd': 'capacity',
+                          'arg': {'partition': self._partition,
+                                  'capacity' : capacity}})
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _forward_units(self, units, event):
+        '''
+        Pass units on to the partitions recorded in their `partition` field.
+        The units are kept until the partitions acknowledge them (see
+        `_check_forwarded()`).
+        '''
+
+        now     = time.time()
+        targets = collections.defaultdict(list)
+        for unit in units:
+            self._prof.prof(event, uid=unit['uid'], msg=unit['partition'])
+            unit['origin'] = self._partition
+            self._forwarded[unit['uid']] = [now, unit]
+            targets[unit['partition']].append(unit)
+
+        for idx, tunits in targets.items():
+            self.publish(rpc.AGENT_SCHEDULE_PUBSUB,
+                         {'cmd': 'schedule',
+                          'arg': {'partition': idx,
+                                  'units'    : tunits}})
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_forwarded(self):
+        '''
+        Drop the forwarded units which got acknowledged, and forward those
+        again which were not acknowledged within `sched_forward_timeout`.
+        '''
+
+        if not self._forwarded:
+            return
+
+        for uids in self._drain(self._queue_acks):
+            for uid in uids:
+                self._forwarded.pop(uid, None)
+
+        now = time.time()
+        if now - self._forward_ts < min(1.0, self._forward_timeout):
+            return
+
+        self._forward_ts = now
+        resend = [unit for ts, unit in self._forwarded.values()
+                       if now - ts >= self._forward_timeout]
+        if resend:
+            self._log.warn('forward %d unacknowledged units again',
+                           len(resend))
+            self._forward_units(resend, 'schedule_resend')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _fits_partition(self, needs, n_nodes):
+        '''
+        Check if a task with the given needs (see `_get_needs()`) can ever be
+        placed on a partition with `n_nodes` nodes.
+        '''
+
+        cores, gpus, total_cores, total_gpus = needs
+
+        return cores       <= self._rm_cores_per_node           and \
+               gpus        <= self._rm_gpus_per_node            and \
+               total_cores <= self._rm_cores_per_node * n_nodes and \
+               total_gpus  <= self._rm_gpus_per_node  * n_nodes
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_partition(self, units):
+        '''
+        Forward units which are too large for this partition to a partition
+        with enough nodes, and fail units which are too large for any
+        partition.  Return the units which stay in this partition.
+        '''
+
+        if self._partitions == 1:
+            return units
+
+        keep    = list()
+        forward = list()
+        for unit in units:
+
+            needs = self._get_needs(unit['tuple_size'])
+            sizes = self._partition_sizes
+
+            if self._fits_partition(needs, sizes[self._partition]):
+                keep.append(unit)
+                continue
+
+            targets = [idx for idx in range(self._partitions)
+                           if self._fits_partition(needs, sizes[idx])]
+            if targets:
+                unit['partition'] = targets[0]
+                forward.append(unit)
+                continue
+
+            self._log.error('unit %s is too large for any partition',
+                            unit['uid'])
+            if unit.get('stderr') is None:
+                unit['stderr'] = ''
+            unit['stderr'] += '\nPilot cannot schedule compute unit: ' \
+                              'too large for any scheduler partition\n'
+            self.advance(unit, rps.FAILED, publish=True, push=False)
+
+        if forward:
+            self._forward_units(forward, 'schedule_route')
+
+        return keep
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _route_units(self, units):
+        '''
+        Forward units to their home partition (see `sched_routing`), and return
+        the units which stay in this partition.  Units which have been routed
+        or spilled before are kept.
+        '''
+
+        if self._partitions == 1 or self._routing == 'queue':
+            return units
+
+        keep    = list()
+        forward = list()
+        for unit in units:
+
+            if unit.get('partition') is None:
+
+                if self._routing == 'hash': key = unit['uid']
+                else                      : key = str(list(unit['tuple_size']))
+
+                # `hash()` is salted per process, `crc32` is not
+                unit['partition'] = zlib.crc32(key.encode()) % self._partitions
+
+                if unit['partition'] != self._partition:
+                    forward.append(unit)
+                    continue
+
+            keep.append(unit)
+
+        if forward:
+            self._forward_units(forward, 'schedule_route')
+
+        return keep
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _spill_units(self, units):
+        '''
+        Forward units which could not be placed in this partition to a sibling
+        partition which advertised enough free capacity (the one with the most
+        free cores), and return the units which stay in this partition.  Units
+        are spilled only once, and tagged units are never spilled.
+        '''
+
+        if self._partitions == 1 or not units:
+            return units
+
+        keep  = list()
+        spill = list()
+        for unit in units:
+
+            if unit.get('spilled') or unit['description'].get('tag'):
+                keep.append(unit)
+                continue
+
+            needs  = self._get_needs(unit['tuple_size'])
+            target = None
+            best   = -1
+            for idx in range(self._partitions):
+
+                if idx == self._partition:
+                    continue
+
+                cap = self._siblings[4 * idx:4 * idx + 4]
+                if cap[2] > best and \
+                        all([n <= c for n, c in zip(needs, cap)]):
+                    target = idx
+                    best   = cap[2]
+
+            if target is None:
+                keep.append(unit)
+                continue
+
+            # account for the spilled unit until the sibling advertises again
+            base = 4 * target
+            self._siblings[base + 2] -= needs[2]
+            self._siblings[base + 3] -= needs[3]
+
+            unit['partition'] = target
+            unit['spilled']   = True
+            spill.append(unit)
+
+        if spill:
+            self._forward_units(spill, 'schedule_spill')
+
+        return keep
+
+
     # --------------------------------------------------------------------------
     #
     def _try_allocation(self, unit):
@@ -838,6 +2263,10 @@ class AgentSchedulingComponent(rpu.Component):
         self._change_slot_states(slots, rpc.BUSY)
         unit['slots'] = slots
 
+        if self._ckpt:
+            self._ckpt_units[uid] = slots
+
+        self._account_share(unit, +1)
         self._handle_cuda(unit)
 
         # got an allocation, we can go off and launch the process
@@ -961,10 +2390,10 @@ class AgentSchedulingComponent(rpu.Component):
         Scheduling, in very general terms, maps resource request to available
         resources.  While the scheduler may check arbitrary task attributes in
         order to estimate the resource requirements of the tast, we assume that
-        the most basic attributes (cores, threads, GPUs, MPI/non-MPI) determine
-        the resulting placement decision.  Specifically, we assume that this
-        tuple of attributes result in a placement that is valid for all tasks
-        which have the same attribute tuple.
+        the most basic attributes (cores, threads, GPUs, MPI/non-MPI, LFS and
+        memory) determine the resulting placement decision.  Specifically, we
+        assume that this tuple of attributes result in a placement that is
+        valid for all tasks which have the same attribute tuple.
 
         To speed up that tuple lookup and to simplify some scheduler
         optimizations, we extract that attribute tuple on task arrival, and will
@@ -975,7 +2404,9 @@ class AgentSchedulingComponent(rpu.Component):
         unit['tuple_size'] = tuple([d.get('cpu_processes', 1),
                                     d.get('cpu_threads',   1),
                                     d.get('gpu_processes', 0),
-                                    d.get('cpu_process_type')])
+                                    d.get('cpu_process_type'),
+                                    d.get('lfs_per_process', 0),
+                                    d.get('mem_per_process', 0)])
 
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,427 @@
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import copy
+import heapq
+import random
+import time
+import collections
+
+import radical.utils as ru
+
+from ... import states                   as rps
+from ... import compute_unit_description as rpcud
+
+from .base import AgentSchedulingComponent
+from .base import SCHEDULER_NAME_CONTINUOUS
+from .base import SCHEDULER_NAME_CONTINUOUS_COLO
+from .base import SCHEDULER_NAME_CONTINUOUS_BACKFILL
+from .base import SCHEDULER_NAME_CONTINUOUS_DAG
+from .base import SCHEDULER_NAME_CONTINUOUS_ORDERED
+from .base import SCHEDULER_NAME_HOMBRE
+from .base import SCHEDULER_NAME_HOMBRE_MULTI
+from .base import SCHEDULER_NAME_NOOP
+
+from .noop import Noop
+
+
+# ------------------------------------------------------------------------------
+#
+# This module runs agent schedulers standalone, i.e., without an agent, without
+# ZMQ communication channels and without a database.  A workload is replayed
+# through the scheduler in simulated time: units are submitted at their `submit`
+# time, run for their `runtime` once placed, and are then released again.  Only
+# the time spent in the scheduler itself is measured, and is reported as
+# placement and release rates.  The simulated time is used to report how long
+# units waited for placement, and how well the resources were utilized.  The
+# `NOOP` scheduler leaves placement to the executor and does not track resource
+# usage, so no utilization is reported for it.
+#
+# A workload is a list of entries of the form
+#
+#   {'description': {...},   # compute unit description (as dict)
+#    'submit'     : 0.0,     # submission time    (simulated, in seconds)
+#    'runtime'    : 10.0}    # unit execution time (simulated, in seconds)
+#
+# and can be generated (`create_workload()`) or loaded from a json file.
+#
+SCHEDULERS = [SCHEDULER_NAME_CONTINUOUS,
+              SCHEDULER_NAME_CONTINUOUS_COLO,
+              SCHEDULER_NAME_CONTINUOUS_ORDERED,
+              SCHEDULER_NAME_CONTINUOUS_BACKFILL,
+              SCHEDULER_NAME_CONTINUOUS_DAG,
+              SCHEDULER_NAME_HOMBRE,
+              SCHEDULER_NAME_HOMBRE_MULTI,
+              SCHEDULER_NAME_NOOP]
+
+
+# ------------------------------------------------------------------------------
+#
+class _Session(object):
+    '''
+    The schedulers only need logger and profiler instances from their session.
+    '''
+
+    def __init__(self, path, debug=None):
+
+        self._path  = path
+        self._debug = debug
+
+    def _get_logger(self, name, level=None):
+
+        if self._debug: targets = ['.']
+        else          : targets = ['null']
+
+        return ru.Logger(name=name, ns='radical.pilot', path=self._path,
+                         targets=targets, level=self._debug)
+
+    def _get_reporter(self, name):
+
+        return ru.Reporter(name=name, ns='radical.pilot', path=self._path)
+
+    def _get_profiler(self, name):
+
+        return ru.Profiler(name=name, ns='radical.pilot', path=self._path)
+
+
+# ------------------------------------------------------------------------------
+#
+def create_rm_info(nodes=1, cores=8, gpus=0, smt=1, mem=0, lfs=0):
+    '''
+    Create a synthetic resource manager info dict for `nodes` nodes with the
+    given number of cores (times `smt`), GPUs, memory and local storage (in
+    MByte) per node.
+    '''
+
+    return {'name'          : 'BENCHMARK',
+            'lm_info'       : dict(),
+            'node_list'     : [['node_%05d' % i, 'node_%05d' % i]
+                                                 for i in range(nodes)],
+            'cores_per_node': cores * smt,
+            'gpus_per_node' : gpus,
+            'smt'           : smt,
+            'mem_per_node'  : mem,
+            'lfs_per_node'  : {'path': '/tmp' if lfs else None,
+                               'size': lfs}}
+
+
+# ------------------------------------------------------------------------------
+#
+def create_workload(n_units, shapes=None, runtime=10.0, rate=None, bag=None,
+                    hint=False, seed=0):
+    '''
+    Create a synthetic workload of `n_units` units.  `shapes` is a list of
+    description dicts (e.g., `{'cpu_processes': 4, 'cpu_process_type': 'MPI'}`)
+    which are used round-robin.  Runtimes are uniformly distributed around the
+    given mean (+/- 50%).  If `rate` is given, units are submitted at that rate
+    (units/second), otherwise all at once.  If `bag` is given, subsequent units
+    are grouped into bags of that size, which are tagged for colocation
+    (`ContinuousColo`) and ordered execution (`ContinuousOrdered`).  If `hint`
+    is set, the runtimes are also passed as `runtime` estimates in the unit
+    descriptions (`ContinuousBackfill`).
+    '''
+
+    if not shapes:
+        shapes = [dict()]
+
+    rng      = random.Random(seed)
+    workload = list()
+
+    for i in range(n_units):
+
+        descr = copy.deepcopy(shapes[i % len(shapes)])
+
+        if bag:
+            descr['tags'] = {'colocate': {'bag'  : 'bag.%06d' % (i // bag),
+                                          'size' : bag},
+                             'order'   : {'ns'   : 'benchmark',
+                                          'order': i // bag,
+                                          'size' : bag}}
+
+        entry = {'description': descr,
+                 'submit'     : float(i) / rate if rate else 0.0,
+                 'runtime'    : runtime * rng.uniform(0.5, 1.5)}
+
+        if hint:
+            descr['runtime'] = entry['runtime']
+
+        workload.append(entry)
+
+    return workload
+
+
+# ------------------------------------------------------------------------------
+#
+def create_scheduler(name, rm_info, cfg=None, path=None, debug=None):
+    '''
+    Create and initialize a scheduler instance which is not connected to any
+    communication channel.  `cfg` can contain additional scheduler settings
+    (like `node_store` or `sched_policy`).  The returned scheduler records all
+    units it advances to `AGENT_EXECUTING_PENDING` in its `_placed` list.
+    '''
+
+    if not path:
+        path = '.'
+
+    sched_cfg = ru.Config(cfg={'uid'               : 'agent.scheduling.0000',
+                               'owner'             : 'agent.0',
+                               'pid'               : 'pilot.0000',
+                               'path'              : path,
+                               'debug'             : debug,
+                               'scheduler'         : name,
+                               'rm_info'           : rm_info,
+                               'task_launch_method': 'FORK',
+                               'sched_mode'        : 'thread'})
+    if cfg:
+        sched_cfg.update(cfg)
+
+    sched = AgentSchedulingComponent.create(sched_cfg, _Session(path, debug))
+
+    # ----------------------------------------------------------------------
+    def advance(units, state=None, publish=True, push=False, ts=None,
+                prof=True):
+
+        if state == rps.AGENT_EXECUTING_PENDING:
+            sched._placed.extend(ru.as_list(units))
+
+    def register_subscriber(pubsub, cb):
+        pass
+    # ----------------------------------------------------------------------
+
+    sched._placed             = list()
+    sched.advance             = advance
+    sched.register_subscriber = register_subscriber
+
+    sched._initialize_scheduler()
+
+    return sched
+
+
+# ------------------------------------------------------------------------------
+#
+class _Driver(object):
+    '''
+    Feed units to and release units from schedulers which use the scheduling
+    loop of the base class.
+    '''
+
+    def __init__(self, sched):
+
+        self._sched = sched
+
+    def submit(self, units):
+
+        self._sched._queue_sched.put(units)
+        self._sched._schedule_incoming()
+
+    def release(self, units):
+
+        # units complete successfully (like with the `sleep` executor)
+        for unit in units:
+            unit['target_state'] = rps.DONE
+            self._sched._queue_unsched.put(unit)
+        self._sched._unschedule_completed()
+
+    def schedule(self):
+
+        self._sched._schedule_waitpool()
+
+
+# ------------------------------------------------------------------------------
+#
+class _DriverBags(_Driver):
+    '''
+    Feed units to and release units from `ContinuousColo` and
+    `ContinuousOrdered`, which overload the scheduling loop.
+    '''
+
+    def submit(self, units):
+
+        self._sched._schedule_units(units)
+
+    def release(self, units):
+
+        self._sched._handle_completed(units)
+
+        for unit in units:
+            self._sched.unschedule_unit(unit)
+            self._sched._account_share(unit, -1)
+
+        # `ContinuousOrdered` waits for units to reach its trigger state
+        if hasattr(self._sched, '_state_cb'):
+            things = [{'uid'        : unit['uid'],
+                       'type'       : 'unit',
+                       'state'      : self._sched._trigger_state,
+                       'description': unit['description']} for unit in units]
+            self._sched._state_cb(None, {'cmd': 'update', 'arg': things})
+
+    def schedule(self):
+
+        self._sched.schedule_cb(None, None)
+
+
+# ------------------------------------------------------------------------------
+#
+def _percentile(values, p):
+
+    if not values:
+        return 0.0
+
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_resources(unit):
+    '''
+    Return the cores and GPUs allocated to a unit, as lists of `(node uid, id)`
+    tuples.  Those are taken from the unit's slots, as schedulers interpret the
+    unit descriptions differently.  Some schedulers (HOMBRE) oversubscribe
+    cores, so the same core can be used by several units.
+    '''
+
+    cores = list()
+    gpus  = list()
+    for node in (unit.get('slots') or {}).get('nodes', []):
+        for cmap in node['core_map']:
+            cores.extend([(node['uid'], core) for core in cmap])
+        for gmap in node['gpu_map']:
+            gpus.extend([(node['uid'], gpu) for gpu in gmap])
+
+    return cores, gpus
+
+
+# ------------------------------------------------------------------------------
+#
+def run(sched, workload):
+    '''
+    Replay the workload through the given scheduler (see `create_scheduler()`)
+    and return a dict of metrics.
+    '''
+
+    if sched.__class__.__name__ in ['ContinuousColo', 'ContinuousOrdered']:
+        driver = _DriverBags(sched)
+    else:
+        driver = _Driver(sched)
+
+    n_nodes   = len(sched._rm_node_list)
+    n_cores   = n_nodes * sched._rm_cores_per_node
+    n_gpus    = n_nodes * sched._rm_gpus_per_node
+
+    # sort units by submission time
+    units     = list()
+    for idx, entry in enumerate(sorted(workload, key=lambda x: x['submit'])):
+        descr = rpcud.ComputeUnitDescription(entry['description']).as_dict()
+        units.append({'uid'        : 'unit.%06d' % idx,
+                      'description': descr,
+                      'submit'     : entry['submit'],
+                      'runtime'    : entry['runtime']})
+
+    running   = list()  # heap of [stop time, idx, unit]
+    waits     = list()  # simulated time from submission to placement
+    util      = list()  # [[time, cores, gpus], ...] used fraction over time
+    t_place   = 0.0     # wall time spent placing units
+    t_release = 0.0     # wall time spent releasing units
+    n_release = 0
+    busy      = [collections.Counter(),   # (node uid, core id): units
+                 collections.Counter()]   # (node uid, gpu  id): units
+    now       = 0.0
+    idx       = 0
+
+    # schedulers which consider unit runtimes need to use the simulated time
+    if hasattr(sched, '_clock'):
+        sched._clock = lambda: now
+
+    while idx < len(units) or running:
+
+        # advance simulated time to the next event
+        if idx == len(units) or \
+           (running and running[0][0] < units[idx]['submit']):
+            now = running[0][0]
+        else:
+            now = max(now, units[idx]['submit'])
+
+        # release units which completed by now
+        done = list()
+        while running and running[0][0] <= now:
+            done.append(heapq.heappop(running)[2])
+
+        if done:
+            start      = time.time()
+            driver.release(done)
+            t_release += time.time() - start
+            n_release += len(done)
+
+            for unit in done:
+                for used, ids in zip(busy, [unit['cores'], unit['gpus']]):
+                    for key in ids:
+                        used[key] -= 1
+                        if not used[key]:
+                            del used[key]
+
+        # submit units which arrived by now
+        new = list()
+        while idx < len(units) and units[idx]['submit'] <= now:
+            new.append(units[idx])
+            idx += 1
+
+        start = time.time()
+        if done:
+            driver.schedule()
+        if new:
+            driver.submit(new)
+        t_place += time.time() - start
+
+        for unit in sched._placed:
+
+            unit['cores'], unit['gpus'] = _get_resources(unit)
+            busy[0].update(unit['cores'])
+            busy[1].update(unit['gpus'])
+
+            waits.append(now - unit['submit'])
+            heapq.heappush(running, [now + unit['runtime'],
+                                     unit['uid'], unit])
+        del sched._placed[:]
+
+        util.append([now, float(len(busy[0])) / n_cores if n_cores else 0.0,
+                          float(len(busy[1])) / n_gpus  if n_gpus  else 0.0])
+
+        if not running and idx == len(units):
+            # nothing runs, nothing arrives: remaining units can't be placed
+            break
+
+    # time-weighted average utilization over the makespan
+    avg = [0.0, 0.0]
+    for (t0, c0, g0), (t1, _, _) in zip(util[:-1], util[1:]):
+        avg[0] += c0 * (t1 - t0)
+        avg[1] += g0 * (t1 - t0)
+
+    if now:
+        avg = [avg[0] / now, avg[1] / now]
+
+    waits.sort()
+
+    # units are not placed onto resources, so resources cannot be utilized
+    if isinstance(sched, Noop):
+        avg  = [None, None]
+        util = list()
+
+    return {'scheduler'   : sched.__class__.__name__,
+            'units'       : len(units),
+            'placed'      : len(waits),
+            'released'    : n_release,
+            'place_rate'  : len(waits) / t_place   if t_place   else 0.0,
+            'release_rate': n_release  / t_release if t_release else 0.0,
+            'wait_p50'    : _percentile(waits, 50),
+            'wait_p90'    : _percentile(waits, 90),
+            'wait_p99'    : _percentile(waits, 99),
+            'wait_max'    : waits[-1] if waits else 0.0,
+            'util_cores'  : avg[0],
+            'util_gpus'   : avg[1],
+            'makespan'    : now,
+            'util'        : util}
+
+
+# ------------------------------------------------------------------------------
+
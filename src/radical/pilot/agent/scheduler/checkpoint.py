@@ -0,0 +1,200 @@
+
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import os
+import json
+import mmap
+import zlib
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# ------------------------------------------------------------------------------
+#
+# The scheduler checkpoint is kept in a memory mapped file, so that writing
+# a checkpoint does not cost any system call.  The pages of the file survive the
+# death of the scheduler process, and are written back to disk by the OS.
+#
+# The file holds two body slots of equal capacity, which are written in turns,
+# and a header with the sequence number, length and checksum of each slot:
+#
+#   magic    [8 bytes] : 'RPCKPT' + codec ('M' for msgpack, 'J' for json) + '1'
+#   capacity [8 bytes] : size of each body slot
+#   header 0 [24 bytes]: seq, length, crc32 of body slot 0
+#   header 1 [24 bytes]: seq, length, crc32 of body slot 1
+#   body 0   [capacity bytes]
+#   body 1   [capacity bytes]
+#
+# A slot header is only written after its body is complete, so a scheduler
+# dying while writing a checkpoint leaves the previous one intact.  If the file
+# needs to grow, a new file is written and then renamed over the existing one.
+# Reading returns the valid slot with the highest sequence number.
+#
+_HEAD = struct.Struct('<8sQ')
+_SLOT = struct.Struct('<QQI4x')
+_BODY = _HEAD.size + 2 * _SLOT.size
+
+_MIN_CAPACITY = 1024 * 1024
+
+
+# ------------------------------------------------------------------------------
+#
+class Checkpoint(object):
+    '''
+    A memory mapped checkpoint file which stores a single, serializable object.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path):
+
+        self._path  = path
+        self._seq   = 0
+        self._cap   = 0
+        self._mmap  = None
+        self._codec = b'M' if msgpack else b'J'
+
+        if os.path.isfile(path):
+            self._open()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def path(self):
+        return self._path
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _open(self):
+
+        with open(self._path, 'r+b') as fd:
+            self._mmap = mmap.mmap(fd.fileno(), 0)
+
+        magic, self._cap = _HEAD.unpack_from(self._mmap, 0)
+
+        if magic[:6] != b'RPCKPT' or \
+           len(self._mmap) != _BODY + 2 * self._cap:
+            raise RuntimeError('invalid checkpoint file %s' % self._path)
+
+        self._codec = magic[6:7]
+
+        # new checkpoints continue the existing sequence
+        for idx in [0, 1]:
+            seq = _SLOT.unpack_from(self._mmap, _HEAD.size + idx * _SLOT.size)[0]
+            self._seq = max(self._seq, seq)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _create(self, cap, data):
+        '''
+        Create a new checkpoint file with the given slot capacity which holds
+        `data` as next checkpoint, and atomically replace any existing one.
+        The new file is complete before it replaces the existing one, so that
+        a valid checkpoint exists at any point in time.
+        '''
+
+        tmp = '%s.tmp' % self._path
+        with open(tmp, 'w+b') as fd:
+            fd.truncate(_BODY + 2 * cap)
+            mm = mmap.mmap(fd.fileno(), 0)
+
+        _HEAD.pack_into(mm, 0, b'RPCKPT' + self._codec + b'1', cap)
+        self._put(mm, cap, data)
+        mm.flush()
+
+        os.rename(tmp, self._path)
+
+        if self._mmap:
+            self._mmap.close()
+
+        self._mmap = mm
+        self._cap  = cap
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _put(self, mm, cap, data):
+
+        self._seq += 1
+        idx = self._seq % 2
+        off = _BODY + idx * cap
+
+        mm[off:off + len(data)] = data
+        _SLOT.pack_into(mm, _HEAD.size + idx * _SLOT.size,
+                        self._seq, len(data), zlib.crc32(data))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def write(self, obj):
+        '''
+        Serialize `obj` into the next body slot.  The file grows as needed.
+        '''
+
+        if self._codec == b'M': data = msgpack.packb(obj, use_bin_type=True)
+        else                  : data = json.dumps(obj).encode('utf-8')
+
+        if len(data) > self._cap:
+            self._create(max(2 * len(data), _MIN_CAPACITY), data)
+        else:
+            self._put(self._mmap, self._cap, data)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def read(self):
+        '''
+        Return the object stored by the last complete `write()`, or `None` if
+        no valid checkpoint exists.
+        '''
+
+        if not self._mmap:
+            return None
+
+        found = None
+        for idx in [0, 1]:
+
+            seq, size, crc = _SLOT.unpack_from(self._mmap,
+                                               _HEAD.size + idx * _SLOT.size)
+            if not seq or size > self._cap:
+                continue
+
+            off  = _BODY + idx * self._cap
+            data = self._mmap[off:off + size]
+
+            if zlib.crc32(data) != crc:
+                continue
+
+            if not found or seq > found[0]:
+                found = [seq, data]
+
+        if not found:
+            return None
+
+        if self._codec == b'M':
+            if not msgpack:
+                raise RuntimeError('checkpoint %s needs msgpack' % self._path)
+            return msgpack.unpackb(found[1], raw=False)
+
+        return json.loads(found[1].decode('utf-8'))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+
+
+# ------------------------------------------------------------------------------
+
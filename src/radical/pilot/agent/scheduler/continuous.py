@@ -3,11 +3,13 @@ __copyright__ = "Copyright 2013-2016, http://radical.rutgers.edu"
 __license__ = "MIT"
 
 import pprint
+import collections
 
 import math as m
 
 from ...   import constants as rpc
 from .base import AgentSchedulingComponent
+from .base import np
 
 
 # ------------------------------------------------------------------------------
@@ -53,6 +55,10 @@ from .base import AgentSchedulingComponent
 # lfs storage and memory is specified in MByte.  The scheduler assumes that
 # both are freed when the unit finishes.
 #
+# With the `numpy` node store (see `base.py`), `cores` and `gpus` are rows of
+# the scheduler's core and gpu state arrays, and each node has an additional
+# `idx` entry pointing to that row.
+#
 #
 # Unit Tagging:
 #
@@ -60,9 +66,25 @@ from .base import AgentSchedulingComponent
 # so that the unit can reuse the previous unit's data.  This assumes that
 # storage is not freed when the units finishes.
 #
+# For each tag, the scheduler keeps the set of nodes used by the last unit with
+# that tag, and the search for a tagged unit only considers those nodes.  Once
+# all placed units of a tag completed, the tag becomes idle: its history is kept
+# for units which arrive later, but only for the `tag_history` most recently
+# idle tags, so that the memory used for tags remains bounded.
+#
 # FIXME: the alert reader will realize a discrepancy in the above set of
 #        assumptions.
 #
+#
+# Shape Cache:
+#
+# The placement parameters which `schedule_unit` derives from a unit description
+# (slots per node, minimal per-node capacity, etc.) only depend on the unit's
+# `tuple_size` and on the (static) node sizes.  They are computed once per
+# `tuple_size` and cached.  For continuous MPI allocations, the cache also keeps
+# the index of the last node of the last allocation for that shape, and the
+# next search for that shape starts there.
+#
 # ------------------------------------------------------------------------------
 #
 class Continuous(AgentSchedulingComponent):
@@ -95,6 +117,24 @@ class Continuous(AgentSchedulingComponent):
         #
         self._scattered = self._cfg.get('scattered', False)
 
+        # * tag_history:
+        #   The number of idle tags (tags without placed units) whose history
+        #   is retained.  A tagged unit arriving after the history of its tag
+        #   got dropped is placed like an untagged unit.  The default is
+        #   `10000`.
+        #
+        self._tag_limit = self._cfg.get('tag_history', 10000)
+
+        if self._tag_limit < 0:
+            raise ValueError('invalid tag_history: %s' % self._tag_limit)
+
+        self._tag_units = dict()                     # uid: tag of placed units
+        self._tag_live  = dict()                     # tag: number placed units
+        self._tag_idle  = collections.OrderedDict()  # idle tags, oldest first
+
+        # placement parameters per `tuple_size`, see `_get_shape()`
+        self._shapes = dict()
+
         self.nodes = []
         for node, node_uid in self._rm_node_list:
 
@@ -102,7 +142,7 @@ class Continuous(AgentSchedulingComponent):
                           'uid'    : node_uid,
                           'cores'  : [rpc.FREE] * self._rm_cores_per_node,
                           'gpus'   : [rpc.FREE] * self._rm_gpus_per_node,
-                          'lfs'    :              self._rm_lfs_per_node,
+                          'lfs'    :         dict(self._rm_lfs_per_node),
                           'mem'    :              self._rm_mem_per_node}
 
             # summit
@@ -140,10 +180,13 @@ class Continuous(AgentSchedulingComponent):
 
     # --------------------------------------------------------------------------
     #
-    def _iterate_nodes(self):
+    def _iterate_nodes(self, offset=None):
         # note that the first index is yielded twice, so that the respecitve
         # node can function as first and last node in an allocation.
 
+        if offset is not None:
+            self._node_offset = offset
+
         iterator_count = 0
 
         while iterator_count < len(self.nodes):
@@ -153,6 +196,30 @@ class Continuous(AgentSchedulingComponent):
             self._node_offset  = self._node_offset % len(self.nodes)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _handle_completed(self, units):
+        '''
+        Mark tags without placed units as idle, and drop the history of the
+        oldest idle tags beyond the configured limit.
+        '''
+
+        for unit in units:
+
+            tag = self._tag_units.pop(unit['uid'], None)
+            if not tag:
+                continue
+
+            self._tag_live[tag] -= 1
+            if not self._tag_live[tag]:
+                del self._tag_live[tag]
+                self._tag_idle[tag] = True
+
+        while len(self._tag_idle) > self._tag_limit:
+            tag, _ = self._tag_idle.popitem(last=False)
+            del self._tag_history[tag]
+
+
     # --------------------------------------------------------------------------
     #
     def unschedule_unit(self, unit):
@@ -202,8 +269,8 @@ class Continuous(AgentSchedulingComponent):
         '''
 
         # check if the node can host the request
-        free_cores = node['cores'].count(rpc.FREE)
-        free_gpus  = node['gpus'].count(rpc.FREE)
+        free_cores = self._free_cores[node['idx']]
+        free_gpus  = self._free_gpus[node['idx']]
         free_lfs   = node['lfs']['size']
         free_mem   = node['mem']
 
@@ -232,6 +299,12 @@ class Continuous(AgentSchedulingComponent):
         # find at most `find_slots`
         alc_slots = min(alc_slots, find_slots)
 
+        if self._node_store == 'numpy':
+            return self._find_resources_vectorized(node, alc_slots,
+                                                   cores_per_slot,
+                                                   gpus_per_slot,
+                                                   lfs_per_slot, mem_per_slot)
+
         # we should be able to host the slots - dig out the precise resources
         slots     = list()
         node_uid  = node['uid']
@@ -276,34 +349,49 @@ class Continuous(AgentSchedulingComponent):
 
     # --------------------------------------------------------------------------
     #
-    #
-    def schedule_unit(self, unit):
+    def _find_resources_vectorized(self, node, alc_slots, cores_per_slot,
+                                   gpus_per_slot, lfs_per_slot, mem_per_slot):
+        '''
+        Same as the second half of `_find_resources`, but for the `numpy` node
+        store: the free cores and gpus are picked from the node's state rows in
+        one operation, instead of walking the node's resources.  The caller
+        made sure that `alc_slots` slots fit onto the node.
         '''
-        Find an available set of slots, potentially across node boundaries (in
-        the MPI case).  By default, we only allow for partial allocations on the
-        first and last node - but all intermediate nodes MUST be completely used
-        (this is the 'CONTINUOUS' scheduler after all).
 
-        If the scheduler is configured with `scattered=True`, then that
-        constraint is relaxed, and any set of slots (be it continuous across
-        nodes or not) is accepted as valid allocation.
+        n_cores = alc_slots * cores_per_slot
+        n_gpus  = alc_slots * gpus_per_slot
 
-        No matter the mode, we always make sure that we allocate slots in chunks
-        of cores, gpus, lfs and mem required per process - otherwise the
-        application processes would not be able to acquire the requested
-        resources on the respective node.
+        # the slots are sent over the wire - convert to plain python ints
+        cores = np.flatnonzero(node['cores'] == rpc.FREE)[:n_cores].tolist()
+        gpus  = np.flatnonzero(node['gpus']  == rpc.FREE)[:n_gpus].tolist()
 
-        Contrary to the documentation, this scheduler interprets `gpu_processes`
-        as number of GPUs that need to be available to each process, i.e., as
-        `gpus_per_process'.
+        slots = list()
+        for i in range(alc_slots):
 
-        Note that all resources for non-MPI tasks will always need to be placed
-        on a single node.
-        '''
+            c_idx = i * cores_per_slot
+            g_idx = i * gpus_per_slot
 
-        self._log.debug('find_resources %s', unit['uid'])
+            slots.append({'uid'     : node['uid'],
+                          'name'    : node['name'],
+                          'core_map': [cores[c_idx:c_idx + cores_per_slot]],
+                          'gpu_map' : [[gpu] for gpu in
+                                       gpus[g_idx:g_idx + gpus_per_slot]],
+                          'lfs'     : {'size': lfs_per_slot,
+                                       'path': self._rm_lfs_per_node['path']},
+                          'mem'     : mem_per_slot})
+
+        return slots
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_shape(self, cud):
+        '''
+        Derive the placement parameters for a unit description.  The result
+        only depends on the unit's `tuple_size`, and is cached per
+        `tuple_size` by `schedule_unit()`.
+        '''
 
-        cud = unit['description']
         mpi = bool('mpi' in cud['cpu_process_type'].lower())
 
         # dig out the allocation request details
@@ -320,15 +408,6 @@ class Continuous(AgentSchedulingComponent):
         self._log.debug('req : %s %s %s %s %s', req_slots, cores_per_slot,
                         gpus_per_slot, lfs_per_slot, mem_per_slot)
 
-        # First and last nodes can be a partial allocation - all other nodes
-        # can only be partial when `scattered` is set.
-        #
-        # Iterate over all nodes until we find something. Check if it fits the
-        # allocation mode and sequence.  If not, start over with the next node.
-        # If it matches, add the slots found and continue to next node.
-        #
-        # FIXME: persistent node index
-
         cores_per_node = self._rm_cores_per_node
         gpus_per_node  = self._rm_gpus_per_node
         lfs_per_node   = self._rm_lfs_per_node['size']
@@ -358,6 +437,83 @@ class Continuous(AgentSchedulingComponent):
         if not mpi and req_slots > slots_per_node:
             raise ValueError('non-mpi task does not fit on a single node')
 
+        # Non-mpi tasks need all slots on one node, mpi tasks at least one slot
+        # per node.
+        if mpi:
+            min_cores = cores_per_slot
+            min_gpus  = gpus_per_slot
+        else:
+            min_cores = cores_per_slot * req_slots
+            min_gpus  = gpus_per_slot  * req_slots
+
+        return {'mpi'           : mpi,
+                'req_slots'     : req_slots,
+                'cores_per_slot': cores_per_slot,
+                'gpus_per_slot' : gpus_per_slot,
+                'lfs_per_slot'  : lfs_per_slot,
+                'mem_per_slot'  : mem_per_slot,
+                'slots_per_node': slots_per_node,
+                'min_cores'     : min_cores,
+                'min_gpus'      : min_gpus,
+                'offset'        : None}   # last node used by this shape
+
+
+    # --------------------------------------------------------------------------
+    #
+    #
+    def schedule_unit(self, unit):
+        '''
+        Find an available set of slots, potentially across node boundaries (in
+        the MPI case).  By default, we only allow for partial allocations on the
+        first and last node - but all intermediate nodes MUST be completely used
+        (this is the 'CONTINUOUS' scheduler after all).
+
+        If the scheduler is configured with `scattered=True`, then that
+        constraint is relaxed, and any set of slots (be it continuous across
+        nodes or not) is accepted as valid allocation.
+
+        No matter the mode, we always make sure that we allocate slots in chunks
+        of cores, gpus, lfs and mem required per process - otherwise the
+        application processes would not be able to acquire the requested
+        resources on the respective node.
+
+        Contrary to the documentation, this scheduler interprets `gpu_processes`
+        as number of GPUs that need to be available to each process, i.e., as
+        `gpus_per_process'.
+
+        Note that all resources for non-MPI tasks will always need to be placed
+        on a single node.
+        '''
+
+        self._log.debug('find_resources %s', unit['uid'])
+
+        cud   = unit['description']
+        ts    = unit.get('tuple_size')
+        shape = self._shapes.get(ts) if ts else None
+
+        if not shape:
+            shape = self._get_shape(cud)
+            if ts:
+                self._shapes[ts] = shape
+
+        mpi            = shape['mpi']
+        req_slots      = shape['req_slots']
+        cores_per_slot = shape['cores_per_slot']
+        gpus_per_slot  = shape['gpus_per_slot']
+        lfs_per_slot   = shape['lfs_per_slot']
+        mem_per_slot   = shape['mem_per_slot']
+        slots_per_node = shape['slots_per_node']
+        min_cores      = shape['min_cores']
+        min_gpus       = shape['min_gpus']
+
+        # Non-mpi tasks need all slots on one node, mpi tasks at least one slot
+        # per node.  Consult the capacity index to see if any node could
+        # possibly host that - if not, we can fail right away.
+        if not self._has_capacity(min_cores, min_gpus,
+                                  total_cores=cores_per_slot * req_slots,
+                                  total_gpus=gpus_per_slot  * req_slots):
+            return None
+
         # set conditions to find the first matching node
         is_first = True
         is_last  = False
@@ -367,27 +523,28 @@ class Continuous(AgentSchedulingComponent):
         alc_slots = list()
         rem_slots = req_slots
 
-        # start the search
-        for node in self._iterate_nodes():
+        # Tagged units are only placed on the nodes used before for that tag
+        # (in node order).  Continuous mpi allocations need to walk the node
+        # list in order.  In all other cases we only need to look at nodes which
+        # have sufficient free resources for (all) slots, as reported by the
+        # capacity index.
+        tagged = self._tag_history.get(tag) if tag else None
+
+        if tagged:
+            nodes = sorted([self._node_index[uid] for uid in tagged],
+                           key=lambda x: x['idx'])
+        elif mpi and not self._scattered:
+            nodes = self._iterate_nodes(shape['offset'])
+        else:
+            nodes = self._iterate_capacity(min_cores, min_gpus)
 
-            node_uid  = node['uid']
-          # node_name = node['name']
+        # start the search
+        for node in nodes:
 
-          # self._log.debug('next %s : %s', node_uid, node_name)
+          # self._log.debug('next %s : %s', node['uid'], node['name'])
           # self._log.debug('req1: %s = %s + %s', req_slots, rem_slots,
           #                                       len(alc_slots))
 
-            # Check if a unit is tagged to use this node.  This means we check
-            #   - if a tag exists
-            #   - if the tag has been used before
-            #   - if the previous use included this node
-            # If a tag exists, continue to consider this node if the tag was
-            # used for this node - else continune to the next node.
-            if tag:
-                if tag in self._tag_history:
-                    if node_uid not in self._tag_history[tag]:
-                        continue
-
             # if only a small set of cores/gpus remains unallocated (ie. less
             # than node size), we are in fact looking for the last node.  Note
             # that this can also be the first node, for small units.
@@ -462,11 +619,17 @@ class Continuous(AgentSchedulingComponent):
                 }
 
 
+        # the next search for this shape starts on the last node we used
+        if mpi and not self._scattered and not tagged:
+            shape['offset'] = self._node_index[alc_slots[-1]['uid']]['idx']
+
         # allocation worked!  If the unit was tagged, store the node IDs for
         # this tag, so that later units can reuse that information
-        tag = unit['description'].get('tag')
         if tag:
-            self._tag_history[tag] = [node['uid'] for node in slots['nodes']]
+            self._tag_history[tag] = set([n['uid'] for n in slots['nodes']])
+            self._tag_units[unit['uid']] = tag
+            self._tag_live[tag] = self._tag_live.get(tag, 0) + 1
+            self._tag_idle.pop(tag, None)
 
         # this should be nicely filled out now - return
         return slots
@@ -0,0 +1,264 @@
+
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import time
+
+from .continuous import Continuous
+
+
+# ------------------------------------------------------------------------------
+#
+# This is an extension of the Continuous scheduler which implements EASY
+# backfilling, based on the optional `runtime` estimate in the unit
+# descriptions.
+#
+# The Continuous scheduler places whatever fits.  A large unit waiting for
+# a set of nodes can thus be starved by a stream of small units which keep
+# those nodes partially busy.  This scheduler instead reserves resources for the
+# unit which waited longest (the head of the waitpool): it computes the time at
+# which enough resources will be free for that unit (the shadow time), based on
+# the estimated end times of the running units.  Other units are only placed
+# (backfilled) while the head waits if their own runtime estimate guarantees
+# that they complete before the shadow time.
+#
+# A unit without runtime estimate is assumed to run forever.  If the shadow time
+# cannot be determined because running units don't have estimates, no
+# reservation is made and all units are placed as they fit (as with
+# `Continuous`).  The reservation only considers cores and GPUs, not memory or
+# local storage.
+#
+# Slot recycling (`slot_recycling`) is not supported by this scheduler, as it
+# would place units without checking the reservation.
+#
+class ContinuousBackfill(Continuous):
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, cfg, session):
+
+        Continuous.__init__(self, cfg, session)
+
+        self._clock   = time.time  # the benchmark replaces this
+        self._running = dict()     # uid: [end time, slots] of placed units
+        self._shadow  = None       # [head uid, shadow time], see `_get_shadow`
+        self._heads   = None       # head candidates during a scheduling pass
+        self._head    = None       # current head, see `_start_pass`
+        self._delayed = None       # uid of the last unit the reservation held
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule_waitpool(self):
+
+        self._start_pass()
+        try:
+            return Continuous._schedule_waitpool(self)
+        finally:
+            self._heads = None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule_incoming(self):
+
+        self._start_pass()
+        try:
+            return Continuous._schedule_incoming(self)
+        finally:
+            self._heads = None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _try_allocation(self, unit):
+
+        now    = self._clock()
+        shadow = self._get_shadow()
+
+        if shadow and shadow[1] is not None and shadow[0] != unit['uid']:
+
+            # someone else holds the reservation - backfill only if the unit
+            # is known to complete before the reservation starts
+            runtime = unit['description'].get('runtime')
+            if not runtime or now + runtime > shadow[1]:
+                self._delayed = unit['uid']
+                return False
+
+        if not Continuous._try_allocation(self, unit):
+            return False
+
+        runtime = unit['description'].get('runtime')
+        if runtime: end = now + runtime
+        else      : end = float('inf')
+
+        self._running[unit['uid']] = [end, unit['slots']]
+
+        if shadow and shadow[0] == unit['uid']:
+            # the head got placed, the next one gets the reservation
+            self._shadow = None
+            if self._heads is not None:
+                self._next_head()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _waitpool_blocks(self, unit):
+
+        # units held back by the reservation don't block units of the same
+        # shape: those may complete before the shadow time
+        if self._delayed == unit['uid']:
+            return False
+
+        return Continuous._waitpool_blocks(self, unit)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unschedule_unit(self, unit):
+
+        Continuous.unschedule_unit(self, unit)
+
+        # freed resources can move the reservation ahead
+        if self._running.pop(unit['uid'], None):
+            self._shadow = None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _restore_unit(self, unit):
+
+        Continuous._restore_unit(self, unit)
+
+        # the end time of restored units is unknown
+        self._running[unit['uid']] = [float('inf'), unit['slots']]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _pop_replacement(self, unit):
+
+        # recycled slots would bypass the reservation
+        return None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reserve(self, task):
+
+        # the head of the waitpool holds a reservation already (the shadow
+        # time), which also considers the unit runtimes
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _start_pass(self):
+        '''
+        Determine the head of the waitpool: the unit which waited longest among
+        those with the highest priority.  The waitpool only changes after
+        a scheduling pass, so the head is determined once per pass, and the
+        remaining candidates are only inspected when the head gets placed.
+        '''
+
+        prios = [level[0] for level in self._waitprio]
+        if self._waitbins:
+            prios.append(0)
+
+        top = max(prios) if prios else 0
+        self._heads = (unit for unit in self._waitpool.values()
+                            if self._get_level(unit)[0] == top)
+        self._next_head()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _next_head(self):
+
+        # units placed from the waitpool are removed from it only after the
+        # scheduling pass, so we skip those
+        self._head = None
+        for unit in self._heads:
+            if unit['uid'] not in self._running:
+                self._head = unit
+                break
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_shadow(self):
+        '''
+        Return `[uid, shadow time]` for the unit at the head of the waitpool,
+        or `None` if no unit waits.  The shadow time is `None` if it is
+        unknown.  The result is cached until the head changes or resources are
+        freed.
+        '''
+
+        if self._heads is None:
+            # outside of a scheduling pass the waitpool may have changed
+            self._start_pass()
+            self._heads = None
+
+        head = self._head
+        if not head:
+            return None
+
+        if self._shadow and self._shadow[0] == head['uid']:
+            return self._shadow
+
+        self._shadow = self._find_shadow(head)
+
+        return self._shadow
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _find_shadow(self, head):
+        '''
+        Replay the release of running units in order of their estimated end
+        time, until the given unit would fit.  Non-MPI units need all cores and
+        GPUs on one node, MPI units need at least one process on a node.
+        '''
+
+        ts = head['tuple_size']
+        cores, gpus, total_cores, total_gpus = self._get_needs(ts)
+
+        free_cores = dict()  # node idx: free cores after releases
+        free_gpus  = dict()  # node idx: free gpus  after releases
+        tot_cores  = int(self._total_free_cores)
+        tot_gpus   = int(self._total_free_gpus)
+
+        for end, slots in sorted(self._running.values(), key=lambda x: x[0]):
+
+            if end == float('inf'):
+                # no estimates for the remaining units
+                break
+
+            for entry in slots['nodes']:
+
+                idx = self._node_index[entry['uid']]['idx']
+                n_c = sum([len(cmap) for cmap in entry['core_map']])
+                n_g = len(entry['gpu_map'])
+
+                free_cores[idx] = free_cores.get(idx,
+                                                 self._free_cores[idx]) + n_c
+                free_gpus [idx] = free_gpus .get(idx,
+                                                 self._free_gpus [idx]) + n_g
+                tot_cores      += n_c
+                tot_gpus       += n_g
+
+            if tot_cores < total_cores or tot_gpus < total_gpus:
+                continue
+
+            for idx in free_cores:
+                if free_cores[idx] >= cores and free_gpus[idx] >= gpus:
+                    self._log.debug('reserve for %s at %.1f', head['uid'], end)
+                    return [head['uid'], end]
+
+        return [head['uid'], None]
+
+
+# ------------------------------------------------------------------------------
+
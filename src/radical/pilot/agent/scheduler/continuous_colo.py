@@ -4,6 +4,8 @@ __license__   = "MIT"
 
 import copy
 
+import collections
+
 import radical.utils as ru
 
 from .continuous import Continuous
@@ -29,6 +31,14 @@ from ... import compute_unit_description as rpcud
 # The dominant use case for this scheduler is the execution of coupled
 # applications which exchange data via shared local files or shared memory.
 #
+# Bags are tracked incrementally: once the last unit of a bag arrives, the
+# resource requirements of the whole bag are computed and the bag is appended to
+# a queue of ready bags.  Scheduling passes only consider ready bags, in the
+# order they became ready, and only nodes which can host the complete bag.
+# Within a pass, bags which need at least the resources of a bag which could not
+# be placed are skipped.  Units which are not colocated wait in the waitpool of
+# the base class, and are placed before the bags.
+#
 # FIXME: - failed tasks cannot yet considered, subsequent tasks in the same ns
 #          will be scheduled anyway.
 #
@@ -50,17 +60,21 @@ class ContinuousColo(Continuous):
         # a 'bag' entry will look like this:
         #
         #   {
-        #      'size': 128,    # number of units to expect
-        #      'uids': [...]}, # ids    of units to be scheduled
+        #      'size'  : 128,    # number of units to expect
+        #      'uids'  : [...],  # ids    of units to be scheduled
+        #      'pseudo': None,   # pseudo-unit, once the bag is complete
+        #      'needs' : None,   # (cores, gpus, lfs, mem) of the pseudo-unit
         #   }
 
         self._lock      = ru.RLock()   # lock on the bags
         self._units     = dict()       # unit registry (we use uids otherwise)
-        self._unordered = list()       # IDs of units which are not colocated
         self._bags      = dict()       # nothing has run, yet
+        self._ready     = collections.OrderedDict()  # complete bags, FIFO
 
-        self._bag_init  = {'size' : 0,
-                           'uids' : list()}
+        self._bag_init  = {'size'  : 0,
+                           'uids'  : list(),
+                           'pseudo': None,
+                           'needs' : None}
 
 
     # --------------------------------------------------------------------------
@@ -72,20 +86,23 @@ class ContinuousColo(Continuous):
 
         self.advance(units, rps.AGENT_SCHEDULING, publish=True, push=False)
 
+        unordered = list()
         with self._lock:
 
             # cache ID int to avoid repeated parsing
             for unit in units:
 
+                self._set_tuple_size(unit)
+
                 uid      = unit['uid']
                 descr    = unit['description']
                 colo_tag = descr.get('tags', {}).get('colocate')
 
-                # units w/o order info are handled as usual, and we don't keep
-                # any infos around
+                # units w/o order info are handled as usual (via the
+                # waitpool), and we don't keep any infos around
                 if not colo_tag:
                   # self._log.debug('no tags for %s', uid)
-                    self._unordered.append(unit)
+                    unordered.append(unit)
                     continue
 
                 # this uniit wants to be ordered - keep it in our registry
@@ -109,6 +126,15 @@ class ContinuousColo(Continuous):
                 # add unit to order
                 self._bags[bag]['uids'].append(uid)
 
+                if len(self._bags[bag]['uids']) > size:
+                    raise RuntimeError('inconsistent bag assembly')
+
+                # once the bag is complete, it becomes eligible for scheduling
+                if len(self._bags[bag]['uids']) == size:
+                    self._complete_bag(bag)
+
+            self._waitpool_add(unordered)
+
         # try to schedule known units
         self._try_schedule()
 
@@ -118,12 +144,10 @@ class ContinuousColo(Continuous):
     # --------------------------------------------------------------------------
     def _try_schedule(self):
         '''
-        Schedule all units in self._unordered.  Then for all name spaces,
-        check if their `current` order has units to schedule.  If not and
-        we see `size` units are `done`, consider the order completed and go
-        to the next one.  Break once we find a BoT which is not completely
-        schedulable, either because we did not yet get all its units, or
-        because we run out of resources to place those units.
+        Schedule the units in the waitpool (units which are not colocated).
+        Then try to place all complete bags, in the order in which they
+        completed.  A bag is only placed if all its units fit onto the same
+        node, otherwise it keeps waiting.
         '''
 
         self._log.debug('try schedule')
@@ -131,57 +155,42 @@ class ContinuousColo(Continuous):
 
         # FIXME: this lock is very aggressive, it should not be held over
         #        the scheduling algorithm's activity.
-        # first schedule unordered units (
+        # first schedule unordered units
         with self._lock:
-
-            keep = list()
-            for unit in self._unordered:
-
-                # attempt to schedule this unit (use continuous algorithm)
-                if Continuous._try_allocation(self, unit):
-
-                    # success - keep it and try the next one
-                    scheduled.append(unit)
-
-                else:
-                    # failure - keep unit around
-                    keep.append(unit)
-
-            # keep only unscheduleed units
-            self._unordered = keep
-
+            self._schedule_waitpool()
 
         # FIXME: this lock is very aggressive, it should not be held over
         #        the scheduling algorithm's activity.
         with self._lock:
 
-            # now check all bags for eligibility, filter scheduled ones
+            # only complete bags are considered.  If a bag cannot be placed,
+            # no bag which needs at least the same resources can be placed in
+            # this pass.
             to_delete = list()
-            for bag in self._bags:
-
-                self._log.debug('try bag %s', bag)
-
-                if self._bags[bag]['size'] < len(self._bags[bag]['uids']):
-                    raise RuntimeError('inconsistent bag assembly')
-
-                # if bag is complete, try to schedule it
-                if self._bags[bag]['size'] == len(self._bags[bag]['uids']):
+            blocked   = list()
+            for bag in self._ready:
 
-                    self._log.debug('try bag %s (full)', bag)
-                    if self._try_schedule_bag(bag):
+                needs = self._bags[bag]['needs']
+                if self._is_blocked(needs, blocked):
+                    continue
 
-                        self._log.debug('try bag %s (placed)', bag)
-                        # scheduling works - push units out and erase all traces
-                        # of the bag (delayed until after iteration)
-                        for uid in self._bags[bag]['uids']:
+                self._log.debug('try bag %s (full)', bag)
+                if not self._try_schedule_bag(bag):
+                    blocked.append(needs)
+                    continue
 
-                            scheduled.append(self._units[uid])
+                self._log.debug('try bag %s (placed)', bag)
+                # scheduling works - push units out and erase all traces of
+                # the bag (delayed until after iteration)
+                for uid in self._bags[bag]['uids']:
+                    scheduled.append(self._units.pop(uid))
 
-                        to_delete.append(bag)
+                to_delete.append(bag)
 
             # delete all bags which have been pushed out
             for bag in to_delete:
 
+                del(self._ready[bag])
                 del(self._bags[bag])
 
 
@@ -196,77 +205,143 @@ class ContinuousColo(Continuous):
 
     # --------------------------------------------------------------------------
     #
-    def _try_schedule_bag(self, bag):
+    def _is_blocked(self, needs, blocked):
         '''
-        This methods assembles the requiremets of all tasks in a bag into
-        a single pseudo-unit.  We ask the cont scheduler to schedule that
-        pseudo-unit for us.  If that works, we disassemble the resulting
-        resource slots and assign them to the bag's units again, and declare
-        success.
+        Check if the given requirements cover any of the `blocked` ones, which
+        could not be satisfied.
         '''
 
-        self._log.debug('try schedule bag %s ', bag)
+        for other in blocked:
+            if needs[0] >= other[0] and needs[1] >= other[1] and \
+               needs[2] >= other[2] and needs[3] >= other[3]:
+                return True
+
+        return False
 
-        tasks  = [self._units[uid] for uid in self._bags[bag]['uids']]
-        pseudo = copy.deepcopy(tasks[0])
 
-        pseudo['uid'] = 'pseudo.'
+    # --------------------------------------------------------------------------
+    #
+    def _complete_bag(self, bag):
+        '''
+        This methods assembles the requiremets of all tasks in a bag into
+        a single pseudo-unit, and queues the bag for scheduling.  The
+        pseudo-unit is a single process which holds the cores, GPUs, LFS and
+        memory of all tasks (`gpu_processes` is interpreted as GPUs per process
+        by the continuous scheduler).
+        '''
+
+        tasks  = [self._units[uid] for uid in self._bags[bag]['uids']]
+        pseudo = {'uid'        : 'pseudo.',
+                  'description': copy.deepcopy(tasks[0]['description'])}
 
         descr = pseudo['description']
         descr['cpu_process_type'] = rpcud.POSIX  # force single node
         descr['cpu_thread_type']  = rpcud.POSIX
-        descr['cpu_processes']    = 0
-        descr['cpu_threads']      = 1
+        descr['cpu_processes']    = 1
+        descr['cpu_threads']      = 0
 
         descr['gpu_process_type'] = rpcud.POSIX  # force single node
         descr['gpu_thread_type']  = rpcud.POSIX
         descr['gpu_processes']    = 0
         descr['gpu_threads']      = 1
 
-        self._log.debug('try schedule uids  %s ', self._bags[bag]['uids'])
-      # self._log.debug('try schedule tasks  %s ', pprint.pformat(tasks))
+        descr['lfs_per_process']  = 0
+        descr['mem_per_process']  = 0
+
+        # fair-share groups are accounted for the bag's units (which can belong
+        # to different groups), not for the pseudo-unit
+        if descr.get('tags'):
+            descr['tags'] = {k: v for k, v in descr['tags'].items()
+                                  if k != 'group'}
 
         for task in tasks:
             td = task['description']
             pseudo['uid'] += task['uid']
 
-            descr['cpu_processes'] += td['cpu_processes'] * td['cpu_threads']
-            descr['gpu_processes'] += td['gpu_processes']
+            procs = td['cpu_processes']
+
+            descr['cpu_threads']     += procs * (td['cpu_threads'] or 1)
+            descr['gpu_processes']   += procs * td['gpu_processes']
+            descr['lfs_per_process'] += procs * td.get('lfs_per_process', 0)
+            descr['mem_per_process'] += procs * td.get('mem_per_process', 0)
+
+        self._set_tuple_size(pseudo)
 
-      # self._log.debug('try schedule pseudo %s ', pprint.pformat(pseudo))
+        self._bags[bag]['pseudo'] = pseudo
+        self._bags[bag]['needs']  = (descr['cpu_threads'],
+                                     descr['gpu_processes'],
+                                     descr['lfs_per_process'],
+                                     descr['mem_per_process'])
+        self._ready[bag] = True
+
+        self._log.debug('bag %s complete: %s', bag, self._bags[bag]['needs'])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _try_schedule_bag(self, bag):
+        '''
+        We ask the cont scheduler to schedule the bag's pseudo-unit for us.  If
+        that works, we disassemble the resulting resource slots and assign them
+        to the bag's units again, and declare success.
+        '''
+
+        self._log.debug('try schedule bag %s ', bag)
+
+        tasks  = [self._units[uid] for uid in self._bags[bag]['uids']]
+        pseudo = self._bags[bag]['pseudo']
+        cores, gpus, _, _ = self._bags[bag]['needs']
+
+        # only nodes which can host the whole bag are considered
+        if not self._has_capacity(cores, gpus, cores, gpus):
+            return False
 
         if not Continuous._try_allocation(self, pseudo):
 
             # cannot scshedule this pseudo task right now, bag has to wait
             return False
 
-        # we got an allocation for the pseudo task, not dissassemble the slots
-        # and assign back to the individual tasks in the bag
-        slots = copy.deepcopy(pseudo['slots'])
-        cpus  = copy.deepcopy(pseudo['slots']['nodes'][0]['core_map'])
-        gpus  = copy.deepcopy(pseudo['slots']['nodes'][0]['gpu_map'])
-
-        slots['nodes'][0]['core_map'] = list()
-        slots['nodes'][0]['gpu_map']  = list()
+        # we got an allocation for the pseudo task, now dissassemble the slots
+        # and assign back to the individual tasks in the bag: each task process
+        # gets its own slot entry on the pseudo task's node
+        slots = pseudo['slots']
+        node  = slots['nodes'][0]
+
+        # the pseudo-unit never completes: the tag it got placed for is kept
+        # alive by the bag's units instead
+        tag = self._tag_units.pop(pseudo['uid'], None)
+        if tag:
+            self._tag_live[tag] += len(tasks) - 1
+            for task in tasks:
+                self._tag_units[task['uid']] = tag
+        cpus  = list(node['core_map'][0])
+        gpus  = [gpu[0] for gpu in node['gpu_map']]
 
         for task in tasks:
 
             tslots = copy.deepcopy(slots)
             descr  = task['description']
 
+            tslots['nodes'] = list()
             for _ in range(descr['cpu_processes']):
-                block = list()
-                for _ in range(descr['cpu_threads']):
-                    block.append(cpus.pop(0)[0])
-                tslots['nodes'][0]['core_map'].append(block)
 
-            for _ in range(descr['gpu_processes']):
+                n_cores  = descr['cpu_threads'] or 1
+                n_gpus   = descr['gpu_processes']
+                core_map = [[cpus.pop(0) for _ in range(n_cores)]]
+                gpu_map  = [[gpus.pop(0)] for _ in range(n_gpus)]
 
-                block = list()
-                block.append(gpus.pop(0)[0])
-                tslots['nodes'][0]['gpu_map'].append(block)
+                tslots['nodes'].append(
+                        {'uid'     : node['uid'],
+                         'name'    : node['name'],
+                         'core_map': core_map,
+                         'gpu_map' : gpu_map,
+                         'lfs'     : {'size': descr.get('lfs_per_process', 0),
+                                      'path': node['lfs']['path']},
+                         'mem'     : descr.get('mem_per_process', 0)})
 
             task['slots'] = tslots
+            self._account_share(task, +1)
+            self._handle_cuda(task)
 
         return True
 
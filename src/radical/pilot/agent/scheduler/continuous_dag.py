@@ -0,0 +1,219 @@
+
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+import collections
+
+import radical.utils as ru
+
+from .continuous import Continuous
+
+from ... import states as rps
+
+
+# ------------------------------------------------------------------------------
+#
+# This is an extension of the Continuous scheduler which evaluates the
+# `depends_on` tag of arriving units, which is expected to have the form
+#
+#   depends_on : [<uid>, <uid>, ...]
+#
+# listing the uids of the units which need to complete before the unit can be
+# scheduled.  The dependencies form a DAG of units.  A unit is held back until
+# all its parents completed execution, and is then released into the waitpool.
+# If any parent fails or is canceled, the unit and all its descendants are
+# failed.
+#
+# Completion is detected when the executor notifies the scheduler that the unit
+# resources can be freed, which happens as the unit moves to
+# `AGENT_STAGING_OUTPUT_PENDING`.  Each held unit keeps a counter of parents to
+# wait for, and each parent keeps a list of its children, so releasing children
+# costs O(1) per dependency.  The scheduler remembers the outcome of the
+# `dag_history` most recently completed units, so that children can arrive after
+# their parents completed.  A child which arrives after the outcome of a parent
+# got dropped cannot tell that parent apart from one which did not arrive yet,
+# and keeps waiting for it.  `dag_history` thus needs to cover the number of
+# units which complete between a parent and the arrival of its last child.
+#
+# The dominant use case for this scheduler is the execution of workflows whose
+# stages depend on each other, without a round trip through the client for
+# each stage.
+#
+# NOTE: - dependencies on units which never arrive at this scheduler (e.g., units
+#         of other pilots, or of other scheduler partitions) are never resolved.
+#       - held units are not checkpointed, so this scheduler does not support
+#         checkpoints.
+#
+class ContinuousDag(Continuous):
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, cfg, session):
+
+        Continuous.__init__(self, cfg, session)
+
+        self._children = dict()  # parent uid: [child uids]
+        self._held     = dict()  # child uid : [unit, number of open parents]
+        self._done     = collections.OrderedDict()  # uid: True (completed) or
+                                                    #      False (failed)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _configure(self):
+
+        Continuous._configure(self)
+
+        # * dag_history:
+        #   The number of completed units whose outcome is retained for
+        #   children which arrive later.  Children arriving after the outcome
+        #   of a parent got dropped are never released.  The default is
+        #   `10000`.
+        #
+        self._done_limit = self._cfg.get('dag_history', 10000)
+
+        if self._done_limit < 0:
+            raise ValueError('invalid dag_history: %s' % self._done_limit)
+
+        # held units are not checkpointed, and would be lost on recovery
+        if self._cfg.get('sched_checkpoint'):
+            raise ValueError('CONTINUOUS_DAG does not support checkpoints')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _route_units(self, units):
+        '''
+        Hold back units with unresolved dependencies.
+        '''
+
+        units  = Continuous._route_units(self, units)
+        ready  = list()
+        failed = list()
+
+        for unit in units:
+
+            uid  = unit['uid']
+            tags = unit['description'].get('tags') or dict()
+            deps = ru.as_list(tags.get('depends_on'))
+
+            if not deps:
+                ready.append(unit)
+                continue
+
+            if False in [self._done.get(dep) for dep in deps]:
+                # some parent failed already
+                failed.append(unit)
+                continue
+
+            n_open = 0
+            for dep in deps:
+                if dep not in self._done:
+                    if dep not in self._children:
+                        self._children[dep] = list()
+                    self._children[dep].append(uid)
+                    n_open += 1
+
+            if not n_open:
+                ready.append(unit)
+                continue
+
+            self._held[uid] = [unit, n_open]
+            self._prof.prof('schedule_hold', uid=uid)
+
+        if failed:
+            # the children of failed units fail, too
+            _, descendants = self._resolve([[unit['uid'], False]
+                                            for unit in failed])
+            self._fail_units(failed + descendants)
+
+        return ready
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _handle_completed(self, units):
+        '''
+        Release the children of completed units into the waitpool, or fail them
+        if the parent failed.
+        '''
+
+        Continuous._handle_completed(self, units)
+
+        ready, failed = self._resolve([[unit['uid'], self._completed_ok(unit)]
+                                       for unit in units])
+
+        if ready:
+            self._waitpool_add(ready)
+
+        if failed:
+            self._fail_units(failed)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _resolve(self, todo):
+        '''
+        Record the outcome of the given `[uid, ok]` pairs, and return the held
+        units which are now ready, and those which failed as a consequence.
+        '''
+
+        ready  = list()
+        failed = list()
+
+        while todo:
+
+            uid, ok = todo.pop()
+            self._done[uid] = ok
+
+            for child in self._children.pop(uid, []):
+
+                entry = self._held.get(child)
+                if not entry:
+                    # failed already (via another parent)
+                    continue
+
+                if not ok:
+                    # fail the child and, in turn, its own children
+                    del self._held[child]
+                    failed.append(entry[0])
+                    todo.append([child, False])
+                    continue
+
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._held[child]
+                    ready.append(entry[0])
+                    self._prof.prof('schedule_release', uid=child)
+
+        # forget the oldest outcomes beyond the configured limit
+        while len(self._done) > self._done_limit:
+            self._done.popitem(last=False)
+
+        return ready, failed
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _completed_ok(self, unit):
+
+        # executors either set the unit's exit code or its target state when
+        # unscheduling it.  Canceled units have neither.
+        if unit.get('target_state') == rps.DONE:
+            return True
+
+        return unit.get('exit_code') == 0
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _fail_units(self, units):
+
+        for unit in units:
+            self._log.warn('unit %s failed: dependency failed', unit['uid'])
+
+        self.advance(units, rps.FAILED, publish=True, push=False)
+
+
+# ------------------------------------------------------------------------------
+
@@ -64,6 +64,11 @@ class Hombre(AgentSchedulingComponent):
         if not self._oversubscribe:
             raise ValueError('HOMBRE needs oversubscription enabled')
 
+        # the static slots are only created when the first unit arrives, so
+        # running units can't be restored from a checkpoint
+        if self._cfg.get('sched_checkpoint'):
+            raise ValueError('HOMBRE does not support checkpoints')
+
         # NOTE: We delay the actual configuration until we received the first
         #       unit to schedule - at that point we can slice and dice the
         #       resources into suitable static slots.
@@ -71,6 +76,9 @@ class Hombre(AgentSchedulingComponent):
 
         self.free = list()     # declare for early debug output
 
+        self.cpn  = self._rm_cores_per_node
+        self.gpn  = self._rm_gpus_per_node
+
 
     # --------------------------------------------------------------------------
     #
@@ -90,12 +98,26 @@ class Hombre(AgentSchedulingComponent):
                        'gpu_thread_type'  : cud['gpu_thread_type' ],
                        }
 
-        self.cpn     = self._rm_cores_per_node
-        self.gpn     = self._rm_gpus_per_node
+        self.lock    = ru.Lock()  # lock for the list of free chunks
+        self.free    = self._create_chunks(cud, self.nodes)
+
+        if not self.free:
+            raise RuntimeError('configuration cannot be used for this workload')
+
+        # run this method only once
+        self._configured = True
 
-        self.free    = list()     # list of free chunks
-        self.lock    = ru.Lock()  # lock for the above list
 
+    # --------------------------------------------------------------------------
+    #
+    def _create_chunks(self, cud, nodes):
+        '''
+        Split the given nodes into as many chunks as possible, where each chunk
+        fits exactly one unit of the given description, and return the list of
+        chunks.
+        '''
+
+        chunks       = list()
         cores_needed = cud['cpu_processes'] * cud['cpu_threads']
         gpus_needed  = cud['gpu_processes']
 
@@ -111,7 +133,7 @@ class Hombre(AgentSchedulingComponent):
 
         # ---------------------------------------------------------------------
         # create as many equal sized chunks from the available nodes as
-        # possible, and put them into the `free` list.  The actual scheduling
+        # possible, and put them into the `chunks` list.  The actual scheduling
         # algorithm will blindly pick chunks from that list whenever a new CUD
         # arrives.
         cblock   = cud['cpu_threads']
@@ -134,7 +156,7 @@ class Hombre(AgentSchedulingComponent):
         self._log.debug('core blocks %s', cblocks)
         self._log.debug('gpu  blocks %s', gblocks)
 
-        for node in self.nodes:
+        for node in nodes:
             node['cblocks'] = copy.deepcopy(cblocks)
             node['gblocks'] = copy.deepcopy(gblocks)
 
@@ -143,7 +165,7 @@ class Hombre(AgentSchedulingComponent):
             if slot:
                 del(slot['ncblocks'])
                 del(slot['ngblocks'])
-                self.free.append(slot)
+                chunks.append(slot)
             return {'nodes'         : list(),
                     'cores_per_node': self.cpn,
                     'gpus_per_node' : self.gpn,
@@ -152,7 +174,7 @@ class Hombre(AgentSchedulingComponent):
                     'ngblocks'      : 0}
         # ---------------------------------------------------------------------
         nidx   = 0
-        nnodes = len(self.nodes)
+        nnodes = len(nodes)
         slot   = next_slot()
         while nidx < nnodes:
 
@@ -161,7 +183,7 @@ class Hombre(AgentSchedulingComponent):
                 slot['ngblocks'] == ngblocks :
                 slot = next_slot(slot)
 
-            node  = self.nodes[nidx]
+            node  = nodes[nidx]
             nuid  = node['uid']
             nname = node['name']
             ok    = True
@@ -194,7 +216,7 @@ class Hombre(AgentSchedulingComponent):
                     break
 
             if ok:
-                self.free.append(slot)
+                chunks.append(slot)
                 slot = next_slot()
                 continue
 
@@ -203,13 +225,35 @@ class Hombre(AgentSchedulingComponent):
 
         if  slot['ncblocks'] == ncblocks and \
             slot['ngblocks'] == ngblocks :
-            self.free.append(slot)
+            chunks.append(slot)
 
-        if not self.free:
-            raise RuntimeError('configuration cannot be used for this workload')
+        return chunks
 
-        # run this method only once
-        self._configured = True
+
+    # --------------------------------------------------------------------------
+    #
+    # The chunks handed out by this scheduler are not reflected in the node
+    # list, so we overload the allocation and release steps of the base class.
+    #
+    def _try_allocation(self, unit):
+
+        slots = self._allocate_slot(unit['description'])
+        if not slots:
+            return False
+
+        unit['slots'] = slots
+        self._handle_cuda(unit)
+
+        self._prof.prof('schedule_ok', uid=unit['uid'])
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unschedule_unit(self, unit):
+
+        self._release_slot(unit['slots'])
 
 
     # --------------------------------------------------------------------------
@@ -0,0 +1,211 @@
+
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import radical.utils as ru
+
+from .hombre import Hombre
+
+
+# ------------------------------------------------------------------------------
+#
+class HombreMulti(Hombre):
+    '''
+    Multi-class HOMBRE: `Hombre` for workloads which mix a small number of
+    different, but regular unit shapes.
+
+    Instead of chunking all resources for the first unit it sees, this
+    scheduler keeps one pool of pre-computed chunks per unit `tuple_size`.
+    A pool owns whole nodes, in groups of as many nodes as are needed for at
+    least one chunk.  Pools are created when a unit shape is first seen and
+    start out empty.  When a pool runs dry, it grows by chunking nodes which
+    are not yet owned by any pool, or, if no such nodes are left, by reclaiming
+    node groups from other pools whose chunks are all free.  Allocation and
+    release remain O(1) operations - only growing a pool touches the nodes.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def _configure(self):
+
+        Hombre._configure(self)
+
+        self.lock    = ru.Lock()  # lock for pools and groups
+
+        # nodes are handed out to pools from the end of the spare list, so we
+        # reverse it to keep pools on consecutive nodes
+        self._spare  = list(reversed(self.nodes))  # nodes not owned by pools
+        self._pools  = dict()  # tuple_size: pool of chunks
+        self._groups = dict()  # node uid  : node group owning the node
+
+        # the chunks are configured per pool, on demand
+        self._configured = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _try_allocation(self, unit):
+
+        slots = self._allocate_chunk(tuple(unit['tuple_size']),
+                                     unit['description'])
+        if not slots:
+            return False
+
+        unit['slots'] = slots
+        self._handle_cuda(unit)
+
+        self._prof.prof('schedule_ok', uid=unit['uid'])
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _allocate_chunk(self, key, cud):
+        '''
+        Pick a free chunk from the pool for the given `tuple_size`, and grow
+        that pool if it ran dry.
+        '''
+
+        with self.lock:
+
+            pool = self._pools.get(key)
+            if not pool:
+                pool = self._create_pool(key, cud)
+
+            if not pool['free']:
+                self._grow_pool(pool)
+
+            if not pool['free']:
+                return None
+
+            slots = pool['free'].pop()
+            self._groups[slots['nodes'][0]['uid']]['free'] -= 1
+
+        self._log.debug('allocate slot %s', slots['nodes'])
+
+        return slots
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _release_slot(self, slots):
+
+        self._log.debug('release  slot %s', slots['nodes'])
+
+        with self.lock:
+            group = self._groups[slots['nodes'][0]['uid']]
+            group['free'] += 1
+            self._pools[group['pool']]['free'].append(slots)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _create_pool(self, key, cud):
+
+        # make sure that the unit can be placed at all, i.e., that the pilot
+        # nodes hold enough core and GPU blocks for at least one chunk (see
+        # `Hombre._create_chunks()`).  Non-MPI units need to fit on one node.
+        procs   = cud['cpu_processes']
+        threads = cud['cpu_threads'] or 1
+        gpus    = cud['gpu_processes']
+        n_nodes = len(self.nodes)
+
+        if  cud['cpu_process_type'] != 'MPI' and \
+            cud['gpu_process_type'] != 'MPI' :
+            n_nodes = min(n_nodes, 1)
+
+        if procs > n_nodes * (self.cpn // threads) or \
+           gpus  > n_nodes * self.gpn:
+            raise ValueError('unit does not fit on pilot (%s)' % list(key))
+
+        self._log.debug('create pool %s', list(key))
+
+        pool = {'key'   : key,
+                'cud'   : cud,
+                'free'  : list(),   # free chunks
+                'groups': list()}   # node groups owned by this pool
+
+        self._pools[key] = pool
+
+        return pool
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _grow_pool(self, pool):
+        '''
+        Add a new group of nodes to the given pool, and chunk those nodes for
+        the pool's unit shape.  The nodes are taken from the spare nodes, or are
+        reclaimed from other pools.
+        '''
+
+        nodes  = list()
+        chunks = list()
+
+        while not chunks:
+
+            if not self._spare:
+                self._reclaim_nodes(pool)
+
+            if not self._spare:
+                # not enough nodes for a chunk - return what we collected
+                self._spare.extend(reversed(nodes))
+                return
+
+            nodes.append(self._spare.pop())
+            chunks = self._create_chunks(pool['cud'], nodes)
+
+        group = {'pool'  : pool['key'],
+                 'nodes' : nodes,
+                 'chunks': len(chunks),
+                 'free'  : len(chunks)}
+
+        for node in nodes:
+            self._groups[node['uid']] = group
+
+        pool['groups'].append(group)
+        pool['free'].extend(chunks)
+
+        self._log.debug('grow pool %s: %s', list(pool['key']),
+                        [node['uid'] for node in nodes])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reclaim_nodes(self, pool):
+        '''
+        Find an idle node group in another pool, remove its chunks from that
+        pool and return the group's nodes to the spare nodes.  We reclaim from
+        the pool with the most free chunks first.
+        '''
+
+        others = sorted([p for p in self._pools.values() if p is not pool],
+                        key=lambda p: len(p['free']), reverse=True)
+
+        for other in others:
+
+            for group in other['groups']:
+
+                if group['free'] != group['chunks']:
+                    continue
+
+                uids = set([node['uid'] for node in group['nodes']])
+
+                other['groups'].remove(group)
+                other['free'] = [chunk for chunk in other['free']
+                                     if chunk['nodes'][0]['uid'] not in uids]
+
+                for uid in uids:
+                    del self._groups[uid]
+
+                self._spare.extend(reversed(group['nodes']))
+
+                self._log.debug('reclaim nodes %s from pool %s',
+                                sorted(uids), list(other['key']))
+                return
+
+
+# ------------------------------------------------------------------------------
+
@@ -54,5 +54,21 @@ class Noop(AgentSchedulingComponent):
         return True
 
 
+    # --------------------------------------------------------------------------
+    #
+    def unschedule_unit(self, unit):
+
+        # nothing was allocated, nothing to release
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _restore_unit(self, unit):
+
+        # nothing was allocated, nothing to restore
+        pass
+
+
 # ------------------------------------------------------------------------------
 
@@ -3,20 +3,47 @@ __copyright__ = "Copyright 2013-2016, http://radical.rutgers.edu"
 __license__   = "MIT"
 
 
-import time
 import math
 
 from ... import constants as rpc
 
 from .base import AgentSchedulingComponent
+from .base import np
 
 
 # ------------------------------------------------------------------------------
 #
+# The torus scheduler places units on sub-blocks of a BG/Q torus block.  The
+# block layout is provided by the LoadLeveler ResourceManager, as
+# `rm_info['torus']`:
+#
+#   'dims'    : the dimension labels, slowest varying first (`ABCDE`)
+#   'block'   : [[index, {dim: coordinate}, node_name, state], ...]
+#   'shapes'  : [[num_nodes, {dim: length}, shape_str], ...]
+#   'bg_block': the name of the BG/Q block (`$LOADL_BG_BLOCK`)
+#
+# Units always use full nodes.  A unit requesting `n` nodes is placed on
+# a sub-block of the smallest supported shape with at least `n` nodes, and
+# sub-blocks start at corners which are aligned to that shape in all
+# dimensions.
+#
+# For each shape, `_configure()` precomputes the positions (in the block) of
+# the nodes of all sub-blocks, as candidate corner positions plus the offsets
+# of the sub-block nodes relative to the corner.  The occupancy of all block
+# nodes is kept in an array, which is updated in `_change_slot_states()`.
+# Nodes which are not in the scheduler's node list (agent nodes, other
+# partitions) are always occupied.  Finding the first free sub-block of
+# a shape thus is a single vectorized lookup (or a scan over the same tables
+# if NumPy is not available).
+#
+# The returned slots use the common node list structure (see `base.py`), and
+# additionally contain the BG/Q block name, the sub-block shape and the corner
+# node, for the `runjob` launch method.
+#
+# TODO: Ultimately all BG/Q specifics should move out of the scheduler
+#
 class Torus(AgentSchedulingComponent):
 
-    # TODO: Ultimately all BG/Q specifics should move out of the scheduler
-
     # --------------------------------------------------------------------------
     #
     # Offsets into block structure
@@ -30,8 +57,12 @@ class Torus(AgentSchedulingComponent):
     # --------------------------------------------------------------------------
     def __init__(self, cfg, session):
 
-        self.nodes            = None
-        self._cores_per_node  = None
+        self._torus_nodes = None  # block position: node entry
+        self._torus_pos   = None  # node uid: block position
+        self._torus_busy  = None  # block position: occupied
+        self._torus_free  = 0     # number of free block nodes
+        self._sub_blocks  = None  # num_nodes: sub-block shape
+        self._bg_block    = None
 
         AgentSchedulingComponent.__init__(self, cfg, session)
 
@@ -39,217 +70,194 @@ class Torus(AgentSchedulingComponent):
     # --------------------------------------------------------------------------
     #
     def _configure(self):
-        if not self._rm_cores_per_node:
-            raise RuntimeError("ResourceManager %s didn't _configure cores_per_node." %
-                               self._rm_info['name'])
-
-        self._cores_per_node = self._rm_cores_per_node
 
-        # TODO: get rid of field below
-        self.nodes = 'bogus'
+        torus = self._rm_info.get('torus')
+        if not torus:
+            raise RuntimeError("ResourceManager %s didn't _configure torus."
+                              % self._rm_info['name'])
 
+        dims     = list(torus['dims'])
+        block    = torus['block']
+        bg_block = torus.get('bg_block')
 
-    # --------------------------------------------------------------------------
-    #
-    def slot_status(self):
-        """Returns a multi-line string corresponding to slot status.
-        """
-
-        slot_matrix = ""
-        for slot in self._rm.torus_block:
-            slot_matrix += "|"
-            if slot[self.TORUS_BLOCK_STATUS] == rpc.FREE:
-                slot_matrix += "-" * self._rm_cores_per_node
-            else:
-                slot_matrix += "+" * self._rm_cores_per_node
-        slot_matrix += "|"
-        return {'timestamp': time.time(),
-                'slotstate': slot_matrix}
+        # block extent and strides of the block position (the last dimension
+        # varies fastest, as in the block construction)
+        coords  = [[entry[self.TORUS_BLOCK_COOR][dim] for dim in dims]
+                                                      for entry in block]
+        extent  = [max([c[i] for c in coords]) + 1 for i in range(len(dims))]
+        strides = [1] * len(dims)
+        for i in range(len(dims) - 2, -1, -1):
+            strides[i] = strides[i + 1] * extent[i + 1]
 
+        n_block = strides[0] * extent[0]
+        if len(block) != n_block:
+            raise RuntimeError('incomplete torus block (%d != %d nodes)'
+                              % (len(block), n_block))
 
-    # --------------------------------------------------------------------------
-    #
-    # Allocate a number of cores
-    #
-    # Currently only implements full-node allocation, so core count must
-    # be a multiple of cores_per_node.
-    #
-    def _allocate_slot(self, cores_requested, gpus_requested):
+        nodes = dict([(node['name'], node) for node in self.nodes])
 
-        block = self._rm.torus_block
-        sub_block_shape_table = self._rm.shape_table
+        self._bg_block    = bg_block
+        self._torus_nodes = [None] * n_block
+        self._torus_pos   = dict()
+        busy              = [True] * n_block
 
-        self._log.info("Trying to allocate %d core(s / %d gpus.",
-                cores_requested, gpus_requested)
+        for entry, coord in zip(block, coords):
 
-        # FIXME GPU
+            pos  = sum([c * s for c, s in zip(coord, strides)])
+            node = nodes.get(entry[self.TORUS_BLOCK_NAME])
 
-        if cores_requested % self._rm_cores_per_node:
-            num_cores = int(math.ceil(cores_requested / float(self._rm_cores_per_node))) \
-                        * self._rm_cores_per_node
-            self._log.error('Core not multiple of %d, increasing to %d!',
-                           self._rm_cores_per_node, num_cores)
+            if node:
+                self._torus_nodes[pos]       = node
+                self._torus_pos[node['uid']] = pos
+                busy[pos]                    = False
 
-        num_nodes = cores_requested / self._rm_cores_per_node
+        self._torus_free = busy.count(False)
 
-        offset = self._alloc_sub_block(block, num_nodes)
+        # precompute the node positions of all aligned sub-blocks per shape
+        self._sub_blocks = dict()
+        for num_nodes, shape, shape_str in torus['shapes']:
 
-        if offset is None:
-            self._log.warning('No allocation made.')
-            return
+            lengths = [shape[dim] for dim in dims]
+            offsets = [0]
+            corners = [0]
+            for length, size, stride in zip(lengths, extent, strides):
+                offsets = [o + i * stride for o in offsets
+                                          for i in range(length)]
+                corners = [c + i * stride for c in corners
+                                          for i in range(0, size - length + 1,
+                                                         length)]
 
-        # TODO: return something else than corner location? Corner index?
-        sub_block_shape     = sub_block_shape_table[num_nodes]
-        sub_block_shape_str = self._rm.shape2str(sub_block_shape)
-        corner              = block[offset][self.TORUS_BLOCK_COOR]
-        corner_offset       = self.corner2offset(self._rm.torus_block, corner)
-        corner_node         = self._rm.torus_block[corner_offset][self.TORUS_BLOCK_NAME]
+            members = [[c + o for o in offsets] for c in corners]
+            if np is not None:
+                members = np.array(members, dtype=np.int64)
 
-        end = self.get_last_node(corner, sub_block_shape)
-        self._log.debug('Allocating sub-block of %d node(s) with dimensions %s'
-                       ' at offset %d with corner %s and end %s.',
-                        num_nodes, sub_block_shape_str, offset,
-                        self._rm.loc2str(corner), self._rm.loc2str(end))
+            self._sub_blocks[int(num_nodes)] = {'num_nodes': int(num_nodes),
+                                                'shape_str': shape_str,
+                                                'members'  : members}
 
-        return {'cores_per_node'      : self._rm_cores_per_node,
-                'loadl_bg_block'      : self._rm.loadl_bg_block,
-                'sub_block_shape_str' : sub_block_shape_str,
-                'corner_node'         : corner_node,
-                'lm_info'             : self._rm_lm_info}
+        if np is not None:
+            self._torus_busy = np.array(busy, dtype=bool)
+        else:
+            self._torus_busy = busy
 
 
     # --------------------------------------------------------------------------
     #
-    # Allocate a sub-block within a block
-    # Currently only works with offset that are exactly the sub-block size
-    #
-    def _alloc_sub_block(self, block, num_nodes):
-
-        offset = 0
-        # Iterate through all nodes with offset a multiple of the sub-block size
-        while True:
-
-            # Verify the assumption (needs to be an assert?)
-            if offset % num_nodes != 0:
-                msg = 'Sub-block needs to start at correct offset!'
-                self._log.exception(msg)
-                raise ValueError(msg)
-                # TODO: If we want to workaround this, the coordinates need to overflow
-
-            not_free = False
-            # Check if all nodes from offset till offset+size are rpc.FREE
-            for peek in range(num_nodes):
-                try:
-                    if block[offset + peek][self.TORUS_BLOCK_STATUS] \
-                                                                    == rpc.BUSY:
-                        # Once we find the first rpc.BUSY node we
-                        # can discard this attempt
-                        not_free = True
-                        break
-                except IndexError:
-                    self._log.exception('Block out of bound. Num_nodes: %d,'
-                                        'offset: %d, peek: %d.',
-                                        num_nodes, offset, peek)
-
-            if not_free is True:
-                # No success at this offset
-                self._log.info("No free nodes found at this offset: %d.", offset)
-
-                # If we weren't the last attempt, then increase the offset and iterate again.
-                if offset + num_nodes < self._block2num_nodes(block):
-                    offset += num_nodes
-                    continue
-                else:
-                    return
-
-            else:
-                # At this stage we have found a free spot!
-
-                self._log.info("Free nodes found at this offset: %d.", offset)
-
-                # Then mark the nodes busy
-                for peek in range(num_nodes):
-                    block[offset + peek][self.TORUS_BLOCK_STATUS] = rpc.BUSY
-
-                return offset
+    def _change_slot_states(self, slots, new_state):
+        '''
+        Change the slot states as usual, and update the occupancy of the
+        respective block nodes: a node is occupied unless all of its cores are
+        free.
+        '''
 
+        AgentSchedulingComponent._change_slot_states(self, slots, new_state)
 
-    # --------------------------------------------------------------------------
-    #
-    # Return the number of nodes in a block
-    #
-    def _block2num_nodes(self, block):
-        return len(block)
+        for slot_node in slots['nodes']:
 
+            uid  = slot_node['uid']
+            pos  = self._torus_pos[uid]
+            idx  = self._node_index[uid]['idx']
+            busy = bool(self._free_cores[idx] < self._rm_cores_per_node)
 
-    # --------------------------------------------------------------------------
-    #
-    def _release_slot(self, xxx_todo_changeme):
-        (corner, shape) = xxx_todo_changeme
-        self._free_cores(self._rm.torus_block, corner, shape)
+            if busy != self._torus_busy[pos]:
+                self._torus_busy[pos] = busy
+                self._torus_free     += -1 if busy else 1
 
 
     # --------------------------------------------------------------------------
     #
-    # Free up an allocation
-    #
-    def _free_cores(self, block, corner, shape):
-
-        # Number of nodes to free
-        num_nodes = self._shape2num_nodes(shape)
-
-        # Location of where to start freeing
-        offset = self.corner2offset(block, corner)
+    def unschedule_unit(self, unit):
+        '''
+        This method is called when previously aquired resources are not needed
+        anymore.  `slots` are the resource slots as previously returned by
+        `schedule_unit()`.
+        '''
 
-        self._log.info("Freeing %d nodes starting at %d.", num_nodes, offset)
-
-        for peek in range(num_nodes):
-            assert block[offset + peek][self.TORUS_BLOCK_STATUS] == rpc.BUSY, \
-                   'Block %d not Free!' % block[offset + peek]
-            block[offset + peek][self.TORUS_BLOCK_STATUS] = rpc.FREE
+        # reflect the request in the nodelist state (set to `FREE`)
+        self._change_slot_states(unit['slots'], rpc.FREE)
 
 
     # --------------------------------------------------------------------------
     #
-    # Follow coordinates to get the last node
-    #
-    def get_last_node(self, origin, shape):
+    def _get_sub_block(self, num_nodes):
+        '''
+        Return the smallest supported sub-block shape with at least `num_nodes`
+        nodes.
+        '''
 
-        ret = dict()
+        sizes = [n for n in self._sub_blocks if n >= num_nodes]
+        if not sizes:
+            raise ValueError('no sub-block shape for %d nodes' % num_nodes)
 
-        for dim in self._rm.torus_dimension_labels:
-            ret[dim] = origin[dim] + shape[dim] - 1
-        return ret
+        return self._sub_blocks[min(sizes)]
 
 
     # --------------------------------------------------------------------------
     #
-    # Return the number of nodes for the given block shape
-    #
-    def _shape2num_nodes(self, shape):
+    def _find_sub_block(self, sub_block):
+        '''
+        Return the block positions of the first free sub-block of the given
+        shape, or `None`.
+        '''
+
+        members = sub_block['members']
 
-        nodes = 1
-        for dim in self._rm.torus_dimension_labels:
-            nodes *= shape[dim]
+        if np is not None:
+            free = np.flatnonzero(~self._torus_busy[members].any(axis=1))
+            if not free.size:
+                return None
+            return members[free[0]].tolist()
 
-        return nodes
+        for positions in members:
+            if not any([self._torus_busy[pos] for pos in positions]):
+                return positions
+
+        return None
 
 
     # --------------------------------------------------------------------------
     #
-    # Return the offset into the node list from a corner
-    #
-    # TODO: Can this be determined instead of searched?
-    #
-    def corner2offset(self, block, corner):
-        offset = 0
+    def schedule_unit(self, unit):
+        '''
+        Find a free sub-block for the unit, and return the respective slots.
+        Only full nodes are allocated.
+        '''
 
-        for e in block:
-            if corner == e[self.TORUS_BLOCK_COOR]:
-                return offset
-            offset += 1
+        cud   = unit['description']
+        cores = cud['cpu_processes'] * (cud['cpu_threads'] or 1)
 
-        return offset
+        # FIXME GPU
+        num_nodes = int(math.ceil(cores / float(self._rm_cores_per_node)))
+        sub_block = self._get_sub_block(num_nodes)
+
+        if sub_block['num_nodes'] > self._torus_free:
+            return None
+
+        positions = self._find_sub_block(sub_block)
+        if positions is None:
+            return None
+
+        nodes = [self._torus_nodes[pos] for pos in positions]
+
+        self._log.debug('allocate sub-block %s (%d nodes) at %s for %s',
+                        sub_block['shape_str'], sub_block['num_nodes'],
+                        nodes[0]['name'], unit['uid'])
+
+        return {'nodes'              : [{'name'    : node['name'],
+                                         'uid'     : node['uid'],
+                                         'core_map': [list(range(
+                                                     self._rm_cores_per_node))],
+                                         'gpu_map' : [],
+                                         'lfs'     : {'path': None, 'size': 0},
+                                         'mem'     : 0} for node in nodes],
+                'cores_per_node'     : self._rm_cores_per_node,
+                'gpus_per_node'      : self._rm_gpus_per_node,
+                'lfs_per_node'       : self._rm_lfs_per_node,
+                'mem_per_node'       : self._rm_mem_per_node,
+                'lm_info'            : self._rm_lm_info,
+                'loadl_bg_block'     : self._bg_block,
+                'sub_block_shape_str': sub_block['shape_str'],
+                'corner_node'        : nodes[0]['name']}
 
 
 # ------------------------------------------------------------------------------
@@ -70,6 +70,7 @@ class ComputeUnit(object):
                                                 ru.ID_CUSTOM,
                                                 ns=self._session.uid)
         self._state            = rps.NEW
+        self._version          = 0
         self._log              = umgr._log
         self._exit_code        = None
         self._stdout           = None
@@ -142,6 +143,14 @@ class ComputeUnit(object):
 
         self._state = target
 
+        # updates only contain the fields which changed (see
+        # `Component.advance()`), and may arrive out of order: updates older
+        # than the ones already applied only fill in missing fields.
+        version = unit_dict.get('version', 0)
+        stale   = version < self._version
+        if not stale:
+            self._version = version
+
         # we update all fields
         # FIXME: well, not all really :/
         # FIXME: setattr is ugly...  we should maintain all state in a dict.
@@ -150,8 +159,13 @@ class ComputeUnit(object):
                     'client_sandbox']:
 
             val = unit_dict.get(key, None)
-            if val is not None:
-                setattr(self, "_%s" % key, val)
+            if val is None:
+                continue
+
+            if stale and getattr(self, '_%s' % key) is not None:
+                continue
+
+            setattr(self, "_%s" % key, val)
 
         # callbacks are not invoked here anymore, but are bulked in the umgr
 
@@ -27,6 +27,8 @@ GPU_THREAD_TYPE        = 'gpu_thread_type'
 
 LFS_PER_PROCESS        = 'lfs_per_process'
 MEM_PER_PROCESS        = 'mem_per_process'
+RUNTIME                = 'runtime'
+PRIORITY               = 'priority'
 
 INPUT_STAGING          = 'input_staging'
 OUTPUT_STAGING         = 'output_staging'
@@ -126,6 +128,23 @@ class ComputeUnitDescription(ru.Description):
        default: 0
 
 
+    .. data:: runtime
+       estimated execution time of the unit in seconds.  Schedulers may use
+       the estimate to backfill units into gaps (see the `CONTINUOUS_BACKFILL`
+       agent scheduler).  A value of `0` means that the runtime is unknown.
+
+       default: 0
+
+
+    .. data:: priority
+       scheduling priority of the unit (`int`).  Waiting units with a higher
+       priority are placed before units with a lower priority by the agent
+       scheduler, independent of their arrival order.  Negative values are
+       allowed.
+
+       default: 0
+
+
     .. data:: name
 
        A descriptive name for the compute unit (`string`).  This attribute can
@@ -243,6 +262,13 @@ class ComputeUnitDescription(ru.Description):
        Configuration specific tags which influence unit scheduling and
        execution.
 
+       The `CONTINUOUS_DAG` scheduler evaluates the `depends_on` tag, a list
+       of unit uids which need to complete before the unit is scheduled.
+
+       The agent scheduler evaluates the `group` tag (a fair-share group
+       name): waiting units of the same priority are placed group by group,
+       starting with the group which currently uses the least cores.
+
 
     .. data:: metadata
 
@@ -348,6 +374,8 @@ class ComputeUnitDescription(ru.Description):
                GPU_THREAD_TYPE : str         ,
                LFS_PER_PROCESS : int         ,
                MEM_PER_PROCESS : int         ,
+               RUNTIME         : float       ,
+               PRIORITY        : int         ,
 
                RESTARTABLE     : bool        ,
                TAGS            : {None: None},
@@ -380,6 +408,8 @@ class ComputeUnitDescription(ru.Description):
                GPU_THREAD_TYPE : ''          ,
                LFS_PER_PROCESS : 0           ,
                MEM_PER_PROCESS : 0           ,
+               RUNTIME         : 0.0         ,
+               PRIORITY        : 0           ,
 
                RESTARTABLE     : False       ,
                TAGS            : dict()      ,
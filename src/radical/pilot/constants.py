@@ -35,6 +35,7 @@ AGENT_SCHEDULE_PUBSUB          = 'agent_schedule_pubsub'
 CONTROL_PUBSUB                 = 'control_pubsub'
 STATE_PUBSUB                   = 'state_pubsub'
 LOG_PUBSUB                     = 'log_pubsub'
+FLOW_PUBSUB                    = 'flow_pubsub'
 
 
 # ------------------------------------------------------------------------------
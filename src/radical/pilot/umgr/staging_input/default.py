@@ -125,10 +125,9 @@ class Default(UMGRStagingInputComponent):
 
         for unit in units:
 
-            # no matter if we perform any staging or not, we will push the full
-            # unit info to the DB on the next advance, and will pass control to
-            # the agent.
-            unit['$all']    = True
+            # no matter if we perform any staging or not, we will pass control
+            # to the agent on the next advance.  All unit changes since the DB
+            # insert are published on that advance.
             unit['control'] = 'agent_pending'
 
             # check if we have any staging directives to be enacted in this
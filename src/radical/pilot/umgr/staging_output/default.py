@@ -71,10 +71,8 @@ class Default(UMGRStagingOutputComponent):
 
         for unit in units:
 
-            # no matter if we perform any staging or not, we will push the full
-            # unit info to the DB on the next advance, since the units will be
-            # final
-            unit['$all']    = True
+            # no matter if we perform any staging or not, the full unit info
+            # will be pushed to the DB on the final advance
             unit['control'] = None
 
             # check if we have any staging directives to be enacted in this
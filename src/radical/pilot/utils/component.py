@@ -2,13 +2,20 @@
 import os
 import copy
 import time
+import zlib
+import heapq
+import zmq
+import msgpack
 
-import threading       as mt
-import radical.utils   as ru
+import threading          as mt
+import concurrent.futures as cf
+import radical.utils      as ru
 
 from ..          import constants      as rpc
 from ..          import states         as rps
 
+from .           import inproc         as rpui
+
 
 # ------------------------------------------------------------------------------
 #
@@ -33,6 +40,9 @@ class ComponentManager(object):
         self._uid  = ru.generate_id('cmgr', ns=self._sid)
         self._uids = [self._uid]  # uids to track hartbeats for (incl. own)
 
+        self._inproc_bridges    = list()  # see `start_bridges()`
+        self._inproc_components = list()  # see `start_components()`
+
         self._prof = ru.Profiler(self._uid, ns='radical.pilot',
                                path=self._cfg.path)
         self._log  = ru.Logger(self._uid, ns='radical.pilot',
@@ -131,11 +141,51 @@ class ComponentManager(object):
         return self._cfg
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _spawn(self, kind, fnames):
+        '''
+        Run the startup command for `kind` (`bridge` or `component`) for all
+        given `{uid: config file}` entries concurrently.  The `startup_workers`
+        config setting bounds the number of startups in flight (default: 8).
+        Each startup is profiled separately.  Raises if any startup failed.
+        '''
+
+        if not fnames:
+            return
+
+        n_workers = max(1, int(self._cfg.get('startup_workers', 8)))
+
+        def _callout(uid, fname):
+
+            self._prof.prof('start_%s_start' % kind, uid=uid)
+            out, err, ret = ru.sh_callout('radical-pilot-%s %s' % (kind, fname))
+            self._log.debug('%s %s startup out: %s', kind, uid, out)
+            self._log.debug('%s %s startup err: %s', kind, uid, err)
+            self._prof.prof('start_%s_stop' % kind, uid=uid)
+
+            return ret
+
+        with cf.ThreadPoolExecutor(max_workers=n_workers) as pool:
+            futures = dict([(uid, pool.submit(_callout, uid, fname))
+                            for uid, fname in fnames.items()])
+
+        failed = [uid for uid, future in futures.items() if future.result()]
+        if failed:
+            raise RuntimeError('%s startup failed %s' % (kind, failed))
+
+        self._uids.extend(fnames.keys())
+
+
     # --------------------------------------------------------------------------
     #
     def start_bridges(self, cfg=None):
         '''
-        check if any bridges are defined under `cfg['bridges']` and start them
+        check if any bridges are defined under `cfg['bridges']` and start them.
+
+        Bridges with `inproc` set are created in this process, and can only be
+        used by components which also run in this process (see
+        `start_components()` and `inproc.py`).
         '''
 
         self._prof.prof('start_bridges_start', uid=self._uid)
@@ -145,6 +195,7 @@ class ComponentManager(object):
         if cfg is None:
             cfg = self._cfg
 
+        fnames = dict()
         for bname, bcfg in cfg.get('bridges', {}).items():
 
             bcfg.uid         = bname
@@ -154,22 +205,21 @@ class ComponentManager(object):
             bcfg.path        = cfg.path
             bcfg.heartbeat   = cfg.heartbeat
 
+            if bcfg.get('inproc'):
+                self._start_inproc_bridge(bcfg)
+                continue
+
             fname = '%s/%s.json' % (cfg.path, bcfg.uid)
             bcfg.write(fname)
 
             self._log.info('create  bridge %s [%s]', bname, bcfg.uid)
+            fnames[bcfg.uid] = fname
 
-            out, err, ret = ru.sh_callout('radical-pilot-bridge %s' % fname)
-            self._log.debug('bridge startup out: %s', out)
-            self._log.debug('bridge startup err: %s', err)
-            if ret:
-                raise RuntimeError('bridge startup failed')
+        # spawn all bridges at once, then wait for all their heartbeats to
+        # appear.
+        self._spawn('bridge', fnames)
+        self._log.info('created bridges %s', list(fnames.keys()))
 
-            self._uids.append(bcfg.uid)
-            self._log.info('created bridge %s [%s]', bname, bcfg.uid)
-
-        # all bridges should start now, for their heartbeats
-        # to appear.
       # self._log.debug('wait   for %s', self._uids)
         failed = self._hb.wait_startup(self._uids, timeout=timeout)
       # self._log.debug('waited for %s: %s', self._uids, failed)
@@ -184,7 +234,11 @@ class ComponentManager(object):
     def start_components(self, cfg=None):
         '''
         check if any components are defined under `cfg['components']`
-        and start them
+        and start them.
+
+        Components with `inproc` set are not spawned as separate processes,
+        but run in threads of this process.  They are not monitored via
+        heartbeats, but live and die with this process.
         '''
 
         self._prof.prof('start_components_start', uid=self._uid)
@@ -202,11 +256,14 @@ class ComponentManager(object):
         if 'bridges'    in scfg: del(scfg['bridges'])
         if 'components' in scfg: del(scfg['components'])
 
+        fnames = dict()
+        inproc = list()
         for cname, ccfg in cfg.get('components', {}).items():
 
-            for _ in range(ccfg.get('count', 1)):
+            for idx in range(ccfg.get('count', 1)):
 
                 ccfg.uid         = ru.generate_id(cname, ns=self._sid)
+                ccfg.index       = idx
                 ccfg.cmgr        = self.uid
                 ccfg.kind        = cname
                 ccfg.sid         = cfg.sid
@@ -216,22 +273,24 @@ class ComponentManager(object):
 
                 ccfg.merge(scfg, policy=ru.PRESERVE, log=self._log)
 
+                if ccfg.get('inproc'):
+                    inproc.append(ru.Config(cfg=ccfg))
+                    continue
+
                 fname = '%s/%s.json' % (cfg.path, ccfg.uid)
                 ccfg.write(fname)
 
                 self._log.info('create  component %s [%s]', cname, ccfg.uid)
+                fnames[ccfg.uid] = fname
 
-                out, err, ret = ru.sh_callout('radical-pilot-component %s' % fname)
-                self._log.debug('out: %s' , out)
-                self._log.debug('err: %s' , err)
-                if ret:
-                    raise RuntimeError('bridge startup failed')
+        # spawn all components at once, then wait for all their heartbeats to
+        # appear.
+        self._spawn('component', fnames)
+        self._log.info('created components %s', list(fnames.keys()))
 
-                self._uids.append(ccfg.uid)
-                self._log.info('created component %s [%s]', cname, ccfg.uid)
+        for ccfg in inproc:
+            self._start_inproc_component(ccfg)
 
-        # all components should start now, for their heartbeats
-        # to appear.
         failed = self._hb.wait_startup(self._uids, timeout=timeout * 10)
         if failed:
             raise RuntimeError('could not start all components %s' % failed)
@@ -239,16 +298,268 @@ class ComponentManager(object):
         self._prof.prof('start_components_stop', uid=self._uid)
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _start_inproc_bridge(self, bcfg):
+        '''
+        create an in-process bridge, and publish it in the bridge's address file
+        '''
+
+        self._prof.prof('start_bridge_start', uid=bcfg.uid)
+
+        if bcfg.kind == 'queue':
+            bridge = rpui.Queue(bcfg.channel, bcfg.path)
+        elif bcfg.kind == 'pubsub':
+            bridge = rpui.PubSub(bcfg.channel, bcfg.path)
+        else:
+            raise ValueError('invalid bridge kind %s' % bcfg.kind)
+
+        bridge.start()
+
+        addr = {'uid'   : bcfg.uid,
+                'inproc': True}
+        for key in ['flow_hwm', 'flow_lwm']:
+            if bcfg.get(key):
+                addr[key] = bcfg[key]
+
+        ru.write_json('%s/%s.cfg' % (bcfg.path, bcfg.uid), addr)
+
+        self._inproc_bridges.append(bridge)
+        self._log.info('created in-process bridge %s', bcfg.uid)
+        self._prof.prof('start_bridge_stop', uid=bcfg.uid)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _start_inproc_component(self, ccfg):
+        '''
+        create a component in this process, with its own non-primary session
+        (as `radical-pilot-component` would), and start its work thread
+        '''
+
+        from ..session import Session
+
+        self._prof.prof('start_component_start', uid=ccfg.uid)
+
+        session = Session(cfg=ccfg, _primary=False)
+        comp    = Component.create(ccfg, session)
+        comp.start()
+
+        self._inproc_components.append(comp)
+        self._log.info('created in-process component %s', ccfg.uid)
+        self._prof.prof('start_component_stop', uid=ccfg.uid)
+
+
     # --------------------------------------------------------------------------
     #
     def close(self):
 
         self._prof.prof('close', uid=self._uid)
 
+        for comp in self._inproc_components:
+            comp.stop()
+
+        for bridge in self._inproc_bridges:
+            bridge.stop()
+
         self._hb_bridge.stop()
         self._hb.stop()
 
 
+# ------------------------------------------------------------------------------
+#
+class _TimerWheel(object):
+    '''
+    A component can register any number of timed callbacks (see
+    `Component.register_timed_cb()`).  Instead of spawning one thread per
+    callback, all callbacks are served by this single thread which keeps a heap
+    of callback deadlines.  The thread sleeps on a condition variable until the
+    next deadline is due, or until the set of callbacks changes.
+
+    A callback is invoked (under the component's callback lock) when its
+    deadline passed, and is then rescheduled for `timer` seconds after the
+    invocation started.  A callback which returns `False` is unregistered.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name, log, cb_lock):
+
+        self._name    = name
+        self._log     = log
+        self._cb_lock = cb_lock
+        self._cond    = mt.Condition()
+        self._heap    = list()      # [deadline, seq, name]
+        self._cbs     = dict()      # name: [cb, cb_data, timer, entry]
+        self._seq     = 0           # heap tie breaker
+        self._term    = False
+
+        self._thread = mt.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, name, cb, cb_data, timer):
+        '''
+        register a callback, and schedule its first invocation immediately.
+        Returns `False` if a callback with that name is already registered.
+        '''
+
+        with self._cond:
+
+            if name in self._cbs:
+                return False
+
+            self._cbs[name] = [cb, cb_data, timer, None]
+            self._schedule(name, time.time())
+            self._cond.notify()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def remove(self, name, reg=None):
+        '''
+        unregister a callback.  Its heap entry is discarded lazily.  Returns
+        `False` if no callback with that name is registered.  If `reg` is
+        given, the callback is only unregistered if it is still that
+        registration (and not registered anew under the same name).
+        '''
+
+        with self._cond:
+
+            if name not in self._cbs:
+                return False
+
+            if reg is not None and self._cbs[name] is not reg:
+                return False
+
+            del(self._cbs[name])
+            self._cond.notify()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def is_current(self):
+        '''
+        check if the caller runs in the timer thread, ie. in a timed callback
+        '''
+
+        return self._thread is mt.current_thread()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        with self._cond:
+            self._term = True
+            self._cond.notify()
+
+        # callbacks may stop the component from within the timer thread
+        if self._thread is not mt.current_thread():
+            self._thread.join(timeout=1.0)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _schedule(self, name, deadline):
+
+        # must be called with `self._cond` acquired
+        self._seq += 1
+        entry = [deadline, self._seq, name]
+        self._cbs[name][3] = entry
+        heapq.heappush(self._heap, entry)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _run(self):
+
+        self._log.debug('start timer thread: %s', self._name)
+
+        while True:
+
+            with self._cond:
+
+                while not self._term:
+
+                    # discard stale entries (removed or rescheduled callbacks)
+                    while self._heap:
+                        name = self._heap[0][2]
+                        if name in self._cbs and \
+                           self._cbs[name][3] is self._heap[0]:
+                            break
+                        heapq.heappop(self._heap)
+
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+
+                    self._cond.wait(timeout=delay)
+
+                if self._term:
+                    break
+
+                _, _, name = heapq.heappop(self._heap)
+                reg = self._cbs[name]
+                cb, cb_data, timer, _ = reg
+
+                # reschedule before invocation, so that the callback can
+                # unregister itself
+                start = time.time()
+                self._schedule(name, start + timer)
+
+            try:
+                with self._cb_lock:
+
+                    # the callback may have been unregistered (under the
+                    # callback lock) since it got due: then it must not be
+                    # invoked anymore
+                    with self._cond:
+                        if self._cbs.get(name) is not reg:
+                            continue
+
+                    if cb_data is not None: ret = cb(cb_data=cb_data)
+                    else                  : ret = cb()
+
+            except:
+                self._log.exception('timed cb failed: %s', cb)
+                ret = False
+
+            if not ret:
+                self.remove(name, reg)
+
+        self._log.debug('stop  timer thread: %s', self._name)
+
+
+# ------------------------------------------------------------------------------
+#
+def _fingerprint(val):
+    '''
+    A cheap fingerprint of a thing's value, which is identical in all
+    processes.  It is used to detect which values changed between two state
+    publications of a thing (see `Component.advance()`).
+    '''
+
+    if val is None or isinstance(val, (int, float)):
+        return val
+
+    if isinstance(val, str):
+        return zlib.crc32(val.encode('utf-8', 'surrogatepass'))
+
+    return zlib.crc32(msgpack.packb(val, use_bin_type=True, default=str))
+
+
 # ------------------------------------------------------------------------------
 #
 class Component(object):
@@ -407,13 +718,22 @@ class Component(object):
         self._components = list()       # sub-components
         self._inputs     = dict()       # queues to get things from
         self._outputs    = dict()       # queues to send things to
+        self._out_flows  = dict()       # flow control for output queues
+        self._flows      = dict()       # flow control state per queue
+        self._flow_cond  = mt.Condition()  # guards `_flows`
         self._workers    = dict()       # methods to work on things
         self._publishers = dict()       # channels to send notifications to
-        self._threads    = dict()       # subscriber and idler threads
+        self._pub_lock   = mt.Lock()    # publishers may be used by threads
+        self._timer      = None         # timer thread for timed callbacks
         self._cb_lock    = ru.RLock('comp.cb_lock.%s' % self._name)
                                         # guard threaded callback invokations
 
         self._subscribers = dict()      # ZMQ Subscriber classes
+        self._poller      = zmq.Poller()  # wakes `work_cb` on input data
+
+        # max time (in ms) the work loop blocks on idle inputs before checking
+        # for termination
+        self._poll_timeout = int(cfg.get('poll_timeout', 0.1) * 1000)
 
         if self._owner == self.uid:
             self._owner = 'root'
@@ -618,8 +938,8 @@ class Component(object):
         # call component level finalize, before we tear down channels
         self.finalize()
 
-        for thread in self._threads.values():
-            thread.stop()
+        if self._timer:
+            self._timer.stop()
 
         self._log.debug('%s close prof', self.uid)
         try:
@@ -685,10 +1005,21 @@ class Component(object):
         fname = '%s/%s.cfg' % (self._cfg.path, input)
         cfg   = ru.read_json(fname)
 
-        self._inputs[name] = {'queue'  : ru.zmq.Getter(input, url=cfg['get'],
-                                         log=self._log),
+        if cfg.get('inproc'):
+            getter = rpui.Getter(input, self._cfg.path)
+            poll   = getter.fileno()
+        else:
+            getter = ru.zmq.Getter(input, url=cfg['get'], log=self._log)
+            poll   = getter._q
+
+        self._inputs[name] = {'queue'  : getter,
+                              'poll'   : poll,
+                              'flow'   : self._flow_register(input, cfg),
                               'states' : states}
 
+        # the work loop blocks on all input sockets at once (see `work_cb()`)
+        self._poller.register(poll, zmq.POLLIN)
+
         self._log.debug('registered input %s', name)
 
         # we want exactly one worker associated with a state -- but a worker can
@@ -721,7 +1052,9 @@ class Component(object):
             self._log.warn('input %s not registered', name)
             return
 
-        self._inputs[name]['queue'].stop()
+        getter = self._inputs[name]['queue']
+        self._poller.unregister(self._inputs[name]['poll'])
+        getter.stop()
         del(self._inputs[name])
         self._log.debug('unregistered input %s', name)
 
@@ -750,6 +1083,12 @@ class Component(object):
         mark the drop in the log.  No other component should ever again work on
         such a final thing.  It is the responsibility of the component to make
         sure that the thing is in fact in a final state.
+
+        If the output queue is configured with a high watermark (`flow_hwm`),
+        advance() blocks while that many things are queued, until the
+        consumers drained the queue to the low watermark (`flow_lwm`).  The
+        consumers report the number of things they got via the `flow_pubsub`
+        (see `_flow_register()`).
         '''
 
         if not isinstance(states, list):
@@ -774,7 +1113,14 @@ class Component(object):
                 fname = '%s/%s.cfg' % (self._cfg.path, output)
                 cfg   = ru.read_json(fname)
 
-                self._outputs[state] = ru.zmq.Putter(output, url=cfg['put'])
+                if cfg.get('inproc'):
+                    self._outputs[state] = rpui.Putter(output, self._cfg.path)
+                else:
+                    self._outputs[state] = ru.zmq.Putter(output,
+                                                         url=cfg['put'])
+
+                self._out_flows[state] = self._flow_register(output, cfg,
+                                                             producer=True)
 
 
 
@@ -797,6 +1143,7 @@ class Component(object):
                 continue
 
             del(self._outputs[state])
+            self._out_flows.pop(state, None)
             self._log.debug('unregistered output for %s', state)
 
 
@@ -808,72 +1155,25 @@ class Component(object):
         to *not* be called more frequently than 'timer' seconds, no promise is
         made on a minimal call frequency.  The intent for these callbacks is to
         run lightweight work in semi-regular intervals.
+
+        All timed callbacks of a component are served by a single timer thread
+        (see `_TimerWheel`), which is created on the first registration.
         '''
 
         name = "%s.idler.%s" % (self.uid, cb.__name__)
         self._log.debug('START: %s register idler %s', self.uid, name)
 
         with self._cb_lock:
-            if name in self._threads:
-                raise ValueError('cb %s already registered' % cb.__name__)
+
+            if not self._timer:
+                self._timer = _TimerWheel(name='%s.timer' % self.uid,
+                                          log=self._log, cb_lock=self._cb_lock)
 
             if timer is None: timer = 0.0  # NOTE: busy idle loop
             else            : timer = float(timer)
 
-            # create a separate thread per idle cb, and let it be watched by the
-            # ru.Process base class
-            #
-            # ------------------------------------------------------------------
-            # NOTE: idle timing is a tricky beast: if we sleep for too long,
-            #       then we have to wait that long on stop() for the thread to
-            #       get active again and terminate/join.  So we always sleep
-            #       just a little, and explicitly check if sufficient time has
-            #       passed to activate the callback.
-            class Idler(mt.Thread):
-
-                # --------------------------------------------------------------
-                def __init__(self, name, log, timer, cb, cb_data, cb_lock):
-                    self._name    = name
-                    self._log     = log
-                    self._timeout = timer
-                    self._cb      = cb
-                    self._cb_data = cb_data
-                    self._cb_lock = cb_lock
-                    self._last    = 0.0
-                    self._term    = mt.Event()
-
-                    super(Idler, self).__init__()
-                    self.daemon = True
-                    self.start()
-
-                def stop(self):
-                    self._term.set()
-
-                def run(self):
-                    try:
-                        self._log.debug('start idle thread: %s', self._cb)
-                        ret = True
-                        while ret and not self._term.is_set():
-                            if self._timeout and \
-                               self._timeout > (time.time() - self._last):
-                                # not yet
-                                time.sleep(0.1)  # FIXME: make configurable
-                                continue
-
-                            with self._cb_lock:
-                                if self._cb_data is not None:
-                                    ret = self._cb(cb_data=self._cb_data)
-                                else:
-                                    ret = self._cb()
-                            if self._timeout:
-                                self._last = time.time()
-                    except:
-                        self._log.exception('idle thread failed: %s', self._cb)
-            # ------------------------------------------------------------------
-
-            idler = Idler(name=name, timer=timer, log=self._log,
-                          cb=cb, cb_data=cb_data, cb_lock=self._cb_lock)
-            self._threads[name] = idler
+            if not self._timer.add(name, cb, cb_data, timer):
+                raise ValueError('cb %s already registered' % cb.__name__)
 
         self._log.debug('%s registered idler %s', self.uid, name)
 
@@ -883,8 +1183,8 @@ class Component(object):
     def unregister_timed_cb(self, cb):
         '''
         This method is reverts the register_timed_cb() above: it
-        removes an idler from the component, and will terminate the
-        respective thread.
+        removes an idler from the component, so that the callback will not be
+        invoked anymore.
         '''
 
         name = "%s.idler.%s" % (self.uid, cb.__name__)
@@ -892,14 +1192,11 @@ class Component(object):
 
         with self._cb_lock:
 
-            if name not in self._threads:
+            if not self._timer or not self._timer.remove(name):
                 self._log.warn('timed cb %s is not registered', name)
               # raise ValueError('%s is not registered' % name)
                 return
 
-            self._threads[name].stop()  # implies join
-            del(self._threads[name])
-
         self._log.debug("TERM : %s unregistered idler %s", self.uid, name)
 
 
@@ -916,17 +1213,19 @@ class Component(object):
         # dig the addresses from the bridge's config file
         fname = '%s/%s.cfg' % (self._cfg.path, pubsub)
         cfg   = ru.read_json(fname)
-        addr  = cfg['pub']
 
-        self._publishers[pubsub] = ru.zmq.Publisher(pubsub, url=addr,
-                                                            log=self._log)
+        if cfg.get('inproc'):
+            self._publishers[pubsub] = rpui.Publisher(pubsub, self._cfg.path)
+        else:
+            self._publishers[pubsub] = ru.zmq.Publisher(pubsub, url=cfg['pub'],
+                                                                log=self._log)
 
         self._log.debug('registered publisher for %s', pubsub)
 
 
     # --------------------------------------------------------------------------
     #
-    def register_subscriber(self, pubsub, cb):
+    def register_subscriber(self, pubsub, cb, locked=True):
         '''
         This method is complementary to the register_publisher() above: it
         registers a subscription to a pubsub channel.  If a notification
@@ -940,7 +1239,8 @@ class Component(object):
         The subscription will be handled in a separate thread, which implies
         that the callback invocation will also happen in that thread.  It is the
         caller's responsibility to ensure thread safety during callback
-        invocation.
+        invocation.  Unless `locked` is `False`, callbacks are invoked under
+        the component's callback lock, ie. never concurrently to workers.
         '''
 
         # dig the addresses from the bridge's config file
@@ -948,12 +1248,227 @@ class Component(object):
         cfg   = ru.read_json(fname)
 
         if pubsub not in self._subscribers:
-            self._subscribers[pubsub] = ru.zmq.Subscriber(channel=pubsub,
-                                                          url=cfg['sub'],
-                                                          log=self._log)
+            if cfg.get('inproc'):
+                self._subscribers[pubsub] = rpui.Subscriber(pubsub,
+                                                            self._cfg.path,
+                                                            log=self._log)
+            else:
+                self._subscribers[pubsub] = ru.zmq.Subscriber(channel=pubsub,
+                                                              url=cfg['sub'],
+                                                              log=self._log)
 
-        self._subscribers[pubsub].subscribe(topic=pubsub, cb=cb,
-                                             lock=self._cb_lock)
+        if locked: lock = self._cb_lock
+        else     : lock = None
+
+        self._subscribers[pubsub].subscribe(topic=pubsub, cb=cb, lock=lock)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flow_register(self, queue, cfg, producer=False):
+        '''
+        Flow control is credit based: a producer may push things to a queue as
+        long as fewer than `flow_hwm` things are queued.  Once that limit is
+        reached, the producer is throttled until the consumers drained the
+        queue to `flow_lwm` things.  The fill level of a queue is derived from
+        the number of things all producers put and all consumers got, which
+        are published on the `flow_pubsub` as running totals (so lost
+        messages don't matter).
+
+        Returns the flow state of the queue, or `None` if the queue's bridge
+        config does not define a high watermark.
+        '''
+
+        hwm = cfg.get('flow_hwm')
+        if not hwm:
+            return None
+
+        with self._flow_cond:
+
+            if queue not in self._flows:
+
+                lwm = cfg.get('flow_lwm') or hwm // 2
+
+                self._flows[queue] = {
+                        'queue': queue,
+                        'hwm'  : hwm,
+                        'lwm'  : lwm,
+                        'step' : max(1, lwm // 2),  # report interval
+                        'puts' : dict(),  # producer uid: things put
+                        'gots' : dict(),  # consumer uid: things got
+                        'put'  : 0,       # things this component put
+                        'got'  : 0,       # things this component got
+                        'sent' : dict(),  # last reported totals
+                        'last' : 0.0,     # time of last report
+                        'held' : False}   # throttled until low watermark
+
+            flow = self._flows[queue]
+
+        if rpc.FLOW_PUBSUB not in self._publishers:
+            self.register_publisher(rpc.FLOW_PUBSUB)
+
+        # producers need to learn about consumed things - even while they are
+        # blocked in a worker (ie. under the callback lock).
+        if producer and rpc.FLOW_PUBSUB not in self._subscribers:
+            self.register_subscriber(rpc.FLOW_PUBSUB, self._flow_cb,
+                                     locked=False)
+
+        self._log.debug('flow control for %s: %d / %d', queue, flow['hwm'],
+                        flow['lwm'])
+        return flow
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flow_cb(self, topic, msg):
+        '''
+        collect the running totals of things put and got by other components
+        '''
+
+        cmd = msg['cmd']
+        arg = msg['arg']
+
+        if cmd not in ['put', 'got']:
+            return True
+
+        with self._flow_cond:
+
+            flow = self._flows.get(arg['queue'])
+            if not flow:
+                return True
+
+            counts = flow[cmd + 's']
+            if arg['n'] > counts.get(arg['uid'], 0):
+                counts[arg['uid']] = arg['n']
+                self._flow_cond.notify_all()
+
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flow_report(self, flow, cmd, force=False):
+        '''
+        Publish the number of things this component put to or got from the
+        queue, if it changed by at least `step` things since the last report.
+        With `force` (used when the component is idle), any change is
+        reported, and the total is re-published once per second, which covers
+        reports lost before a producer subscribed.
+        '''
+
+        with self._flow_cond:
+
+            n    = flow[cmd]
+            now  = time.time()
+            diff = n - flow['sent'].get(cmd, 0)
+
+            if force: due = diff or (n and now - flow['last'] >= 1.0)
+            else    : due = diff >= flow['step']
+
+            if not due:
+                return
+
+            flow['sent'][cmd] = n
+            flow['last']      = now
+
+        self.publish(rpc.FLOW_PUBSUB, {'cmd': cmd,
+                                       'arg': {'queue': flow['queue'],
+                                               'uid'  : self._uid,
+                                               'n'    : n}})
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flow_fill(self, flow):
+
+        # must be called with `self._flow_cond` acquired
+        return sum(flow['puts'].values()) - sum(flow['gots'].values())
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flow_credit(self, flow):
+        '''
+        Return the number of things which can be pushed to a flow controlled
+        queue right now.  Once the queue reached the high watermark, there is
+        no credit until it got drained to the low watermark.
+        '''
+
+        # must be called with `self._flow_cond` acquired
+        fill = self._flow_fill(flow)
+
+        if flow['held']:
+            if fill > flow['lwm']:
+                return 0
+            flow['held'] = False
+
+        return max(0, flow['hwm'] - fill)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _output_credit(self, state):
+        '''
+        Return the number of things in the given state which can be pushed
+        downstream without being throttled, or `None` if the respective output
+        is not flow controlled.  This allows producers to limit the things they
+        fetch to what they can pass on.
+        '''
+
+        flow = self._out_flows.get(state)
+        if not flow:
+            return None
+
+        with self._flow_cond:
+            return self._flow_credit(flow)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _flow_put(self, flow, n):
+        '''
+        Wait for credit to push things to a flow controlled queue, then account
+        for up to `n` things.  Returns the number of things accounted for, ie.
+        the number of things which can be pushed now.
+
+        Timed callbacks are never blocked, as they share the timer thread (see
+        `_TimerWheel`): they should limit the things they push to the available
+        credit (see `_output_credit()`).
+        '''
+
+        with self._flow_cond:
+
+            credit = self._flow_credit(flow)
+
+            if not credit and self._timer and self._timer.is_current():
+                self._log.warn('timed cb exceeds credit for %s', flow['queue'])
+                credit = n
+
+            if not credit:
+
+                self._log.debug('throttle output to %s', flow['queue'])
+                self._prof.prof('flow_throttle', uid=self._uid,
+                                msg=flow['queue'])
+
+                while not credit and not self._term.is_set():
+                    self._flow_cond.wait(timeout=1.0)
+                    credit = self._flow_credit(flow)
+
+                self._prof.prof('flow_release', uid=self._uid,
+                                msg=flow['queue'])
+
+            # things are not held back on termination
+            if credit: n = min(n, credit)
+
+            flow['put'] += n
+            flow['puts'][self._uid] = flow['put']
+
+            if self._flow_fill(flow) >= flow['hwm']:
+                flow['held'] = True
+
+        self._flow_report(flow, 'put')
+
+        return n
 
 
     # --------------------------------------------------------------------------
@@ -962,82 +1477,124 @@ class Component(object):
         '''
         This is the main routine of the component, as it runs in the component
         process.  It will first initialize the component in the process context.
-        Then it will attempt to get new things from all input queues
-        (round-robin).  For each thing received, it will route that thing to the
-        respective worker method.  Once the thing is worked upon, the next
-        attempt on getting a thing is up.
+        Then it will wait for new things to arrive on any of the input queues.
+        All things available at that point are collected from all inputs, and
+        each thing is routed to the respective worker method.  Once the things
+        are worked upon, the loop blocks again until the next input has data.
         '''
 
-        # if no action occurs in this iteration, idle
+        # if no inputs are registered, idle
         if not self._inputs:
-            time.sleep(0.1)
+            self._term.wait(timeout=self._poll_timeout / 1000.0)
             return True
 
+        # Getters are request/response sockets: `get_nowait()` will send
+        # a request (once) and pick up any reply already delivered.  We thus
+        # first drain all inputs without blocking - that also ensures that
+        # a request is pending on every input.  Only if no input had any data
+        # we block on all input sockets at once, until any of them becomes
+        # readable (or until the poll times out, so that we notice
+        # termination).
+        things = self._get_inputs()
+
+        if not things:
+            ru.zmq.utils.no_intr(self._poller.poll,
+                                 timeout=self._poll_timeout)
+            things = self._get_inputs()
+
+        for name, bulk in things:
+            self._work_on(name, bulk)
+
+        # keep work_cb registered
+        return True
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_inputs(self):
+        '''
+        collect any things which are readily available on the input queues,
+        without blocking.  Returns a list of `[input_name, things]` tuples.
+        '''
+
+        ret = list()
         for name in self._inputs:
-            input  = self._inputs[name]['queue']
-            states = self._inputs[name]['states']
 
-            # FIXME: a simple, 1-thing caching mechanism would likely
-            #        remove the req/res overhead completely (for any
-            #        non-trivial worker).
-            things = input.get_nowait(500)  # in microseconds
+            things = self._inputs[name]['queue'].get_nowait(0)
             things = ru.as_list(things)
 
-            if not things:
-                return True
+            flow = self._inputs[name].get('flow')
+            if flow:
+                if things:
+                    with self._flow_cond:
+                        flow['got'] += len(things)
+                    self._flow_report(flow, 'got')
+                else:
+                    self._flow_report(flow, 'got', force=True)
+
+            if things:
+                ret.append([name, things])
+
+        return ret
 
-            # the worker target depends on the state of things, so we
-            # need to sort the things into buckets by state before
-            # pushing them
-            buckets = dict()
-            for thing in things:
-                state = thing['state']
-                uid   = thing['uid']
-                self._prof.prof('get', uid=uid, state=state)
 
-                if state not in buckets:
-                    buckets[state] = list()
-                buckets[state].append(thing)
+    # --------------------------------------------------------------------------
+    #
+    def _work_on(self, name, things):
+        '''
+        pass a bulk of things received on input `name` to the worker methods
+        '''
 
-            # We now can push bulks of things to the workers
+        states = self._inputs[name]['states']
 
-            for state,things in buckets.items():
+        # the worker target depends on the state of things, so we
+        # need to sort the things into buckets by state before
+        # pushing them
+        buckets = dict()
+        for thing in things:
+            state = thing['state']
+            uid   = thing['uid']
+            self._prof.prof('get', uid=uid, state=state)
 
-                assert(state in states), 'inconsistent state'
-                assert(state in self._workers), 'no worker for state %s' % state
+            if state not in buckets:
+                buckets[state] = list()
+            buckets[state].append(thing)
 
-                try:
-                    to_cancel = list()
-                    for thing in things:
-                        uid   = thing['uid']
-                        ttype = thing['type']
-                        state = thing['state']
+        # We now can push bulks of things to the workers
 
-                        # FIXME: this can become expensive over time
-                        #        if the cancel list is never cleaned
-                        if uid in self._cancel_list:
-                            with self._cancel_lock:
-                                self._cancel_list.remove(uid)
-                            to_cancel.append(thing)
+        for state,things in buckets.items():
 
-                        self._log.debug('got %s (%s)', ttype, uid)
+            assert(state in states), 'inconsistent state'
+            assert(state in self._workers), 'no worker for state %s' % state
 
-                    if to_cancel:
-                        self.advance(to_cancel, rps.CANCELED, publish=True,
-                                                              push=False)
-                    with self._cb_lock:
-                        self._workers[state](things)
+            try:
+                to_cancel = list()
+                for thing in things:
+                    uid   = thing['uid']
+                    ttype = thing['type']
+                    state = thing['state']
 
-                except Exception:
+                    # FIXME: this can become expensive over time
+                    #        if the cancel list is never cleaned
+                    if uid in self._cancel_list:
+                        with self._cancel_lock:
+                            self._cancel_list.remove(uid)
+                        to_cancel.append(thing)
 
-                    # this is not fatal -- only the 'things' fail, not
-                    # the component
-                    self._log.exception("work %s failed", self._workers[state])
-                    self.advance(things, rps.FAILED, publish=True, push=False)
+                    self._log.debug('got %s (%s)', ttype, uid)
 
+                if to_cancel:
+                    self.advance(to_cancel, rps.CANCELED, publish=True,
+                                                          push=False)
+                with self._cb_lock:
+                    self._workers[state](things)
 
-        # keep work_cb registered
-        return True
+            except Exception:
+
+                # this is not fatal -- only the 'things' fail, not
+                # the component
+                self._log.exception("work %s failed", self._workers[state])
+                self.advance(things, rps.FAILED, publish=True, push=False)
 
 
     # --------------------------------------------------------------------------
@@ -1060,10 +1617,19 @@ class Component(object):
         'Things' are expected to be a dictionary, and to have 'state', 'uid' and
         optionally 'type' set.
 
-        If 'thing' contains an '$all' key, the complete dict is published;
-        otherwise, *only the state* is published.
-
-        This is evaluated in self.publish.
+        If 'thing' contains an '$all' key, or if it is in a final state, the
+        complete dict is published.  Otherwise *only the changes* since the last
+        publication of the thing are published: 'uid', 'type' and 'state', the
+        values which changed, and the keys listed in `thing['$set']`.  Changes
+        are tracked in `thing['$pub']`, which travels with the thing from
+        component to component.  When a thing is published for the first time,
+        its values are assumed to be known to the receivers (they usually
+        originate from the DB), and only the state and `$set` keys are
+        published.
+
+        All publications carry the thing's 'version' counter, which is
+        incremented on each publication, so that receivers can detect stale
+        updates.  Keys starting with `$` are never published.
         '''
 
         if not ts:
@@ -1105,23 +1671,36 @@ class Component(object):
 
             # If '$all' is set, we update the complete thing_dict.
             # Things in final state are also published in full.
-            # If '$set' is set, we also publish all keys listed in there.
-            # In all other cases, we only send 'uid', 'type' and 'state'.
+            # In all other cases, we send 'uid', 'type' and 'state', all values
+            # which changed since the last publication, and the keys listed in
+            # '$set'.
             for thing in things:
-                if '$all' in thing:
-                    del(thing['$all'])
-                    to_publish.append(thing)
 
-                elif thing['state'] in rps.FINAL:
-                    to_publish.append(thing)
+                old = thing.get('$pub')
+                fps = dict([(key, _fingerprint(val))
+                            for key, val in thing.items()
+                            if  key[0] != '$' and key != 'version'])
+
+                thing['version'] = thing.get('version', 0) + 1
+
+                if '$all' in thing or thing['state'] in rps.FINAL:
+                    tmp = dict([(key, val) for key, val in thing.items()
+                                           if key[0] != '$'])
 
                 else:
                     tmp = {'uid'   : thing['uid'],
                            'type'  : thing['type'],
                            'state' : thing['state']}
+                    if old is not None:
+                        for key, fp in fps.items():
+                            if key not in old or old[key] != fp:
+                                tmp[key] = thing[key]
                     for key in thing.get('$set', []):
                         tmp[key] = thing[key]
-                    to_publish.append(tmp)
+
+                thing['$pub']  = fps
+                tmp['version'] = thing['version']
+                to_publish.append(tmp)
 
             self.publish(rpc.STATE_PUBSUB, {'cmd': 'update', 'arg': to_publish})
 
@@ -1171,10 +1750,21 @@ class Component(object):
                     continue
 
                 output = self._outputs[_state]
+                flow   = self._out_flows.get(_state)
+
+                # push the thing down the drain.  Flow controlled queues get
+                # the bulk in chunks which fit the credit.
+                start = 0
+                while start < len(_things):
+
+                    if flow: n = self._flow_put(flow, len(_things) - start)
+                    else   : n = len(_things)
+
+                    chunk  = _things[start:start + n]
+                    start += n
 
-                # push the thing down the drain
-                self._log.debug('put bulk %s: %s', _state, len(_things))
-                output.put(_things)
+                    self._log.debug('put bulk %s: %s', _state, len(chunk))
+                    output.put(chunk)
 
                 ts = time.time()
                 for thing in _things:
@@ -1200,7 +1790,8 @@ class Component(object):
         if not self._publishers[pubsub]:
             raise RuntimeError("no msg route for '%s': %s" % (pubsub, msg))
 
-        self._publishers[pubsub].put(pubsub, msg)
+        with self._pub_lock:
+            self._publishers[pubsub].put(pubsub, msg)
 
 
 # ------------------------------------------------------------------------------
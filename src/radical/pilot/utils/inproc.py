@@ -0,0 +1,334 @@
+
+__copyright__ = "Copyright 2020, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import copy
+import queue
+import collections
+
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+# In-process communication channels.  Those mirror the `ru.zmq` bridges (queues
+# and pubsubs) and their endpoints (`Putter` / `Getter`, `Publisher` /
+# `Subscriber`), but pass messages in memory.  They can thus only be used by
+# components which live in the same process as the bridge (see the `inproc`
+# settings of `ComponentManager`).  Bridges are registered per process, under
+# their session path and channel name, and endpoints find them there.
+#
+# Queues are `deque`s, which don't need any locking.  Things are passed by
+# reference: a component disowns the things it pushes.  The read end of
+# a pipe signals data availability, so that getters can be polled together with
+# ZMQ sockets (see `Component.work_cb()`).
+#
+# Pubsub messages are copied once per publication (the publisher may continue
+# to change the published things), and are delivered to each subscriber by its
+# own callback thread.
+#
+_bridges = dict()     # map (path, channel): bridge
+_lock    = mt.Lock()  # guards `_bridges`
+
+
+# ------------------------------------------------------------------------------
+#
+def _register(bridge):
+
+    key = (bridge.path, bridge.channel)
+
+    with _lock:
+        if key in _bridges:
+            raise ValueError('in-process bridge %s exists' % bridge.channel)
+        _bridges[key] = bridge
+
+
+def _unregister(bridge):
+
+    with _lock:
+        _bridges.pop((bridge.path, bridge.channel), None)
+
+
+def _lookup(channel, path):
+
+    with _lock:
+        bridge = _bridges.get((path, channel))
+
+    if not bridge:
+        raise RuntimeError('no in-process bridge %s in this process' % channel)
+
+    return bridge
+
+
+# ------------------------------------------------------------------------------
+#
+class Queue(object):
+    '''
+    An in-process queue bridge.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, channel, path):
+
+        self.channel = channel
+        self.path    = path
+
+        self._things = collections.deque()
+        self._rfd    = None
+        self._wfd    = None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def start(self):
+
+        self._rfd, self._wfd = os.pipe()
+        os.set_blocking(self._rfd, False)
+        os.set_blocking(self._wfd, False)
+
+        _register(self)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        _unregister(self)
+
+        os.close(self._rfd)
+        os.close(self._wfd)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def fileno(self):
+
+        return self._rfd
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _signal(self):
+
+        try:
+            os.write(self._wfd, b'.')
+        except BlockingIOError:
+            pass  # pipe is full - readers will wake up anyway
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, things):
+
+        self._things.append(things)
+        self._signal()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self):
+        '''
+        Return the next bulk of things, or `None` if the queue is empty.  This
+        never blocks.
+        '''
+
+        try:
+            os.read(self._rfd, 1024)
+        except BlockingIOError:
+            pass
+
+        try:
+            things = self._things.popleft()
+        except IndexError:
+            return None
+
+        # keep other getters awake while data remain
+        if self._things:
+            self._signal()
+
+        return things
+
+
+# ------------------------------------------------------------------------------
+#
+class PubSub(object):
+    '''
+    An in-process pubsub bridge.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, channel, path):
+
+        self.channel = channel
+        self.path    = path
+
+        # list of [topic, queue], replaced (not changed) on subscription
+        self._subs   = list()
+        self._lock   = mt.Lock()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def start(self):
+
+        _register(self)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        _unregister(self)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def subscribe(self, topic, q):
+
+        with self._lock:
+            self._subs = self._subs + [[topic, q]]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unsubscribe(self, q):
+
+        with self._lock:
+            self._subs = [sub for sub in self._subs if sub[1] is not q]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def put(self, topic, msg):
+
+        subs = [q for t, q in self._subs if t == topic]
+
+        if subs:
+            msg = copy.deepcopy(msg)
+            for q in subs:
+                q.put([topic, msg])
+
+
+# ------------------------------------------------------------------------------
+#
+class Putter(object):
+
+    def __init__(self, channel, path):
+
+        self.name    = channel
+        self._bridge = _lookup(channel, path)
+
+    def put(self, things):
+
+        self._bridge.put(things)
+
+
+# ------------------------------------------------------------------------------
+#
+class Getter(object):
+
+    def __init__(self, channel, path):
+
+        self.name    = channel
+        self._bridge = _lookup(channel, path)
+
+    def fileno(self):
+
+        return self._bridge.fileno()
+
+    def get_nowait(self, timeout=None):
+
+        return self._bridge.get()
+
+    def stop(self):
+
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+class Publisher(object):
+
+    def __init__(self, channel, path):
+
+        self.name    = channel
+        self._bridge = _lookup(channel, path)
+
+    def put(self, topic, msg):
+
+        self._bridge.put(topic, msg)
+
+
+# ------------------------------------------------------------------------------
+#
+class Subscriber(object):
+    '''
+    Subscriber callbacks are invoked in a separate thread, under the lock
+    passed on subscription (if any).
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, channel, path, log):
+
+        self.name    = channel
+        self._log    = log
+        self._bridge = _lookup(channel, path)
+        self._q      = queue.SimpleQueue()
+        self._cbs    = dict()  # topic: [[cb, lock], ...]
+        self._term   = mt.Event()
+
+        self._thread = mt.Thread(target=self._run,
+                                 name='%s.sub' % channel)
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def subscribe(self, topic, cb, lock=None):
+
+        if topic not in self._cbs:
+            self._cbs[topic] = list()
+            self._bridge.subscribe(topic, self._q)
+
+        self._cbs[topic].append([cb, lock])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def stop(self):
+
+        self._bridge.unsubscribe(self._q)
+        self._term.set()
+        self._thread.join()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _run(self):
+
+        while not self._term.is_set():
+
+            try:
+                topic, msg = self._q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            for cb, lock in list(self._cbs.get(topic, [])):
+                try:
+                    if lock:
+                        with lock:
+                            cb(topic, msg)
+                    else:
+                        cb(topic, msg)
+                except Exception:
+                    self._log.exception('%s callback failed', self.name)
+
+
+# ------------------------------------------------------------------------------
+
@@ -169,6 +169,11 @@ class Update(rpu.Worker):
         For 'cmd' in ['state', 'state_flush'], only the 'uid' and 'state' fields
         of the given 'thing' are used, all other fields are ignored.  If 'state'
         does not exist, an exception is raised.
+
+        Things are usually published as deltas (see `Component.advance()`), so
+        the given fields are merged into the DB document.  Deltas from different
+        components may arrive out of order: the document's 'version' is only
+        ever increased.
         '''
 
         try:
@@ -213,9 +218,12 @@ class Update(rpu.Worker):
 
                 for key,val in thing.items():
                     # never set _id, states (to avoid index clash, doubled ops)
-                    if key not in ['_id', 'states']:
+                    if key not in ['_id', 'states', 'version']:
                         update_dict['$set'][key] = val
 
+                if 'version' in thing:
+                    update_dict['$max'] = {'version': thing['version']}
+
                 # we set state, put (more importantly) we push the state onto
                 # the 'states' list, so that we can later get state progression
                 # in sync with the state model, even if they have been pushed
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import time
+import zmq
+import pytest
+
+import threading     as mt
+import radical.utils as ru
+
+from radical.pilot.utils.component import Component, ComponentManager
+from radical.pilot.utils.component import _TimerWheel
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_component():
+
+    comp = Component.__new__(Component)
+    comp._log          = ru.Logger('dummy')
+    comp._prof         = mock.Mock()
+    comp._cb_lock      = ru.RLock('dummy')
+    comp._cancel_lock  = ru.RLock('dummy')
+    comp._cancel_list  = list()
+    comp._term         = mock.Mock()
+    comp._poller       = mock.Mock()
+    comp._poll_timeout = 100
+    comp._inputs       = dict()
+    comp._outputs      = dict()
+    comp._out_flows    = dict()
+    comp._flows        = dict()
+    comp._flow_cond    = mt.Condition()
+    comp._workers      = dict()
+    comp._timer        = None
+
+    return comp
+
+
+# ------------------------------------------------------------------------------
+#
+def test_work_cb():
+
+    comp = _get_component()
+
+    # no inputs: the work loop idles on the termination event
+    assert comp.work_cb()
+    comp._term.wait.assert_called_once_with(timeout=0.1)
+    comp._poller.poll.assert_not_called()
+
+    worked = list()
+    def worker(things):
+        worked.extend([t['uid'] for t in things])
+
+    q_1 = mock.Mock()
+    q_2 = mock.Mock()
+    comp._inputs  = {'in_1': {'queue': q_1, 'states': ['A']},
+                     'in_2': {'queue': q_2, 'states': ['B']}}
+    comp._workers = {'A': worker, 'B': worker}
+
+    # an empty first input must not prevent the second input to be served,
+    # and data readily available must not cause the loop to block
+    q_1.get_nowait.return_value = None
+    q_2.get_nowait.return_value = [{'uid': 'u.1', 'type': 'unit',
+                                    'state': 'B'}]
+    assert comp.work_cb()
+    assert worked == ['u.1']
+    comp._poller.poll.assert_not_called()
+
+    # no data anywhere: block on all inputs, then collect what arrived
+    worked = list()
+    q_1.get_nowait.side_effect = [None, {'uid': 'u.2', 'type': 'unit',
+                                         'state': 'A'}]
+    q_2.get_nowait.side_effect = [None, None]
+    assert comp.work_cb()
+    comp._poller.poll.assert_called_once_with(timeout=100)
+    assert worked == ['u.2']
+
+
+# ------------------------------------------------------------------------------
+#
+def test_timer_wheel():
+
+    calls = {'fast': 0, 'slow': 0, 'once': 0}
+
+    def fast():
+        calls['fast'] += 1
+        return True
+
+    def slow():
+        calls['slow'] += 1
+        return True
+
+    def once(cb_data):
+        calls['once'] += cb_data
+        return False
+
+    timer = _TimerWheel(name='test', log=ru.Logger('dummy'),
+                        cb_lock=ru.RLock('dummy'))
+    try:
+        assert timer.add('fast', fast, None, 0.05)
+        assert timer.add('slow', slow, None, 10.0)
+        assert timer.add('once', once, 2,    0.01)
+        assert not timer.add('fast', fast, None, 0.05)
+
+        time.sleep(0.3)
+
+        # all cbs are called immediately, `slow` only once, `once` unregisters
+        assert 4 <= calls['fast'] <= 8
+        assert calls['slow'] == 1
+        assert calls['once'] == 2
+        assert not timer.remove('once')
+
+        assert timer.remove('fast')
+        n_fast = calls['fast']
+        time.sleep(0.2)
+        assert calls['fast'] == n_fast
+
+    finally:
+        timer.stop()
+
+    assert not timer._thread.is_alive()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_timer_wheel_remove():
+
+    calls   = {'fast': 0, 'again': 0}
+    cb_lock = ru.RLock('dummy')
+
+    def fast():
+        calls['fast'] += 1
+        return True
+
+    # re-registers itself under the same name, and returns `False` for the
+    # old registration
+    def again():
+        calls['again'] += 1
+        if calls['again'] == 1:
+            timer.remove('again')
+            timer.add('again', again, None, 0.05)
+            return False
+        return True
+
+    timer = _TimerWheel(name='test', log=ru.Logger('dummy'), cb_lock=cb_lock)
+    try:
+        assert timer.add('fast',  fast,  None, 0.05)
+        assert timer.add('again', again, None, 0.05)
+        time.sleep(0.1)
+
+        # a callback which got due while it is unregistered (under the
+        # callback lock, see `Component.unregister_timed_cb()`) is not invoked
+        # anymore
+        with cb_lock:
+            time.sleep(0.2)
+            n_fast = calls['fast']
+            assert timer.remove('fast')
+
+        time.sleep(0.2)
+        assert calls['fast'] == n_fast
+
+        # the new registration survived
+        assert calls['again'] >= 3
+        assert timer.remove('again')
+
+    finally:
+        timer.stop()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_spawn():
+
+    cmgr = ComponentManager.__new__(ComponentManager)
+    cmgr._cfg  = ru.Config(cfg={'startup_workers': 2})
+    cmgr._log  = ru.Logger('dummy')
+    cmgr._prof = mock.Mock()
+    cmgr._uids = ['cmgr']
+
+    lock    = mt.Lock()
+    running = [0, 0]  # current, max
+
+    def callout(cmd):
+        with lock:
+            running[0] += 1
+            running[1]  = max(running)
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+        return '', '', int('fail' in cmd)
+
+    fnames = dict([('c.%d' % i, '/tmp/c.%d.json' % i) for i in range(4)])
+
+    # startups run concurrently, bounded by `startup_workers`
+    with mock.patch.object(ru, 'sh_callout', side_effect=callout):
+        start = time.time()
+        cmgr._spawn('component', fnames)
+        assert time.time() - start < 0.35
+
+    assert running[1] == 2
+    assert cmgr._uids == ['cmgr'] + list(fnames)
+    assert cmgr._prof.prof.call_count == 8
+
+    # any failed startup is reported
+    with mock.patch.object(ru, 'sh_callout', side_effect=callout):
+        with pytest.raises(RuntimeError):
+            cmgr._spawn('bridge', {'b.0': 'b.0.json', 'b.1': 'fail.json'})
+
+
+# ------------------------------------------------------------------------------
+#
+def test_inproc(tmpdir):
+
+    path = str(tmpdir)
+
+    cmgr = ComponentManager.__new__(ComponentManager)
+    cmgr._log             = ru.Logger('dummy')
+    cmgr._prof            = mock.Mock()
+    cmgr._inproc_bridges  = list()
+
+    for name, kind in [['q', 'queue'], ['ps', 'pubsub']]:
+        cmgr._start_inproc_bridge(ru.Config(cfg={'uid'    : name,
+                                                  'channel': name,
+                                                  'kind'   : kind,
+                                                  'path'   : path}))
+    assert ru.read_json('%s/q.cfg' % path) == {'uid': 'q', 'inproc': True}
+
+    comp = _get_component()
+    comp._uid         = 'comp'
+    comp._cfg         = ru.Config(cfg={'path': path})
+    comp._poller      = zmq.Poller()
+    comp._publishers  = dict()
+    comp._subscribers = dict()
+    comp._pub_lock    = mt.Lock()
+
+    try:
+        # things pushed to an in-process queue wake up the work loop
+        worked = list()
+        def worker(things):
+            worked.extend(things)
+
+        comp.register_output('A', 'q')
+        comp.register_input('A', 'q', worker)
+
+        things = [{'uid': 'u.%d' % i, 'type': 'unit', 'state': 'A'}
+                  for i in range(3)]
+        comp.advance(things, publish=False, push=True)
+        assert comp.work_cb()
+        assert worked == things
+        assert worked[0] is things[0]
+
+        # in-process pubsub messages are copied, and delivered in a thread
+        got = list()
+        done = mt.Event()
+        def cb(topic, msg):
+            got.append([topic, msg])
+            done.set()
+
+        comp.register_publisher('ps')
+        comp.register_subscriber('ps', cb)
+
+        msg = {'cmd': 'foo'}
+        comp.publish('ps', msg)
+        assert done.wait(timeout=5)
+        assert got == [['ps', msg]]
+        assert got[0][1] is not msg
+
+    finally:
+        comp._subscribers['ps'].stop()
+        for bridge in cmgr._inproc_bridges:
+            bridge.stop()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_advance_delta():
+
+    comp = _get_component()
+    comp._uid         = 'comp'
+    comp._publishers  = {'state_pubsub': mock.Mock()}
+    comp._pub_lock    = mt.Lock()
+
+    def published():
+        args = comp._publishers['state_pubsub'].put.call_args[0]
+        return args[1]['arg']
+
+    unit = {'uid'        : 'unit.0',
+            'type'       : 'unit',
+            'state'      : 'NEW',
+            'description': {'executable': '/bin/date'},
+            'slots'      : None}
+
+    # the first publication only carries the state (and `$set` keys)
+    unit['$set'] = ['slots']
+    comp.advance(unit, 'A', publish=True, push=False)
+    assert published() == [{'uid': 'unit.0', 'type': 'unit', 'state': 'A',
+                            'slots': None, 'version': 1}]
+    del(unit['$set'])
+
+    # later publications carry all changed values, including nested changes
+    unit['slots'] = {'nodes': []}
+    unit['description']['arguments'] = ['-u']
+    unit['stdout'] = 'foo'
+    comp.advance(unit, 'B', publish=True, push=False)
+    assert published() == [{'uid'        : 'unit.0',
+                            'type'       : 'unit',
+                            'state'      : 'B',
+                            'slots'      : {'nodes': []},
+                            'description': {'executable': '/bin/date',
+                                            'arguments' : ['-u']},
+                            'stdout'     : 'foo',
+                            'version'    : 2}]
+
+    comp.advance(unit, 'C', publish=True, push=False)
+    assert published() == [{'uid': 'unit.0', 'type': 'unit', 'state': 'C',
+                            'version': 3}]
+
+    # `$all` and final states publish all values, but never tracking data
+    unit['$all'] = True
+    comp.advance(unit, 'D', publish=True, push=False)
+    assert '$all' not in unit
+    assert '$pub' in unit
+    assert published() == [dict([(k, v) for k, v in unit.items()
+                                        if  k != '$pub'])]
+    assert published()[0]['version'] == 4
+
+    comp.advance(unit, 'DONE', publish=True, push=False)
+    assert published()[0]['stdout']  == 'foo'
+    assert published()[0]['version'] == 5
+
+
+# ------------------------------------------------------------------------------
+#
+def test_flow(tmpdir):
+
+    path = str(tmpdir)
+
+    cmgr = ComponentManager.__new__(ComponentManager)
+    cmgr._log             = ru.Logger('dummy')
+    cmgr._prof            = mock.Mock()
+    cmgr._inproc_bridges  = list()
+
+    cmgr._start_inproc_bridge(ru.Config(cfg={'uid'     : 'q',
+                                             'channel' : 'q',
+                                             'kind'    : 'queue',
+                                             'path'    : path,
+                                             'flow_hwm': 4,
+                                             'flow_lwm': 2}))
+    cmgr._start_inproc_bridge(ru.Config(cfg={'uid'     : 'flow_pubsub',
+                                             'channel' : 'flow_pubsub',
+                                             'kind'    : 'pubsub',
+                                             'path'    : path}))
+
+    comps = list()
+    for uid in ['producer', 'consumer']:
+        comp = _get_component()
+        comp._uid         = uid
+        comp._cfg         = ru.Config(cfg={'path': path})
+        comp._term        = mt.Event()
+        comp._poller      = zmq.Poller()
+        comp._publishers  = dict()
+        comp._subscribers = dict()
+        comp._pub_lock    = mt.Lock()
+        comps.append(comp)
+
+    producer, consumer = comps
+
+    try:
+        worked = list()
+        def worker(things):
+            worked.extend(things)
+
+        producer.register_output('A', 'q')
+        consumer.register_input('A', 'q', worker)
+
+        # the producer can fill the queue up to the high watermark...
+        things = [{'uid': 'u.%d' % i, 'type': 'unit', 'state': 'A'}
+                  for i in range(6)]
+        producer.advance(things[:3], publish=False, push=True)
+        assert producer._flows['q']['put'] == 3
+        assert producer._output_credit('A') == 1
+        assert producer._output_credit('B') is None
+
+        # ... and is then throttled until the consumer drained the queue.
+        # Larger bulks are pushed in chunks, and don't exceed the watermark.
+        pusher = mt.Thread(target=producer.advance, args=[things[3:]],
+                           kwargs={'publish': False, 'push': True})
+        pusher.daemon = True
+        pusher.start()
+
+        time.sleep(0.2)
+        assert pusher.is_alive()
+        assert producer._flows['q']['put'] == 4
+        assert producer._output_credit('A') == 0
+        producer._prof.prof.assert_called_with('flow_throttle',
+                                               uid='producer', msg='q')
+
+        while len(worked) < 4:
+            assert consumer.work_cb()
+        assert [t['uid'] for t in worked] == ['u.0', 'u.1', 'u.2', 'u.3']
+
+        pusher.join(timeout=5)
+        assert not pusher.is_alive()
+        producer._prof.prof.assert_any_call('flow_release',
+                                            uid='producer', msg='q')
+
+        while len(worked) < 6:
+            assert consumer.work_cb()
+        assert [t['uid'] for t in worked] == ['u.%d' % i for i in range(6)]
+
+        # timed callbacks are never blocked
+        producer.advance(things[:4], publish=False, push=True)
+        assert producer._output_credit('A') == 0
+
+        producer._timer = mock.Mock()
+        producer._timer.is_current.return_value = True
+        producer.advance(things[4:], publish=False, push=True)
+        assert producer._flows['q']['put'] == 12
+
+    finally:
+        producer._subscribers['flow_pubsub'].stop()
+        for bridge in cmgr._inproc_bridges:
+            bridge.stop()
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    test_work_cb()
+    test_timer_wheel()
+    test_timer_wheel_remove()
+    test_spawn()
+    test_inproc('/tmp')
+    test_advance_delta()
+    test_flow('/tmp')
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+from radical.pilot.agent.scheduler import benchmark as rpsb
+
+from .test_common import get_unit, get_scheduler, submit, release
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_scheduler(path):
+
+    sched = get_scheduler(path, 'CONTINUOUS_BACKFILL')
+    clock = [0.0]
+
+    sched._clock = lambda: clock[0]
+
+    return sched, clock
+
+
+# ------------------------------------------------------------------------------
+#
+def test_backfill(tmpdir):
+
+    sched, clock = _get_scheduler(str(tmpdir))
+    placed       = sched._placed
+
+    a = get_unit('unit.a', 2, runtime=100)
+    h = get_unit('unit.h', 4, runtime=10)
+    b = get_unit('unit.b', 1, runtime=50)
+    c = get_unit('unit.c', 1, runtime=200)
+    d = get_unit('unit.d', 1)
+
+    submit(sched, [a])
+    submit(sched, [h])
+
+    # `h` waits for `a` to finish at t=100
+    assert placed == [a]
+    assert sched._get_shadow() == ['unit.h', 100]
+
+    # `b` completes before `h` can start, `c` would delay `h`, `d` could
+    submit(sched, [b, c, d])
+
+    assert placed == [a, b]
+    assert list(sched._waitpool) == ['unit.h', 'unit.c', 'unit.d']
+
+    # the early release of `b` does not allow `h` to start
+    clock[0] = 50
+    release(sched, [b])
+
+    assert placed == [a, b]
+    assert sched._get_shadow() == ['unit.h', 100]
+
+    # `h` starts once `a` completes, and the reservation moves on to `c`
+    clock[0] = 100
+    release(sched, [a])
+
+    assert placed == [a, b, h]
+    assert sched._get_shadow() == ['unit.c', 110]
+
+    clock[0] = 110
+    release(sched, [h])
+
+    assert placed == [a, b, h, c, d]
+    assert not sched._waitpool
+    assert sched._get_shadow() is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_backfill_unknown(tmpdir):
+
+    sched, _ = _get_scheduler(str(tmpdir))
+    placed   = sched._placed
+
+    a = get_unit('unit.a', 2)
+    h = get_unit('unit.h', 4, runtime=10)
+    b = get_unit('unit.b', 1)
+
+    # without an estimate for `a`, no reservation can be made for `h`
+    submit(sched, [a])
+    submit(sched, [h])
+    submit(sched, [b])
+
+    assert placed == [a, b]
+    assert sched._get_shadow() == ['unit.h', None]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_backfill_shape(tmpdir):
+
+    sched, clock = _get_scheduler(str(tmpdir))
+    placed       = sched._placed
+
+    a = get_unit('unit.a', 2, runtime=100)
+    x = get_unit('unit.x', 2, runtime=20)
+    h = get_unit('unit.h', 4, runtime=10)
+    c = get_unit('unit.c', 1, runtime=200)
+    b = get_unit('unit.b', 1, runtime=50)
+
+    submit(sched, [a, x])
+    submit(sched, [h])
+    submit(sched, [c, b])
+
+    assert placed == [a, x]
+    assert sched._get_shadow() == ['unit.h', 100]
+    assert list(sched._waitpool) == ['unit.h', 'unit.c', 'unit.b']
+
+    # `c` would delay `h`, but does not keep `b` of the same shape from being
+    # backfilled
+    clock[0] = 20
+    release(sched, [x])
+
+    assert placed == [a, x, b]
+    assert list(sched._waitpool) == ['unit.h', 'unit.c']
+
+
+# ------------------------------------------------------------------------------
+#
+def test_backfill_benchmark(tmpdir):
+
+    workload = rpsb.create_workload(60, shapes=[{'cpu_processes': 1}] * 5 +
+                                               [{'cpu_processes'   : 8,
+                                                 'cpu_process_type': 'MPI'}],
+                                    rate=1.0, hint=True)
+
+    sched  = get_scheduler(str(tmpdir), 'CONTINUOUS_BACKFILL', nodes=2)
+    result = rpsb.run(sched, workload)
+
+    assert result['placed']     == 60
+    assert result['released']   == 60
+    assert result['util_cores'] <= 1.0
+    assert not sched._running
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_backfill(tempfile.mkdtemp())
+    test_backfill_unknown(tempfile.mkdtemp())
+    test_backfill_shape(tempfile.mkdtemp())
+    test_backfill_benchmark(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import pytest
+
+from radical.pilot.agent.scheduler import benchmark as rpsb
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('name', rpsb.SCHEDULERS)
+def test_benchmark(name, tmpdir):
+
+    rm_info  = rpsb.create_rm_info(nodes=2, cores=4, gpus=1)
+    workload = rpsb.create_workload(32, shapes=[{'cpu_processes': 2}],
+                                    runtime=10.0, bag=2)
+
+    sched  = rpsb.create_scheduler(name, rm_info, path=str(tmpdir))
+    result = rpsb.run(sched, workload)
+
+    assert result['units']    == 32
+    assert result['placed']   == 32
+    assert result['released'] == 32
+    assert result['wait_p50'] <= result['wait_p90'] <= result['wait_p99'] \
+                              <= result['wait_max']
+
+    if name == 'NOOP':
+        # everything is placed right away, no resources are tracked
+        assert result['wait_max']   == 0.0
+        assert result['util_cores'] is None
+        assert result['util_gpus']  is None
+        assert not result['util']
+
+    elif name == 'CONTINUOUS_ORDERED':
+        # bags of 2 units run one after the other
+        assert result['wait_max']   >= 15 * 5.0
+        assert max([u[1] for u in result['util']]) == 0.5
+
+    else:
+        # 4 units run concurrently, so the last ones wait for 7 generations
+        assert result['wait_max']   >= 7 * 5.0
+        assert result['util_cores'] <= 1.0
+        assert result['util_gpus']  == 0.0
+        assert max([u[1] for u in result['util']]) == 1.0
+
+
+# ------------------------------------------------------------------------------
+#
+def test_workload():
+
+    workload = rpsb.create_workload(4, shapes=[{'cpu_processes': 1},
+                                               {'cpu_processes': 2}],
+                                    runtime=10.0, rate=2.0)
+
+    assert [w['submit'] for w in workload] == [0.0, 0.5, 1.0, 1.5]
+    assert [w['description']['cpu_processes'] for w in workload] == [1, 2, 1, 2]
+    for w in workload:
+        assert 5.0 <= w['runtime'] <= 15.0
+        assert 'tags' not in w['description']
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    for n in rpsb.SCHEDULERS:
+        test_benchmark(n, tempfile.mkdtemp())
+    test_workload()
+
+
+# ------------------------------------------------------------------------------
+
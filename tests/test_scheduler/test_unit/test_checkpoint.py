@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import pytest
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from radical.pilot.agent.scheduler import checkpoint as rpsc
+
+from .test_common import get_units, get_scheduler, submit
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_scheduler(path, name='CONTINUOUS'):
+
+    return get_scheduler(path, name, nodes=2,
+                         cfg={'sched_checkpoint': 10.0})
+
+
+# ------------------------------------------------------------------------------
+#
+def test_checkpoint_file(tmpdir):
+
+    path = '%s/test.ckpt' % tmpdir
+    ckpt = rpsc.Checkpoint(path)
+
+    assert ckpt.read() is None
+
+    ckpt.write({'n': 1})
+    ckpt.write({'n': 2})
+    assert ckpt.read() == {'n': 2}
+
+    # a partially written checkpoint is ignored
+    ckpt._mmap[rpsc._BODY] ^= 0xff
+    assert ckpt.read() == {'n': 1}
+
+    # the file grows as needed, and continues the sequence when reopened
+    ckpt.write({'n': 3, 'data': 'x' * 2 * rpsc._MIN_CAPACITY})
+    ckpt.close()
+
+    ckpt = rpsc.Checkpoint(path)
+    assert ckpt.read()['n'] == 3
+
+    ckpt.write({'n': 4})
+    assert ckpt.read() == {'n': 4}
+
+    # growing the file keeps the previous checkpoint until the new file is
+    # complete
+    with mock.patch.object(rpsc.os, 'rename', side_effect=OSError('crash')):
+        with pytest.raises(OSError):
+            ckpt.write({'n': 5, 'data': 'x' * 8 * rpsc._MIN_CAPACITY})
+
+    assert rpsc.Checkpoint(path).read() == {'n': 4}
+    assert rpsc.Checkpoint(path + '.tmp').read()['n'] == 5
+
+
+# ------------------------------------------------------------------------------
+#
+def test_checkpoint_restart(tmpdir):
+
+    sched = _get_scheduler(str(tmpdir))
+    units = get_units(5, 4)
+
+    submit(sched, units)
+
+    assert len(sched._placed)   == 2
+    assert len(sched._waitpool) == 3
+
+    sched._ckpt_dirty = True
+    sched._checkpoint()
+
+    # a restarted scheduler finds all nodes busy and the same waiting units
+    sched = _get_scheduler(str(tmpdir))
+
+    assert sched._recovering
+    assert sched._total_free_cores == 0
+    assert sorted(sched._waitpool) == sorted([u['uid'] for u in units[2:]])
+
+    # only the first unit is still alive, the second one completed
+    live = [{'uid': units[0]['uid'], 'slots': units[0]['slots']}]
+    sched.recover_cb(None, {'cmd': 'sched_live', 'arg': {'units': live}})
+    sched._recover_stop = 0.0
+    sched._recover()
+
+    assert not sched._recovering
+    assert sched._total_free_cores == 4
+    assert list(sched._ckpt_units) == [units[0]['uid']]
+
+    sched._schedule_waitpool()
+    assert [u['uid'] for u in sched._placed] == [units[2]['uid']]
+
+    # a late unschedule request for the completed unit is ignored
+    sched._queue_unsched.put(units[1])
+    assert sched._unschedule_completed() == (False, False)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_checkpoint_no_report(tmpdir):
+
+    sched = _get_scheduler(str(tmpdir))
+    submit(sched, get_units(1, 4))
+
+    sched._ckpt_dirty = True
+    sched._checkpoint()
+
+    # without any executor report, the checkpointed units are kept
+    sched = _get_scheduler(str(tmpdir))
+    sched._recover_stop = 0.0
+    sched._recover()
+
+    assert not sched._recovering
+    assert sched._total_free_cores == 4
+
+    with pytest.raises(ValueError):
+        _get_scheduler(str(tmpdir), 'CONTINUOUS_COLO')
+
+    with pytest.raises(ValueError):
+        _get_scheduler(str(tmpdir), 'CONTINUOUS_DAG')
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_checkpoint_file(tempfile.mkdtemp())
+    test_checkpoint_restart(tempfile.mkdtemp())
+    test_checkpoint_no_report(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
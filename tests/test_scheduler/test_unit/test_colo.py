@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+from radical.pilot.agent.scheduler import benchmark as rpsb
+
+from .test_common import get_unit, get_units, get_scheduler
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_unit(uid, bag, size, cores):
+
+    return get_unit(uid, 1, cpu_threads=cores,
+                    tags={'colocate': {'bag': bag, 'size': size}})
+
+
+# ------------------------------------------------------------------------------
+#
+def test_colo(tmpdir):
+
+    sched   = get_scheduler(str(tmpdir), 'CONTINUOUS_COLO')
+    placed  = sched._placed
+    tried   = list()
+    try_bag = sched._try_schedule_bag
+
+    def _try_schedule_bag(bag):
+        tried.append(bag)
+        return try_bag(bag)
+
+    sched._try_schedule_bag = _try_schedule_bag
+
+    a1 = _get_unit('unit.a1', 'a', 2, 2)
+    a2 = _get_unit('unit.a2', 'a', 2, 2)
+    b1 = _get_unit('unit.b1', 'b', 2, 1)
+    b2 = _get_unit('unit.b2', 'b', 2, 1)
+    c1 = _get_unit('unit.c1', 'c', 1, 2)
+    d1 = _get_unit('unit.d1', 'd', 1, 4)
+
+    # incomplete bags are not considered
+    sched._schedule_units([a1, b1])
+    assert not placed
+    assert not sched._ready
+    assert not tried
+
+    sched._schedule_units([b2])
+    assert placed == [b1, b2]
+    assert tried  == ['b']
+    assert b1['slots']['nodes'][0]['core_map'] == [[0]]
+    assert b2['slots']['nodes'][0]['core_map'] == [[1]]
+
+    # `a` does not fit anymore, `c` does
+    sched._schedule_units([a2, c1])
+    assert placed == [b1, b2, c1]
+    assert list(sched._ready) == ['a']
+
+    # `d` needs more than `a`, and is not tried while `a` waits
+    del tried[:]
+    sched._schedule_units([d1])
+    assert tried == ['a']
+    assert list(sched._ready) == ['a', 'd']
+
+    # bags are placed in the order they became ready
+    for unit in [b1, b2, c1]:
+        sched.unschedule_unit(unit)
+    sched.schedule_cb(None, None)
+
+    assert placed == [b1, b2, c1, a1, a2]
+    assert list(sched._ready) == ['d']
+    assert sched._bags['d']['needs'] == (4, 0, 0, 0)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_colo_unordered(tmpdir):
+
+    sched   = get_scheduler(str(tmpdir), 'CONTINUOUS_COLO')
+    placed  = sched._placed
+    units   = get_units(6)
+
+    a1 = _get_unit('unit.a1', 'a', 2, 1)
+    a2 = _get_unit('unit.a2', 'a', 2, 1)
+
+    # units which are not colocated wait in the waitpool
+    sched._schedule_units(units + [a1, a2])
+    assert placed == units[:4]
+    assert list(sched._waitpool) == [u['uid'] for u in units[4:]]
+    assert sched._bags['a']['pseudo']['tuple_size'] == (1, 2, 0, 'POSIX', 0, 0)
+
+    # and are placed before the bags
+    for unit in units[:3]:
+        sched.unschedule_unit(unit)
+    sched.schedule_cb(None, None)
+
+    assert placed == units
+    assert not sched._waitpool
+    assert list(sched._ready) == ['a']
+
+
+# ------------------------------------------------------------------------------
+#
+def test_colo_tag(tmpdir):
+
+    sched = get_scheduler(str(tmpdir), 'CONTINUOUS_COLO', nodes=2)
+
+    a1 = _get_unit('unit.a1', 'a', 2, 1)
+    a2 = _get_unit('unit.a2', 'a', 2, 1)
+    a1['description']['tag'] = 'foo'
+    a2['description']['tag'] = 'foo'
+
+    # the tag is held by the bag's units, not by its pseudo-unit
+    sched._schedule_units([a1, a2])
+    assert sched._placed    == [a1, a2]
+    assert sched._tag_units == {'unit.a1': 'foo', 'unit.a2': 'foo'}
+    assert sched._tag_live  == {'foo': 2}
+
+    sched._handle_completed([a1])
+    assert sched._tag_live  == {'foo': 1}
+
+    sched._handle_completed([a2])
+    assert not sched._tag_units
+    assert not sched._tag_live
+    assert list(sched._tag_idle) == ['foo']
+
+
+# ------------------------------------------------------------------------------
+#
+def test_colo_group(tmpdir):
+
+    sched   = get_scheduler(str(tmpdir), 'CONTINUOUS_COLO')
+    driver  = rpsb._DriverBags(sched)
+
+    a1 = _get_unit('unit.a1', 'a', 2, 1)
+    a2 = _get_unit('unit.a2', 'a', 2, 2)
+    a1['description']['tags']['group'] = 'x'
+    a2['description']['tags']['group'] = 'y'
+
+    # shares are accounted for the bag's units, in their own groups
+    driver.submit([a1, a2])
+    assert sched._placed == [a1, a2]
+    assert sched._shares == {'x': 1, 'y': 2}
+
+    driver.release([a1, a2])
+    assert sched._shares == {'x': 0, 'y': 0}
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_colo(tempfile.mkdtemp())
+    test_colo_unordered(tempfile.mkdtemp())
+    test_colo_tag(tempfile.mkdtemp())
+    test_colo_group(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
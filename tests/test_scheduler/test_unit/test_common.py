@@ -0,0 +1,59 @@
+
+# pylint: disable=protected-access, unused-argument
+
+import radical.pilot as rp
+
+from radical.pilot.agent.scheduler import benchmark as rpsb
+
+
+# ------------------------------------------------------------------------------
+#
+def get_unit(uid, cores=1, **descr):
+    '''
+    Create a unit with `cores` single threaded processes.  Other description
+    attributes can be passed as keyword arguments.
+    '''
+
+    descr['cpu_processes'] = cores
+
+    return {'uid'        : uid,
+            'description': rp.ComputeUnitDescription(descr).as_dict()}
+
+
+# ------------------------------------------------------------------------------
+#
+def get_units(n, cores=1, **descr):
+
+    return [get_unit('unit.%06d' % idx, cores, **descr) for idx in range(n)]
+
+
+# ------------------------------------------------------------------------------
+#
+def get_scheduler(path, name='CONTINUOUS', nodes=1, cores=4, gpus=0,
+                  cfg=None):
+
+    rm_info = rpsb.create_rm_info(nodes=nodes, cores=cores, gpus=gpus)
+    return rpsb.create_scheduler(name, rm_info, path=path, cfg=cfg)
+
+
+# ------------------------------------------------------------------------------
+#
+def submit(sched, units):
+
+    sched._queue_sched.put(units)
+    sched._schedule_incoming()
+
+
+# ------------------------------------------------------------------------------
+#
+def release(sched, units):
+
+    for unit in units:
+        sched._queue_unsched.put(unit)
+
+    sched._unschedule_completed()
+    sched._schedule_waitpool()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import queue
+import pytest
+import tempfile
+
+import radical.utils as ru
+
+from radical.pilot                            import constants as rpc
+from radical.pilot.agent.scheduler.base       import np
+from radical.pilot.agent.scheduler.continuous import Continuous
+
+from .test_common import get_scheduler
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_scheduler(n_nodes=4, cores=8, gpus=2, node_store='list',
+                   policy='size'):
+
+    with mock.patch.object(Continuous, '__init__', return_value=None):
+        sched = Continuous(cfg=None, session=None)
+
+    sched._log               = ru.Logger('dummy')
+    sched._prof              = mock.Mock()
+    sched._cfg               = ru.Config(cfg={'task_launch_method': 'FORK',
+                                              'rm_info': {'lm_info': {}}})
+    sched._tag_history       = dict()
+    sched._scattered         = None
+    sched._node_offset       = 0
+    sched._rm_info           = {}
+    sched._rm_lm_info        = {}
+    sched._rm_node_list      = [['node_%d' % i, 'uid_%d' % i]
+                                for i in range(n_nodes)]
+    sched._rm_cores_per_node = cores
+    sched._rm_gpus_per_node  = gpus
+    sched._rm_lfs_per_node   = {'path': None, 'size': 0}
+    sched._rm_mem_per_node   = 0
+
+    sched._node_store        = node_store
+    sched._policy            = policy
+    sched._util              = None
+    sched._util_ts           = 0.0
+    sched._ckpt              = None
+    sched._waitprio          = dict()
+    sched._shares            = dict()
+    sched._reserved          = None
+    sched._prio_min          = None
+
+    sched._configure()
+    sched._index_nodes()
+
+    if node_store == 'numpy':
+        sched._vectorize_nodes()
+
+    return sched
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_unit(uid, procs=1, threads=1, gpus=0, ptype='POSIX'):
+
+    return {'uid'        : uid,
+            'description': {'cpu_processes'   : procs,
+                            'cpu_threads'     : threads,
+                            'cpu_process_type': ptype,
+                            'gpu_processes'   : gpus,
+                            'lfs_per_process' : 0,
+                            'mem_per_process' : 0,
+                            'environment'     : {}}}
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('node_store', ['list', pytest.param('numpy',
+                         marks=pytest.mark.skipif(np is None,
+                                                  reason='needs numpy'))])
+def test_change_slot_states(node_store):
+
+    sched = _get_scheduler(node_store=node_store)
+
+    assert sorted(sched._node_index.keys()) == ['uid_0', 'uid_1',
+                                                'uid_2', 'uid_3']
+    for node in sched.nodes:
+        assert sched._node_index[node['uid']] is node
+
+    # a 12-core MPI task spans two nodes
+    unit  = _get_unit('unit.0', procs=12, ptype='MPI')
+    slots = sched.schedule_unit(unit)
+    assert [n['uid'] for n in slots['nodes']] == ['uid_0'] * 8 + ['uid_1'] * 4
+
+    sched._change_slot_states(slots, rpc.BUSY)
+    assert list(sched.nodes[0]['cores']) == [rpc.BUSY] * 8
+    assert list(sched.nodes[1]['cores']) == [rpc.BUSY] * 4 + [rpc.FREE] * 4
+    assert list(sched.nodes[2]['cores']) == [rpc.FREE] * 8
+
+    # a 2-process unit with 1 GPU each lands on the partially used node
+    unit   = _get_unit('unit.1', procs=2, threads=2, gpus=1)
+    slots2 = sched.schedule_unit(unit)
+    assert slots2['nodes'][0]['uid']      == 'uid_1'
+    assert slots2['nodes'][0]['core_map'] == [[4, 5]]
+    assert slots2['nodes'][1]['core_map'] == [[6, 7]]
+    assert slots2['nodes'][0]['gpu_map']  == [[0]]
+    assert slots2['nodes'][1]['gpu_map']  == [[1]]
+
+    sched._change_slot_states(slots2, rpc.BUSY)
+    sched._log = mock.Mock()
+    assert sched.slot_status() == '|########:--|########:##|' \
+                                  '--------:--|--------:--|'
+
+    if node_store == 'numpy':
+        assert list(sched._free_cores) == [0, 0, 8, 8]
+        assert list(sched._free_gpus)  == [2, 0, 2, 2]
+
+    sched._change_slot_states(slots,  rpc.FREE)
+    sched._change_slot_states(slots2, rpc.FREE)
+    for node in sched.nodes:
+        assert list(node['cores']) == [rpc.FREE] * 8
+
+    # slots on unknown nodes are rejected
+    slots['nodes'][0]['uid'] = 'uid_x'
+    try:
+        sched._change_slot_states(slots, rpc.BUSY)
+        assert False, 'expected RuntimeError'
+    except RuntimeError:
+        pass
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('node_store', ['list', pytest.param('numpy',
+                         marks=pytest.mark.skipif(np is None,
+                                                  reason='needs numpy'))])
+def test_capacity_index(node_store):
+
+    sched = _get_scheduler(n_nodes=3, cores=4, gpus=1, node_store=node_store)
+
+    assert sched._total_free_cores == 12
+    assert sched._total_free_gpus  == 3
+    assert sched._cap_cores[4]     == {0, 1, 2}
+    assert sched._has_capacity(4, 1)
+    assert not sched._has_capacity(5, 0)
+    assert not sched._has_capacity(1, 0, total_cores=13)
+
+    # occupy 3 cores on node 0 and 2 cores + GPU on node 1
+    slots_0 = sched.schedule_unit(_get_unit('unit.0', procs=3))
+    sched._change_slot_states(slots_0, rpc.BUSY)
+    slots_1 = sched.schedule_unit(_get_unit('unit.1', threads=2, gpus=1))
+    sched._change_slot_states(slots_1, rpc.BUSY)
+
+    assert slots_0['nodes'][0]['uid'] == 'uid_0'
+    assert slots_1['nodes'][0]['uid'] == 'uid_1'
+    assert sched._cap_cores[1]        == {0}
+    assert sched._cap_cores[2]        == {1}
+    assert sched._cap_gpus[0]         == {1}
+    assert sched._total_free_cores    == 7
+
+    # best fit: a single core goes to the fullest node, two cores to node 1
+    # (node 0 has only one core left)
+    nodes = [n['uid'] for n in sched._iterate_capacity(1, 0)]
+    assert nodes == ['uid_0', 'uid_1', 'uid_2']
+    assert sched.schedule_unit(_get_unit('unit.2', procs=2)) \
+                ['nodes'][0]['uid'] == 'uid_1'
+
+    # GPUs are scarcer than cores: only nodes with free GPUs are considered
+    nodes = [n['uid'] for n in sched._iterate_capacity(1, 1)]
+    assert nodes == ['uid_0', 'uid_2']
+
+    # a non-mpi unit needing a full node only fits on node 2
+    slots_2 = sched.schedule_unit(_get_unit('unit.3', procs=4))
+    assert slots_2['nodes'][0]['uid'] == 'uid_2'
+    sched._change_slot_states(slots_2, rpc.BUSY)
+
+    # nothing fits anymore for that shape - this is decided without search
+    sched._iterate_capacity = mock.Mock()
+    sched._iterate_nodes    = mock.Mock()
+    assert sched.schedule_unit(_get_unit('unit.4', procs=4)) is None
+    assert sched.schedule_unit(_get_unit('unit.5', procs=4, ptype='MPI')) \
+                is None
+    sched._iterate_capacity.assert_not_called()
+    sched._iterate_nodes.assert_not_called()
+
+    # freeing resources restores the index
+    for slots in [slots_0, slots_1, slots_2]:
+        sched._change_slot_states(slots, rpc.FREE)
+    assert sched._cap_cores[4]     == {0, 1, 2}
+    assert sched._total_free_cores == 12
+    assert sched._total_free_gpus  == 3
+
+
+# ------------------------------------------------------------------------------
+#
+def test_slot_recycling():
+
+    sched = _get_scheduler(n_nodes=1, cores=2, gpus=0)
+    sched._recycle       = True
+    sched._waitpool      = dict()
+    sched._waitbins      = dict()
+    sched._queue_unsched = queue.Queue()
+    sched._proc_term     = mock.Mock()
+    sched._proc_term.is_set.return_value = False
+    sched.advance        = mock.Mock()
+
+    units = [_get_unit('unit.%d' % i) for i in range(5)]
+    units[3]['description']['cpu_processes'] = 2
+    units[4]['description']['tag']           = 'foo'
+    for unit in units:
+        sched._set_tuple_size(unit)
+
+    assert sched._try_allocation(units[0])
+    assert sched._try_allocation(units[1])
+    assert not sched._has_capacity(1, 0)
+
+    sched._waitpool_add(units[2:])
+
+    # `tuple_size` arrives as list via the unschedule pubsub
+    for unit in units[:2]:
+        unit['tuple_size'] = list(unit['tuple_size'])
+        sched._queue_unsched.put(unit)
+
+    # unit.2 gets the slots of unit.0, the tagged unit.4 is not eligible, so
+    # the slots of unit.1 are released
+    assert sched._unschedule_completed() == (True, True)
+    assert sorted(sched._waitpool.keys()) == ['unit.3', 'unit.4']
+    assert list(sched._waitbins[(1, 1, 0, 'POSIX', 0, 0)]) == ['unit.4']
+    assert units[2]['slots'] == units[0]['slots']
+    assert sched._free_cores[0] == 1
+
+    sched.advance.assert_called_once_with([units[2]], 'AGENT_EXECUTING_PENDING',
+                                          publish=True, push=True)
+    calls = [c for c in sched._prof.prof.call_args_list
+                     if c[0][0] in ['unschedule_stop', 'schedule_fast']]
+    assert [(c[0][0], c[1]['uid']) for c in calls] == \
+           [('unschedule_stop', 'unit.0'), ('schedule_fast', 'unit.2'),
+            ('unschedule_stop', 'unit.1')]
+    assert calls[0][1]['ts'] == calls[1][1]['ts']
+
+    # without an untagged waiting unit of the same shape, slots are released
+    sched._queue_unsched.put(units[2])
+    assert sched._unschedule_completed() == (True, True)
+    assert sched._free_cores[0] == 2
+    assert sched.advance.call_count == 1
+
+
+# ------------------------------------------------------------------------------
+#
+def test_waitpool():
+
+    sched = _get_scheduler(n_nodes=1, cores=4, gpus=0)
+    sched._waitpool = dict()
+    sched._waitbins = dict()
+    sched.advance   = mock.Mock()
+
+    busy = _get_unit('busy', procs=3)
+    sched._set_tuple_size(busy)
+    assert sched._try_allocation(busy)
+
+    units = [_get_unit('a.%d' % i, procs=2) for i in range(3)] + \
+            [_get_unit('b.%d' % i, procs=1) for i in range(2)]
+    for unit in units:
+        sched._set_tuple_size(unit)
+    sched._waitpool_add(units)
+    assert len(sched._waitbins) == 2
+
+    tried = list()
+    try_allocation = sched._try_allocation
+
+    def _try(unit):
+        tried.append(unit['uid'])
+        return try_allocation(unit)
+
+    sched._try_allocation = _try
+
+    # the bin of 2-core tasks is skipped without trying any of its tasks, the
+    # bin of 1-core tasks is tried until a task does not fit
+    assert sched._schedule_waitpool() == (False, True)
+    assert tried == ['b.0', 'b.1']
+    assert sorted(sched._waitpool) == ['a.0', 'a.1', 'a.2', 'b.1']
+
+    # no free core: nothing is tried at all
+    del tried[:]
+    assert sched._schedule_waitpool() == (False, False)
+    assert tried == []
+
+    # larger tasks are placed first, and once all cores are used, the bin of
+    # 1-core tasks is skipped
+    sched._change_slot_states(busy['slots'],     rpc.FREE)
+    sched._change_slot_states(units[3]['slots'], rpc.FREE)
+    assert sched._schedule_waitpool() == (False, True)
+    assert tried == ['a.0', 'a.1', 'a.2']
+    assert sorted(sched._waitpool) == ['a.2', 'b.1']
+
+    sched._waitpool_remove(units[2])
+    sched._waitpool_remove(units[4])
+    assert sched._waitpool == dict()
+    assert sched._waitbins == dict()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_sched_policy():
+
+    sizes = _get_scheduler(n_nodes=2, cores=8, gpus=2, policy='size')
+    drf   = _get_scheduler(n_nodes=2, cores=8, gpus=2, policy='dominant')
+
+    cpu_unit = _get_unit('cpu', procs=4)
+    gpu_unit = _get_unit('gpu', procs=1, gpus=2)
+    for unit in [cpu_unit, gpu_unit]:
+        sizes._set_tuple_size(unit)
+
+    # the size policy only counts cores, the dominant policy sees that the GPU
+    # unit needs half of all GPUs
+    assert sizes._waitpool_key(cpu_unit['tuple_size']) == 4
+    assert sizes._waitpool_key(gpu_unit['tuple_size']) == 3
+    assert drf  ._waitpool_key(cpu_unit['tuple_size']) == 0.25
+    assert drf  ._waitpool_key(gpu_unit['tuple_size']) == 0.5
+
+    # occupy the GPUs of node 0 and some cores of node 1
+    for sched in [sizes, drf]:
+        slots = sched.schedule_unit(gpu_unit)
+        assert slots['nodes'][0]['uid'] == 'uid_0'
+        sched._change_slot_states(slots, rpc.BUSY)
+        sched._change_slot_states({'nodes': [{'uid'     : 'uid_1',
+                                              'core_map': [[0], [1], [2]],
+                                              'gpu_map' : [],
+                                              'lfs'     : {'path': None},
+                                              'mem'     : 0}]}, rpc.BUSY)
+
+    # a single core goes to the best fitting node for the size policy, but to
+    # the node without free GPUs for the dominant policy
+    unit = _get_unit('cpu', procs=1)
+    assert sizes.schedule_unit(unit)['nodes'][0]['uid'] == 'uid_1'
+    assert drf  .schedule_unit(unit)['nodes'][0]['uid'] == 'uid_0'
+
+    # utilization is reported once, and only for configured resources
+    drf._prof_utilization()
+    drf._prof_utilization()
+    drf._prof.prof.assert_called_once_with('schedule_util',
+                                           msg='cores:0.25 gpus:0.50',
+                                           ts=drf._util_ts)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_drain():
+
+    sched = _get_scheduler(n_nodes=1)
+    sched._proc_term = mock.Mock()
+    sched._proc_term.is_set.return_value = False
+
+    q = queue.Queue()
+    assert sched._drain(q) == []
+
+    # units are passed by reference in `thread` mode
+    units = [_get_unit('unit.%d' % i) for i in range(3)]
+    q.put(units[:2])
+    q.put(units[2])
+    data = sched._drain(q)
+    assert data    == [units[:2], units[2]]
+    assert data[1] is units[2]
+    assert q.empty()
+
+    # stop draining on termination
+    q.put(units[0])
+    q.put(units[1])
+    sched._proc_term.is_set.return_value = True
+    assert sched._drain(q) == [units[0]]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_shape_cache():
+
+    sched = _get_scheduler(n_nodes=4, cores=8, gpus=0)
+    units = [_get_unit('unit.%d' % i, procs=12, ptype='MPI') for i in range(3)]
+    for unit in units:
+        sched._set_tuple_size(unit)
+
+    slots = sched.schedule_unit(units[0])
+    sched._change_slot_states(slots, rpc.BUSY)
+    assert [n['uid'] for n in slots['nodes']] == ['uid_0'] * 8 + ['uid_1'] * 4
+
+    shape = sched._shapes[units[0]['tuple_size']]
+    assert shape['slots_per_node'] == 8
+    assert shape['offset']         == 1
+
+    # the placement parameters are not derived again, and the search starts
+    # on the last node used for that shape
+    sched._get_shape = mock.Mock()
+    slots = sched.schedule_unit(units[1])
+    sched._get_shape.assert_not_called()
+
+    assert [n['uid'] for n in slots['nodes']] == ['uid_1'] * 4 + ['uid_2'] * 8
+    assert shape['offset'] == 2
+
+    # units without `tuple_size` are not cached
+    sched._get_shape = mock.Mock(return_value=dict(shape))
+    del units[2]['tuple_size']
+    sched.schedule_unit(units[2])
+    sched._get_shape.assert_called_once()
+    assert len(sched._shapes) == 1
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tag_history():
+
+    sched = _get_scheduler(n_nodes=4, cores=8, gpus=0)
+    sched._tag_limit = 1
+
+    units = [_get_unit('unit.%d' % i, procs=8) for i in range(4)]
+    for unit, tag in zip(units, ['foo', 'bar', 'foo', 'foo']):
+        unit['description']['tag'] = tag
+        sched._set_tuple_size(unit)
+
+    for unit in units[:2]:
+        unit['slots'] = sched.schedule_unit(unit)
+        sched._change_slot_states(unit['slots'], rpc.BUSY)
+
+    assert sched._tag_history == {'foo': {'uid_0'}, 'bar': {'uid_1'}}
+
+    # tagged units only consider the nodes of their tag
+    sched.unschedule_unit(units[0])
+    sched._find_resources = mock.Mock(wraps=sched._find_resources)
+    units[2]['slots'] = sched.schedule_unit(units[2])
+    sched._change_slot_states(units[2]['slots'], rpc.BUSY)
+    assert [n['uid'] for n in units[2]['slots']['nodes']] == ['uid_0'] * 8
+    assert sched._find_resources.call_count == 1
+
+    # ... and wait for them if they are busy
+    assert sched.schedule_unit(units[3]) is None
+
+    # tags become idle once their units completed, and the oldest idle tags
+    # are forgotten
+    sched._handle_completed(units[:1])
+    assert list(sched._tag_idle) == []
+
+    sched._handle_completed(units[2:3])
+    sched._handle_completed(units[1:2])
+    assert list(sched._tag_idle)    == ['bar']
+    assert sorted(sched._tag_history) == ['bar']
+    assert not sched._tag_units
+    assert not sched._tag_live
+
+
+# ------------------------------------------------------------------------------
+#
+def test_sched_mode(tmpdir):
+
+    # in-process bridges only exist in this process, so the scheduling
+    # algorithm of in-process schedulers runs in a thread
+    sched = get_scheduler(str(tmpdir), cfg={'sched_mode': None})
+    assert sched._sched_mode == 'process'
+
+    sched = get_scheduler(str(tmpdir), cfg={'sched_mode': None,
+                                            'inproc'    : True})
+    assert sched._sched_mode == 'thread'
+
+    with pytest.raises(ValueError):
+        get_scheduler(str(tmpdir), cfg={'sched_mode': 'process',
+                                        'inproc'    : True})
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    test_change_slot_states('list')
+    test_capacity_index('list')
+    test_slot_recycling()
+    test_waitpool()
+    test_sched_policy()
+    test_drain()
+    test_shape_cache()
+    test_tag_history()
+    test_sched_mode(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import radical.pilot as rp
+
+from .test_common import get_unit, get_scheduler, submit, release
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_unit(uid, depends_on=None):
+
+    if depends_on: tags = {'depends_on': depends_on}
+    else         : tags = dict()
+
+    return get_unit(uid, tags=tags)
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_scheduler(path, cfg=None):
+
+    sched = get_scheduler(path, 'CONTINUOUS_DAG', cfg=cfg)
+
+    sched._failed = list()
+    placed        = sched.advance
+
+    # also record failed units
+    def advance(units, state=None, publish=True, push=False, ts=None,
+                prof=True):
+
+        if state == rp.FAILED:
+            sched._failed.extend(units)
+        else:
+            placed(units, state)
+
+    sched.advance = advance
+
+    return sched
+
+
+# ------------------------------------------------------------------------------
+#
+def _complete(sched, units, exit_code=0):
+
+    for unit in units:
+        unit['exit_code'] = exit_code
+
+    release(sched, units)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_dag(tmpdir):
+
+    sched  = _get_scheduler(str(tmpdir))
+    placed = sched._placed
+
+    a = _get_unit('unit.a')
+    b = _get_unit('unit.b', ['unit.a'])
+    c = _get_unit('unit.c', ['unit.a'])
+    d = _get_unit('unit.d', ['unit.b', 'unit.c'])
+
+    # children can arrive before their parents
+    submit(sched, [d, c, b])
+    submit(sched, [a])
+
+    assert placed == [a]
+    assert sorted(sched._held) == ['unit.b', 'unit.c', 'unit.d']
+    assert sched._held['unit.d'][1] == 2
+
+    _complete(sched, [a])
+    assert sorted([u['uid'] for u in placed]) == ['unit.a', 'unit.b', 'unit.c']
+
+    _complete(sched, [b])
+    assert len(placed) == 3
+    assert sched._held['unit.d'][1] == 1
+
+    _complete(sched, [c])
+    assert placed[-1] == d
+    assert not sched._held
+    assert not sched._children
+
+    # children arriving after their parents completed are not held
+    _complete(sched, [d])
+    e = _get_unit('unit.e', ['unit.a', 'unit.d'])
+    submit(sched, [e])
+    assert placed[-1] == e
+    assert not sched._failed
+
+
+# ------------------------------------------------------------------------------
+#
+def test_dag_failed(tmpdir):
+
+    sched  = _get_scheduler(str(tmpdir))
+
+    a = _get_unit('unit.a')
+    b = _get_unit('unit.b', ['unit.a'])
+    c = _get_unit('unit.c', ['unit.b'])
+    d = _get_unit('unit.d', ['unit.c'])
+
+    submit(sched, [a, b, c])
+    _complete(sched, [a], exit_code=1)
+
+    # descendants of a failed unit fail
+    assert sched._placed == [a]
+    assert sched._failed == [b, c]
+    assert not sched._held
+
+    # also if they arrive late
+    submit(sched, [d])
+    assert sched._failed == [b, c, d]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_dag_history(tmpdir):
+
+    sched  = _get_scheduler(str(tmpdir), cfg={'dag_history': 2})
+    placed = sched._placed
+
+    a = _get_unit('unit.a')
+    b = _get_unit('unit.b')
+    c = _get_unit('unit.c')
+    d = _get_unit('unit.d', ['unit.a'])
+    e = _get_unit('unit.e', ['unit.c'])
+
+    submit(sched, [a, b, c])
+    _complete(sched, [a], exit_code=1)
+    _complete(sched, [b, c])
+
+    # only the most recent outcomes are kept
+    assert len(sched._done) == 2
+    assert 'unit.a' not in sched._done
+
+    # children of forgotten parents wait for them, others are placed
+    submit(sched, [d, e])
+    assert placed[-1] == e
+    assert not sched._failed
+    assert list(sched._held) == ['unit.d']
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_dag(tempfile.mkdtemp())
+    test_dag_failed(tempfile.mkdtemp())
+    test_dag_history(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
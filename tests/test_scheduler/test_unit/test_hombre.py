@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import pytest
+
+from radical.pilot.agent.scheduler import benchmark as rpsb
+
+from .test_common import get_unit, get_scheduler
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_units(shapes):
+
+    return [get_unit('unit.%06d' % idx, shape[0], cpu_threads=shape[1],
+                                                  gpu_processes=shape[2])
+            for idx, shape in enumerate(shapes)]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_hombre_multi(tmpdir):
+
+    sched = get_scheduler(str(tmpdir), 'HOMBRE_MULTI', nodes=4, gpus=2)
+
+    for unit in _get_units([[1, 1, 0]] * 8 + [[1, 2, 1]] * 4):
+        sched._set_tuple_size(unit)
+        assert sched._try_allocation(unit)
+        sched._placed.append(unit)
+
+    # each pool uses two nodes
+    small, large = sched._placed[:8], sched._placed[8:]
+    pools        = sched._pools
+    assert len(pools) == 2
+    assert len(sched._spare) == 0
+    assert sorted([len(p['groups']) for p in pools.values()]) == [2, 2]
+
+    # nodes are not shared between pools
+    small_nodes = set([u['slots']['nodes'][0]['uid'] for u in small])
+    large_nodes = set([u['slots']['nodes'][0]['uid'] for u in large])
+    assert len(small_nodes) == 2
+    assert len(large_nodes) == 2
+    assert not small_nodes & large_nodes
+
+    for unit in large:
+        assert len(unit['slots']['nodes']) == 2
+        assert unit['slots']['nodes'][0]['core_map'] in [[[0, 1]], [[2, 3]]]
+
+    # the GPU pool is dry, and all other nodes are busy
+    unit = _get_units([[1, 2, 1]])[0]
+    sched._set_tuple_size(unit)
+    assert not sched._try_allocation(unit)
+
+    # free one node worth of small units: that node gets reclaimed
+    node = small[0]['slots']['nodes'][0]['uid']
+    for u in small:
+        if u['slots']['nodes'][0]['uid'] == node:
+            sched.unschedule_unit(u)
+
+    assert sched._try_allocation(unit)
+    assert unit['slots']['nodes'][0]['uid'] == node
+    assert sched._groups[node]['pool'] == tuple(unit['tuple_size'])
+
+    small_pool = pools[tuple(small[0]['tuple_size'])]
+    assert len(small_pool['groups']) == 1
+    assert not small_pool['free']
+
+    # a partially used node is not reclaimed
+    for u in large[:1]:
+        sched.unschedule_unit(u)
+    unit = _get_units([[1, 1, 0]])[0]
+    sched._set_tuple_size(unit)
+    assert not sched._try_allocation(unit)
+
+    # units which can never fit are rejected
+    for shape in [[1, 8, 0], [1, 1, 3], [5, 1, 0]]:
+        unit = _get_units([shape])[0]
+        sched._set_tuple_size(unit)
+        with pytest.raises(ValueError):
+            sched._try_allocation(unit)
+
+    # MPI units can span nodes.  Creating their pool does not touch the nodes
+    # owned by other pools.
+    blocks = [[n['cblocks'], n['gblocks']] for n in sched.nodes]
+    unit   = _get_units([[5, 1, 0]])[0]
+    unit['description']['cpu_process_type'] = 'MPI'
+    sched._set_tuple_size(unit)
+    assert sched._create_pool(tuple(unit['tuple_size']), unit['description'])
+    assert [[n['cblocks'], n['gblocks']] for n in sched.nodes] == blocks
+
+
+# ------------------------------------------------------------------------------
+#
+def test_hombre_multi_benchmark(tmpdir):
+
+    workload = rpsb.create_workload(200, shapes=[{'cpu_processes': 1},
+                                                 {'cpu_processes': 2,
+                                                  'cpu_threads'  : 2},
+                                                 {'cpu_processes': 1,
+                                                  'gpu_processes': 1},
+                                                 {'cpu_processes': 2,
+                                                  'gpu_processes': 1}])
+
+    sched  = get_scheduler(str(tmpdir), 'HOMBRE_MULTI', nodes=4, cores=8,
+                           gpus=2)
+    result = rpsb.run(sched, workload)
+
+    assert result['placed']   == 200
+    assert result['released'] == 200
+    assert result['util_cores'] <= 1.0
+    assert result['util_gpus']  <= 1.0
+
+    # HOMBRE interprets `gpu_processes` as the total number of GPUs: the
+    # utilization is based on the allocated slots, not on the descriptions
+    assert max([u[1] for u in result['util']]) <= 1.0
+    assert max([u[2] for u in result['util']]) <= 1.0
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_hombre_multi(tempfile.mkdtemp())
+    test_hombre_multi_benchmark(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import pytest
+
+import radical.pilot.states as rps
+
+from .test_common import get_unit, get_units, get_scheduler, submit
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_schedulers(path, n, routing='queue'):
+
+    scheds = list()
+    for idx in range(n):
+        cfg = {'count': n, 'index': idx, 'sched_routing': routing}
+        scheds.append(get_scheduler(path, nodes=4, cfg=cfg))
+
+    # deliver messages on the schedule pubsub to all partitions
+    def publish(pubsub, msg):
+        for sched in scheds:
+            sched.partition_cb(pubsub, msg)
+
+    for sched in scheds:
+        sched.publish = publish
+
+    return scheds
+
+
+# ------------------------------------------------------------------------------
+#
+def test_partition_nodes(tmpdir):
+
+    s0, s1 = _get_schedulers(str(tmpdir), 2)
+
+    assert [n['uid'] for n in s0.nodes] == ['node_00000', 'node_00001']
+    assert [n['uid'] for n in s1.nodes] == ['node_00002', 'node_00003']
+
+    with pytest.raises(ValueError):
+        _get_schedulers(str(tmpdir), 2, routing='random')
+
+
+# ------------------------------------------------------------------------------
+#
+def test_partition_route(tmpdir):
+
+    s0, s1 = _get_schedulers(str(tmpdir), 2, routing='hash')
+
+    s0._queue_sched.put(get_units(8))
+    s0._schedule_incoming()
+    s1._schedule_incoming()
+
+    assert len(s0._placed) + len(s1._placed) == 8
+    assert s0._placed and s1._placed
+
+    homes = dict()
+    for sched in [s0, s1]:
+        for unit in sched._placed:
+            assert unit['partition'] == sched._partition
+            assert unit['slots']['nodes'][0]['uid'] in sched._partition_nodes
+            homes[unit['uid']] = sched._partition
+
+    # routing does not depend on the partition which pulled the unit
+    units = get_units(8)
+    for unit in units:
+        s1._set_tuple_size(unit)
+
+    for unit in s1._route_units(units):
+        assert homes[unit['uid']] == 1
+
+    for unit in s0._queue_sched.get():
+        assert homes[unit['uid']] == 0
+
+
+# ------------------------------------------------------------------------------
+#
+def test_partition_spill(tmpdir):
+
+    s0, s1 = _get_schedulers(str(tmpdir), 2)
+
+    # nothing is spilled before a sibling advertised its capacity
+    submit(s0, get_units(9))
+
+    assert len(s0._placed) == 8
+    assert len(s0._waitpool) == 1
+
+    # s1 advertises 2 nodes with 4 free cores each
+    s1._publish_capacity()
+    assert s0._siblings[4:8] == [4, 0, 8, 0]
+
+    units = get_units(10)
+    for unit in units:
+        unit['uid'] += '.b'
+
+    s0._queue_sched.put(units)
+    s0._schedule_incoming()
+    s1._schedule_incoming()
+
+    # 8 units spill over, the remaining ones wait in s0
+    assert len(s1._placed) == 8
+    assert len(s0._waitpool) == 3
+    assert s0._siblings[6] == 0
+    for unit in s1._placed:
+        assert unit['spilled']
+        assert unit['slots']['nodes'][0]['uid'] in s1._partition_nodes
+
+    # completed units are only released by the partition which placed them
+    unit = s1._placed[0]
+    s0.unschedule_cb(None, unit)
+    s1.unschedule_cb(None, unit)
+
+    assert s0._queue_unsched.empty()
+    assert s1._queue_unsched.get() == unit
+
+
+# ------------------------------------------------------------------------------
+#
+def test_partition_resend(tmpdir):
+
+    s0, s1 = _get_schedulers(str(tmpdir), 2, routing='hash')
+
+    # lose the first message which forwards units
+    deliver = s0.publish
+    lost    = list()
+
+    def publish(pubsub, msg):
+        if msg['cmd'] == 'schedule' and not lost:
+            lost.append(msg)
+        else:
+            deliver(pubsub, msg)
+
+    s0.publish = publish
+    s1.publish = publish
+
+    s0._queue_sched.put(get_units(8))
+    s0._schedule_incoming()
+    s1._schedule_incoming()
+
+    assert lost
+    assert not s1._placed
+    assert len(s0._forwarded) == 8 - len(s0._placed)
+
+    # unacknowledged units are forwarded again after the timeout
+    s0._check_forwarded()
+    assert len(s0._forwarded) == 8 - len(s0._placed)
+
+    s0._forward_timeout = 0.0
+    s0._check_forwarded()
+    s1._schedule_incoming()
+
+    assert len(s0._placed) + len(s1._placed) == 8
+
+    # the acknowledgement clears the forwarded units
+    s0._forward_ts = 0.0
+    s0._check_forwarded()
+    assert not s0._forwarded
+
+    # units forwarded twice are only placed once
+    unit = s1._placed[0]
+    deliver(None, {'cmd': 'schedule',
+                   'arg': {'partition': 1,
+                           'units'    : [dict(unit, origin=0)]}})
+    s1._schedule_incoming()
+
+    assert len(s1._placed) == 8 - len(s0._placed)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_partition_size(tmpdir):
+
+    s0, s1 = _get_schedulers(str(tmpdir), 2)
+
+    failed = list()
+    for sched in [s0, s1]:
+        advance = sched.advance
+
+        def fail(units, state=None, _advance=advance, **kwargs):
+            if state == rps.FAILED:
+                failed.append(units)
+            _advance(units, state, **kwargs)
+
+        sched.advance = fail
+
+    # each partition owns 2 nodes with 4 cores.  The MPI unit fits, the
+    # larger MPI unit and the non-MPI unit larger than a node don't.
+    units = [get_unit('unit.mpi.8',  cores=8, cpu_process_type='MPI'),
+             get_unit('unit.mpi.12', cores=12, cpu_process_type='MPI'),
+             get_unit('unit.node.5', cores=5)]
+    submit(s0, units)
+
+    assert [u['uid'] for u in s0._placed] == ['unit.mpi.8']
+    assert sorted([u['uid'] for u in failed]) == ['unit.mpi.12',
+                                                 'unit.node.5']
+    assert not s0._waitpool
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_partition_nodes(tempfile.mkdtemp())
+    test_partition_route(tempfile.mkdtemp())
+    test_partition_spill(tempfile.mkdtemp())
+    test_partition_resend(tempfile.mkdtemp())
+    test_partition_size(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import radical.utils as ru
+import radical.pilot.states as rps
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+from radical.pilot.agent.scheduler import benchmark as rpsb
+
+from .test_common import get_unit, get_scheduler, submit, release
+
+
+# ------------------------------------------------------------------------------
+#
+def test_priority(tmpdir):
+
+    sched  = get_scheduler(str(tmpdir))
+    placed = sched._placed
+
+    a = get_unit('unit.a', 4)
+    b = get_unit('unit.b', 2)
+    c = get_unit('unit.c', 1, priority=1)
+    d = get_unit('unit.d', 4, priority=-1)
+
+    # units of higher priority are handled first on arrival
+    submit(sched, [a, d, c])
+    assert placed == [c]
+    assert sorted(sched._waitprio) == [(-1, None)]
+
+    submit(sched, [b])
+    assert placed == [c, b]
+
+    # ... and from the waitpool, even if they are smaller
+    release(sched, [c, b])
+    assert placed == [c, b, a]
+
+    release(sched, [a])
+    assert placed == [c, b, a, d]
+
+    # empty levels are dropped
+    assert not sched._waitpool
+    assert not sched._waitprio
+    assert not sched._waitbins
+
+
+# ------------------------------------------------------------------------------
+#
+def test_fair_share(tmpdir):
+
+    sched  = get_scheduler(str(tmpdir))
+    placed = sched._placed
+
+    a1 = get_unit('unit.a1', 2, tags={'group': 'a'})
+    a2 = get_unit('unit.a2', 1, tags={'group': 'a'})
+    a3 = get_unit('unit.a3', 1, tags={'group': 'a'})
+    b1 = get_unit('unit.b1', 1, tags={'group': 'b'})
+    b2 = get_unit('unit.b2', 1, tags={'group': 'b'})
+
+    submit(sched, [a1, a2, a3])
+    assert placed == [a1, a2, a3]
+    assert sched._shares == {'a': 4}
+
+    submit(sched, [b1, b2])
+    assert sorted(sched._waitprio) == [(0, 'b')]
+
+    # freed cores go to the group which uses less
+    a4 = get_unit('unit.a4', 1, tags={'group': 'a'})
+    submit(sched, [a4])
+
+    release(sched, [a2, a3])
+    assert placed == [a1, a2, a3, b1, b2]
+    assert sched._shares == {'a': 2, 'b': 2}
+
+    release(sched, [b1])
+    assert placed[-1] == a4
+    assert sched._shares == {'a': 3, 'b': 1}
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reservation(tmpdir):
+
+    sched  = get_scheduler(str(tmpdir))
+    placed = sched._placed
+
+    small = [get_unit('unit.s%d' % i, 1) for i in range(6)]
+    large = get_unit('unit.l', 4, priority=1)
+    high  = get_unit('unit.h', 1, priority=1)
+
+    submit(sched, small[:4])
+    submit(sched, [large])
+    assert placed == small[:4]
+
+    # freed cores are reserved for the large unit, smaller units of lower
+    # priority can't use them
+    release(sched, small[:1])
+    assert sched._reserved[0] is large
+    assert sched._total_free_cores == 0
+
+    # reserved cores don't count as utilized
+    sched._prof    = mock.Mock()
+    sched._util_ts = 0.0
+    sched._prof_utilization()
+    assert sched._prof.prof.call_args[1]['msg'].startswith('cores:0.75')
+
+    submit(sched, small[4:5])
+    assert placed == small[:4]
+
+    # units of the same priority can
+    submit(sched, [high])
+    assert placed == small[:4] + [high]
+
+    # the reservation grows until the large unit fits
+    release(sched, small[1:4])
+    assert sched._reserved[0] is large
+    assert sched._total_free_cores == 0
+
+    release(sched, [high])
+    assert placed[-1] is large
+    assert not sched._reserved
+
+    release(sched, [large])
+    assert placed[-1] is small[4]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_reservation_stream(tmpdir):
+
+    # a stream of small units (75% load) does not delay a large unit of higher
+    # priority for longer than the small units run
+    workload = rpsb.create_workload(1000, runtime=10.0, rate=0.3)
+    workload.append({'description': {'cpu_processes': 4, 'priority': 10},
+                     'submit'     : 50.0,
+                     'runtime'    : 10.0})
+
+    sched = get_scheduler(str(tmpdir))
+    waits = list()
+
+    # let the benchmark install its simulated clock to observe placements
+    sched._clock = None
+    advance      = sched.advance
+
+    def _advance(units, state=None, publish=True, push=False, ts=None,
+                 prof=True):
+        if state == rps.AGENT_EXECUTING_PENDING:
+            for unit in ru.as_list(units):
+                if unit['description']['priority']:
+                    waits.append(sched._clock() - unit['submit'])
+        advance(units, state)
+
+    sched.advance = _advance
+
+    result = rpsb.run(sched, workload)
+    assert result['placed'] == 1001
+    assert len(waits) == 1
+    assert waits[0] <= 2 * 15.0
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    import tempfile
+
+    test_priority(tempfile.mkdtemp())
+    test_fair_share(tempfile.mkdtemp())
+    test_reservation(tempfile.mkdtemp())
+    test_reservation_stream(tempfile.mkdtemp())
+
+
+# ------------------------------------------------------------------------------
+
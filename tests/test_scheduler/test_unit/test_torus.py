@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access, unused-argument
+
+import pytest
+
+from radical.pilot                       import constants as rpc
+from radical.pilot.agent.scheduler       import benchmark as rpsb
+from radical.pilot.agent.scheduler       import torus     as rpst
+
+try:
+    import mock
+except ImportError:
+    from unittest import mock
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_scheduler(tmpdir, n_nodes=16):
+
+    # a 1x2x2x2x2 block, with sub-block shapes as created by the LoadLeveler RM
+    dims   = ['A', 'B', 'C', 'D', 'E']
+    block  = list()
+    for b in range(2):
+        for c in range(2):
+            for d in range(2):
+                for e in range(2):
+                    loc = {'A': 0, 'B': b, 'C': c, 'D': d, 'E': e}
+                    block.append([len(block), loc, 'node_%05d' % len(block),
+                                  rpc.FREE])
+
+    shapes = list()
+    for size, lens in [(1, '11111'), (2, '11112'), (4, '11122'),
+                       (8, '11222'), (16, '12222')]:
+        shape = dict([(dim, int(l)) for dim, l in zip(dims, lens)])
+        shapes.append([size, shape, 'x'.join(lens)])
+
+    rm_info = rpsb.create_rm_info(nodes=n_nodes, cores=16)
+    rm_info['torus'] = {'dims'    : dims,
+                        'block'   : block,
+                        'shapes'  : shapes,
+                        'bg_block': 'R00-M0-N00-128'}
+
+    return rpsb.create_scheduler('TORUS', rm_info, path=str(tmpdir))
+
+
+# ------------------------------------------------------------------------------
+#
+def _get_unit(uid, cores):
+
+    unit = {'uid'        : uid,
+            'description': {'cpu_processes'   : cores,
+                            'cpu_process_type': 'MPI',
+                            'cpu_threads'     : 1,
+                            'gpu_processes'   : 0,
+                            'environment'     : dict()}}
+    return unit
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_torus(tmpdir, vectorized):
+
+    if vectorized and rpst.np is None:
+        pytest.skip('needs numpy')
+
+    np = rpst.np if vectorized else None
+
+    with mock.patch.object(rpst, 'np', np):
+
+        sched = _get_scheduler(tmpdir)
+        units = [_get_unit('unit.%d' % i, cores)
+                 for i, cores in enumerate([32, 16, 64, 48, 128, 16])]
+
+        for unit in units:
+            sched._set_tuple_size(unit)
+
+        # sub-blocks are placed at the first free aligned corner, and partial
+        # node requests are rounded up to the next sub-block size
+        for unit in units[:4]:
+            assert sched._try_allocation(unit)
+
+        nodes = [[n['uid'] for n in u['slots']['nodes']] for u in units[:4]]
+        assert nodes == [['node_%05d' % i for i in range( 0,  2)],
+                         ['node_%05d' % i for i in range( 2,  3)],
+                         ['node_%05d' % i for i in range( 4,  8)],
+                         ['node_%05d' % i for i in range( 8, 12)]]
+
+        slots = units[2]['slots']
+        assert slots['corner_node']         == 'node_00004'
+        assert slots['sub_block_shape_str'] == '1x1x1x2x2'
+        assert slots['loadl_bg_block']      == 'R00-M0-N00-128'
+        assert sched._torus_free == 5
+
+        # no free 8-node sub-block left
+        assert not sched._try_allocation(units[4])
+
+        # freed nodes are reused
+        sched.unschedule_unit(units[0])
+        assert sched._torus_free == 7
+        assert sched._try_allocation(units[5])
+        assert units[5]['slots']['corner_node'] == 'node_00000'
+
+        # requests larger than the block are rejected
+        with pytest.raises(ValueError):
+            sched.schedule_unit(_get_unit('unit.x', 16 * 17))
+
+        # nodes outside of the node list are never used
+        sched = _get_scheduler(tmpdir, n_nodes=15)
+        assert sched._torus_free == 15
+        assert not sched._try_allocation(_get_unit('unit.y', 16 * 16))
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    test_torus('/tmp', True)
+    test_torus('/tmp', False)
+
+
+# ------------------------------------------------------------------------------
+